@@ -14,145 +14,302 @@ Example:
     --summary Code/summary_w05_seed.csv \
     --losses Code/losses_seeded.csv \
     --V 1.0 --d-star 5.0
+
+Batch mode analyzes every summary of a sweep (directories are searched for
+summary*.csv/.bin/.z files, other arguments are glob patterns) on --jobs
+processes and writes one tidy table, a row per (run, loss), as CSV or, with
+a .parquet --out and pyarrow installed, Parquet:
+  python3 analyze_loss_impact.py --losses losses_seeded.csv \
+    --sweep fresh_start/analysis/seed_sweeps/variantB_hold500 --out loss_impact.csv
+
+All losses of a summary are analyzed at once with NumPy: peaks are an argmax
+over a (losses, post) window grid and recovery is found by bisecting the
+steps where the run of in-tolerance rows reaches --min-consecutive.
 """
 
 from __future__ import annotations
 
 import argparse
 import csv
+import glob
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass
+from itertools import repeat
 from pathlib import Path
-from typing import Iterable
+from typing import Sequence
+
+import numpy as np
+
+from sim_io import load_loss_steps, load_summary, spare_steps
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: batch tables are written as CSV
+    pyarrow = None
+
+SUMMARY_COLUMNS = ["step", "alive", "mean_v", "std_v", "mean_gap", "std_gap"]
+SUMMARY_SUFFIXES = (".csv", ".bin", ".z")
+
+# recovery_step / recovery_delay are only meaningful where `recovered` is set.
+IMPACT_DTYPE = np.dtype(
+    [
+        ("step", np.int64),
+        ("baseline_mean_v", np.float64),
+        ("baseline_mean_gap", np.float64),
+        ("peak_step", np.int64),
+        ("peak_v", np.float64),
+        ("delta_v", np.float64),
+        ("slope_v_per_step", np.float64),
+        ("recovered", np.bool_),
+        ("recovery_step", np.int64),
+        ("recovery_delay", np.int64),
+    ]
+)
 
 
 @dataclass(frozen=True)
-class SummaryRow:
-    step: int
-    alive: int
-    mean_v: float
-    std_v: float
-    mean_gap: float
-    std_gap: float
+class ImpactParams:
+    """Analysis windows and recovery tolerances; V / d_star default to the summary's first row."""
+
+    pre: int = 25
+    post: int = 150
+    slope_window: int = 25
+    speed_tol: float = 0.05
+    gap_tol_frac: float = 0.05
+    min_consecutive: int = 10
+    V: float | None = None
+    d_star: float | None = None
 
 
 def read_loss_steps(path: Path) -> list[int]:
-    if not path.exists():
-        return []
-    steps: list[int] = []
-    with path.open() as f:
-        header = f.readline()
-        delim = ";" if ";" in header else ","
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.replace(";", ",").split(",")
-            if len(parts) < 2:
-                continue
-            try:
-                steps.append(int(parts[0]))
-            except ValueError:
-                continue
-    return sorted(set(steps))
-
-
-def read_summary(path: Path) -> list[SummaryRow]:
-    rows: list[SummaryRow] = []
-    with path.open() as f:
-        reader = csv.DictReader(f, delimiter=";")
-        for row in reader:
-            rows.append(
-                SummaryRow(
-                    step=int(row["step"]),
-                    alive=int(row["alive"]),
-                    mean_v=float(row["mean_v"]),
-                    std_v=float(row["std_v"]),
-                    mean_gap=float(row["mean_gap"]),
-                    std_gap=float(row["std_gap"]),
-                )
-            )
-    rows.sort(key=lambda r: r.step)
-    return rows
+    return np.unique(load_loss_steps(path)).tolist()
+
+
+def read_summary(path: Path) -> np.ndarray:
+    rows = load_summary(path, SUMMARY_COLUMNS)
+    return rows[np.argsort(rows["step"], kind="stable")]
 
 
 def read_spare_steps_from_trace(trace_path: Path) -> list[int]:
-    if not trace_path or not trace_path.exists():
+    if not trace_path:
         return []
-    prev_alive: dict[int, int] = {}
-    spare_steps: set[int] = set()
-    with trace_path.open() as f:
-        f.readline()
-        for line in f:
-            parts = line.strip().split(";")
-            if len(parts) < 3:
-                continue
-            try:
-                step = int(parts[0])
-                idx = int(parts[1])
-                alive = int(parts[2])
-            except ValueError:
-                continue
-            prev = prev_alive.get(idx)
-            if prev is not None and prev == 0 and alive == 1:
-                spare_steps.add(step)
-            prev_alive[idx] = alive
-    return sorted(spare_steps)
-
-
-def index_by_step(rows: Iterable[SummaryRow]) -> dict[int, SummaryRow]:
-    return {r.step: r for r in rows}
-
-
-def linear_slope(y0: float, y1: float, dt_steps: int) -> float:
-    if dt_steps <= 0:
-        return 0.0
-    return (y1 - y0) / dt_steps
-
-
-def find_peak(rows: list[SummaryRow], start_step: int, window: int) -> tuple[int, float]:
-    end_step = start_step + max(1, window)
-    best_step = start_step
-    best_v = float("-inf")
-    for r in rows:
-        if r.step < start_step:
-            continue
-        if r.step > end_step:
-            break
-        if r.mean_v > best_v:
-            best_v = r.mean_v
-            best_step = r.step
-    return best_step, best_v
-
-
-def first_recovery_step(
-    rows: list[SummaryRow],
-    start_step: int,
-    V: float,
-    d_star: float,
-    speed_tol: float,
-    gap_tol_frac: float,
-    min_consecutive: int,
-) -> int | None:
-    ok_run = 0
-    for r in rows:
-        if r.step < start_step:
-            continue
-        speed_ok = abs(r.mean_v - V) <= speed_tol
-        gap_ok = abs(r.mean_gap - d_star) <= gap_tol_frac * d_star
-        if speed_ok and gap_ok:
-            ok_run += 1
-            if ok_run >= max(1, min_consecutive):
-                return r.step - (min_consecutive - 1)
+    return spare_steps(trace_path).tolist()
+
+
+def nominal(rows: np.ndarray, params: ImpactParams) -> tuple[float, float]:
+    """(V, d_star): the given ones, else mean_v / mean_gap of the first summary row."""
+
+    V = float(params.V) if params.V is not None else float(rows["mean_v"][0])
+    d_star = float(params.d_star) if params.d_star is not None else float(rows["mean_gap"][0])
+    return V, d_star
+
+
+def window_grid(steps: np.ndarray, start: np.ndarray, stop: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Row indices of the steps in [start, stop) per window, one window per grid row.
+
+    Returns (idx, inside): short windows are padded with a valid index and
+    inside = False.
+    """
+
+    lo = np.searchsorted(steps, start, "left")
+    hi = np.maximum(np.searchsorted(steps, stop, "left"), lo)
+    idx = lo[:, None] + np.arange(max(int((hi - lo).max()), 1))
+    inside = idx < hi[:, None]
+    return np.minimum(idx, len(steps) - 1), inside
+
+
+def window_means(rows: np.ndarray, col: str, start: np.ndarray, stop: np.ndarray) -> np.ndarray:
+    """Mean of a column over the rows in [start, stop) per window, NaN for empty windows.
+
+    Rows are summed in step order (a cumulative sum along the grid), as the
+    row-by-row loop this replaces did, so results match it to the last bit.
+    """
+
+    idx, inside = window_grid(rows["step"], start, stop)
+    total = np.cumsum(np.where(inside, rows[col][idx], 0.0), axis=1)[:, -1]
+    n = inside.sum(axis=1)
+    with np.errstate(invalid="ignore"):
+        return np.where(n > 0, total / np.maximum(n, 1), np.nan)
+
+
+def find_peaks(rows: np.ndarray, loss_steps: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """First step of maximum mean_v in [loss, loss + max(1, window)] per loss.
+
+    Windows without a (non-NaN) row give the loss step and -inf.
+    """
+
+    steps = rows["step"]
+    idx, inside = window_grid(steps, loss_steps, loss_steps + max(1, window) + 1)
+    v = rows["mean_v"][idx]
+    v = np.where(inside & ~np.isnan(v), v, -np.inf)
+    best = v.argmax(axis=1)[:, None]
+    peak_v = np.take_along_axis(v, best, axis=1)[:, 0]
+    peak_step = np.where(peak_v > -np.inf, steps[np.take_along_axis(idx, best, axis=1)[:, 0]], loss_steps)
+    return peak_step, peak_v
+
+
+def find_recoveries(
+    rows: np.ndarray, loss_steps: np.ndarray, V: float, d_star: float, params: ImpactParams
+) -> tuple[np.ndarray, np.ndarray]:
+    """First recovery step at or after each loss and whether there is one.
+
+    Recovery is `min_consecutive` consecutive rows with |mean_v - V| <= speed_tol
+    and |mean_gap - d_star| <= gap_tol_frac * d_star; the step of the first of
+    them is returned.
+    """
+
+    need = max(1, params.min_consecutive)
+    ok = (np.abs(rows["mean_v"] - V) <= params.speed_tol) & (
+        np.abs(rows["mean_gap"] - d_star) <= params.gap_tol_frac * d_star
+    )
+    idx = np.arange(len(rows))
+    # Length of the run of ok rows ending at each row.
+    run = idx - np.maximum.accumulate(np.where(ok, -1, idx))
+    done = np.flatnonzero(run >= need)
+    # A run counted from the loss row ends `need - 1` rows after it at the earliest.
+    first = np.searchsorted(rows["step"], loss_steps, "left") + need - 1
+    pos = np.searchsorted(done, first)
+    hit = pos < len(done)
+    if not len(done):
+        return np.zeros(len(loss_steps), dtype=np.int64), hit
+    return rows["step"][done[np.minimum(pos, len(done) - 1)]] - (params.min_consecutive - 1), hit
+
+
+def loss_impact(rows: np.ndarray, loss_steps: Sequence[int], params: ImpactParams = ImpactParams()) -> np.ndarray:
+    """IMPACT_DTYPE records of every loss step, for (non-empty) summary rows sorted by step."""
+
+    losses = np.asarray(loss_steps, dtype=np.int64)
+    out = np.zeros(len(losses), dtype=IMPACT_DTYPE)
+    out["step"] = losses
+    if not len(losses):
+        return out
+    V, d_star = nominal(rows, params)
+    steps = rows["step"]
+
+    # Whether each loss-relative step has a row, and its value of a column (NaN without).
+    def at(col: str, offset: int) -> tuple[np.ndarray, np.ndarray]:
+        pos = np.minimum(np.searchsorted(steps, losses + offset), len(steps) - 1)
+        present = steps[pos] == losses + offset
+        return present, np.where(present, rows[col][pos], np.nan)
+
+    pre0 = np.maximum(0, losses - params.pre)
+    for col in ("mean_v", "mean_gap"):
+        base = window_means(rows, col, pre0, losses)
+        has_pre = np.searchsorted(steps, pre0) < np.searchsorted(steps, losses)
+        out[f"baseline_{col}"] = np.where(has_pre, base, at(col, 0)[1])
+
+    out["peak_step"], out["peak_v"] = find_peaks(rows, losses, params.post)
+    out["delta_v"] = out["peak_v"] - out["baseline_mean_v"]
+
+    has0, v0 = at("mean_v", 0)
+    has1, v1 = at("mean_v", params.slope_window)
+    slope = (v1 - v0) / params.slope_window if params.slope_window > 0 else 0.0
+    out["slope_v_per_step"] = np.where(has0 & has1, slope, np.nan)
+
+    out["recovery_step"], out["recovered"] = find_recoveries(rows, losses, V, d_star, params)
+    out["recovery_delay"] = out["recovery_step"] - losses
+    return out
+
+
+def run_name(summary: Path) -> str:
+    """summary_seed_3.csv -> summary_seed_3; runs/<name>/summary.csv -> <name>."""
+
+    return summary.parent.name if summary.stem == "summary" else summary.stem
+
+
+def sweep_summaries(patterns: Sequence[str]) -> list[Path]:
+    """Summary files of sweep directories (searched recursively) or glob patterns, sorted."""
+
+    found: set[Path] = set()
+    for pattern in patterns:
+        if Path(pattern).is_dir():
+            found.update(
+                p for p in Path(pattern).rglob("summary*") if p.suffix in SUMMARY_SUFFIXES and p.is_file()
+            )
         else:
-            ok_run = 0
-    return None
+            found.update(Path(p) for p in glob.glob(pattern, recursive=True))
+    return sorted(found)
+
+
+def _analyze_chunk(paths: Sequence[Path], loss_steps: Sequence[int], params: ImpactParams) -> list[dict[str, object]]:
+    out: list[dict[str, object]] = []
+    for path in paths:
+        rows = read_summary(path)
+        if not len(rows):
+            print(f"{path}: empty summary, skipped", file=sys.stderr)
+            continue
+        V, d_star = nominal(rows, params)
+        head = {"run": run_name(path), "summary_path": str(path), "V": V, "d_star": d_star}
+        out += [{**head, **dict(zip(IMPACT_DTYPE.names, rec))} for rec in loss_impact(rows, loss_steps, params).tolist()]
+    return out
+
+
+def analyze_files(
+    paths: Sequence[Path], loss_steps: Sequence[int], params: ImpactParams = ImpactParams(), *, jobs: int | None = None
+) -> list[dict[str, object]]:
+    """Tidy loss-impact rows (run, summary_path, V, d_star + IMPACT_DTYPE fields) of many summaries.
+
+    Files are analyzed in chunks on `jobs` processes (default: all cores; 1
+    runs in this process); rows keep the order of `paths`.
+    """
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths)))
+    if jobs == 1:
+        return _analyze_chunk(paths, loss_steps, params)
+    size = math.ceil(len(paths) / (jobs * 4))
+    chunks = [paths[k : k + size] for k in range(0, len(paths), size)]
+    with ProcessPoolExecutor(jobs) as pool:
+        parts = pool.map(_analyze_chunk, chunks, repeat(loss_steps), repeat(params))
+        return [row for part in parts for row in part]
+
+
+def _cells(row: dict[str, object], columns: Sequence[str]) -> list[object]:
+    """Values of a tidy row; NaN and the recovery of unrecovered losses are None (empty / null)."""
+
+    missing = {"recovery_step", "recovery_delay"} if not row["recovered"] else set()
+    return [
+        None if c in missing or (isinstance(row[c], float) and math.isnan(row[c])) else row[c]  # type: ignore[arg-type]
+        for c in columns
+    ]
+
+
+def write_table(rows: list[dict[str, object]], out: Path | None) -> None:
+    """Write tidy rows as CSV (stdout when `out` is None) or, for a .parquet path, Parquet."""
+
+    columns = ["run", "summary_path", "V", "d_star", *IMPACT_DTYPE.names]
+    if out is not None and out.suffix == ".parquet":
+        if pyarrow is None:
+            raise SystemExit("writing Parquet needs the pyarrow package; use a .csv --out")
+        cells = [_cells(row, columns) for row in rows]
+        pyarrow.parquet.write_table(pyarrow.table({c: [r[k] for r in cells] for k, c in enumerate(columns)}), out)
+        return
+    with open(out, "w", newline="") if out is not None else nullcontext(sys.stdout) as f:
+        w = csv.writer(f)
+        w.writerow(columns)
+        for row in rows:
+            cells = _cells(row, columns)
+            w.writerow(["" if v is None else f"{v:.6f}" if isinstance(v, float) else v for v in cells])
 
 
 def main() -> None:
     ap = argparse.ArgumentParser()
-    ap.add_argument("--summary", type=Path, required=True)
+    inputs = ap.add_mutually_exclusive_group(required=True)
+    inputs.add_argument("--summary", type=Path)
+    inputs.add_argument(
+        "--sweep",
+        action="append",
+        metavar="DIR|GLOB",
+        help="batch mode: summaries of a sweep directory or glob pattern (repeatable)",
+    )
     ap.add_argument("--losses", type=Path, required=True)
     ap.add_argument("--trace", type=Path, default=None)
+    ap.add_argument("--out", type=Path, default=None, help="batch table (.csv or .parquet; default: CSV on stdout)")
+    ap.add_argument("--jobs", type=int, default=None, help="batch worker processes (default: all cores)")
 
     ap.add_argument(
         "--V",
@@ -182,19 +339,37 @@ def main() -> None:
 
     args = ap.parse_args()
 
-    summary_rows = read_summary(args.summary)
+    params = ImpactParams(
+        pre=args.pre,
+        post=args.post,
+        slope_window=args.slope_window,
+        speed_tol=args.speed_tol,
+        gap_tol_frac=args.gap_tol_frac,
+        min_consecutive=args.min_consecutive,
+        V=args.V,
+        d_star=args.d_star,
+    )
     loss_steps = read_loss_steps(args.losses)
+
+    if args.sweep:
+        paths = sweep_summaries(args.sweep)
+        if not paths:
+            raise SystemExit("No summary files found.")
+        if not loss_steps:
+            raise SystemExit("No loss steps found.")
+        rows = analyze_files(paths, loss_steps, params, jobs=args.jobs)
+        write_table(rows, args.out)
+        if args.out is not None:
+            print(f"Wrote {args.out} ({len(paths)} summaries, {len(rows)} rows)")
+        return
+
+    summary_rows = read_summary(args.summary)
     spare_steps = read_spare_steps_from_trace(args.trace) if args.trace else []
 
-    if not summary_rows:
+    if not len(summary_rows):
         raise SystemExit("Empty summary file.")
 
-    inferred_V = summary_rows[0].mean_v
-    inferred_d_star = summary_rows[0].mean_gap
-    V = float(args.V) if args.V is not None else float(inferred_V)
-    d_star = float(args.d_star) if args.d_star is not None else float(inferred_d_star)
-
-    by_step = index_by_step(summary_rows)
+    V, d_star = nominal(summary_rows, params)
 
     print("summary_file", str(args.summary))
     print("loss_file", str(args.losses))
@@ -210,40 +385,12 @@ def main() -> None:
         raise SystemExit("No loss steps found.")
 
     print("step,baseline_mean_v,baseline_mean_gap,peak_step,peak_v,delta_v,slope_v_per_step,recovery_step,recovery_delay")
-    for loss_step in loss_steps:
-        # Baseline just before loss
-        pre0 = max(0, loss_step - args.pre)
-        pre_steps = [s for s in range(pre0, loss_step) if s in by_step]
-        if pre_steps:
-            base_v = sum(by_step[s].mean_v for s in pre_steps) / len(pre_steps)
-            base_g = sum(by_step[s].mean_gap for s in pre_steps) / len(pre_steps)
-        else:
-            base_v = by_step[loss_step].mean_v if loss_step in by_step else float("nan")
-            base_g = by_step[loss_step].mean_gap if loss_step in by_step else float("nan")
-
-        peak_step, peak_v = find_peak(summary_rows, loss_step, args.post)
-        delta_v = peak_v - base_v
-
-        s0 = loss_step
-        s1 = loss_step + args.slope_window
-        if s0 in by_step and s1 in by_step:
-            slope = linear_slope(by_step[s0].mean_v, by_step[s1].mean_v, args.slope_window)
-        else:
-            slope = float("nan")
-
-        rec_step = first_recovery_step(
-            summary_rows,
-            start_step=loss_step,
-            V=V,
-            d_star=d_star,
-            speed_tol=args.speed_tol,
-            gap_tol_frac=args.gap_tol_frac,
-            min_consecutive=args.min_consecutive,
-        )
-        rec_delay = (rec_step - loss_step) if rec_step is not None else ""
-
+    for loss_step, base_v, base_g, peak_step, peak_v, delta_v, slope, recovered, rec_step, rec_delay in loss_impact(
+        summary_rows, loss_steps, params
+    ).tolist():
+        rec_step, rec_delay = (rec_step, rec_delay) if recovered else ("", "")
         print(
-            f"{loss_step},{base_v:.6f},{base_g:.6f},{peak_step},{peak_v:.6f},{delta_v:.6f},{slope if slope == slope else ''},{rec_step if rec_step is not None else ''},{rec_delay}"
+            f"{loss_step},{base_v:.6f},{base_g:.6f},{peak_step},{peak_v:.6f},{delta_v:.6f},{slope if slope == slope else ''},{rec_step},{rec_delay}"
         )
 
 
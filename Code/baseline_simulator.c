@@ -1,12 +1,23 @@
+#define _GNU_SOURCE         /* fopencookie() for --stream */
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
 #include <math.h>
+#include <stddef.h>
 #include <stdint.h>
+#include <limits.h>
+#include <float.h>
+#include <pthread.h>
+#include <time.h>
+#include <zlib.h>
+#ifndef BSIM_LIBRARY
+#include <sys/resource.h>
+#endif
 
 /* Baseline local spacing control (Algorithm~\ref{alg:baseline} in methodology.tex)
  * - Inputs: simple key=value scenario file + CSV losses
  * - Outputs: final density/spacing metrics to stdout
+ * - Batch mode (--batch): many runs from a manifest in one process
  */
 
 typedef struct {
@@ -48,24 +59,21 @@ typedef struct {
     int loss_to_spare_delay_max_steps;
     double preventive_spares_frac;     /* optional: maintain +floor(frac*n_initial) extra drones deployed */
     int preventive_spares;             /* derived/cached */
-} Scenario;
 
-typedef struct {
-    double s;      /* curvilinear position on perimeter */
-    double v;      /* current speed */
-    int alive;     /* 1 alive, 0 failed */
-    int ever_deployed; /* 1 once activated at least once; distinguishes standby from failed */
-    int mode;      /* 0=BASELINE, 1=INCOMING (unused in this minimal build) */
-    int incoming_timer; /* steps remaining at fixed speed when incoming */
-    double gap_f;  /* front gap (computed per step) */
-    double gap_b;  /* back gap (computed per step) */
-} Drone;
+    /* Output decimation (files only; in-memory row buffers get every step) */
+    int summary_every;          /* write the summary every N steps */
+    int trace_every;            /* write the trace every N steps */
+    int trace_alive_only;       /* leave dead/standby drones out of the trace */
+    int event_window;           /* also write every step within N steps of a loss/spare insertion (0 = off) */
+    char trace_idx[128];        /* trace only these drones, e.g. "0-4,7" (empty = all) */
+} Scenario;
 
 typedef struct {
     int step;
     int idx;
 } Loss;
 
+#ifndef BSIM_LIBRARY
 static int parse_loss_line(const char *line, int *step, int *idx) {
     const char *sep = strpbrk(line, ",;");
     if (!sep) return 0;
@@ -73,6 +81,7 @@ static int parse_loss_line(const char *line, int *step, int *idx) {
     *idx = atoi(sep + 1);
     return 1;
 }
+#endif
 
 static void trim_inplace(char *s) {
     if (!s) return;
@@ -116,66 +125,79 @@ static int rng_uniform_int(uint32_t *state, int min_incl, int max_incl) {
     return min_incl + (int)(r % span);
 }
 
-static int read_scenario(const char *path, Scenario *s) {
-    FILE *f = fopen(path, "r");
-    if (!f) return -1;
-    char line[256];
-    while (fgets(line, sizeof(line), f)) {
-        strip_inline_comment(line);
-        trim_inplace(line);
-        if (line[0] == '\0') continue;
-        char key[64];
-        double val;
-        if (sscanf(line, " %63[^=]= %lf", key, &val) == 2) {
-            trim_inplace(key);
-            if (strcmp(key, "n") == 0) {
-                int n = (int)val;
-                if (s->n_initial <= 0) s->n_initial = n;
-                if (s->n_total <= 0) s->n_total = n;
-            }
-            else if (strcmp(key, "n_initial") == 0) s->n_initial = (int)val;
-            else if (strcmp(key, "n_total") == 0) s->n_total = (int)val;
-            else if (strcmp(key, "perimeter") == 0) s->perimeter = val;
-            else if (strcmp(key, "V") == 0) s->V = val;
-            else if (strcmp(key, "Vmax") == 0) s->Vmax = val;
-            else if (strcmp(key, "d_star") == 0) s->d_star = val;
-            else if (strcmp(key, "d_safe") == 0) s->d_safe = val;
-            else if (strcmp(key, "k_sym") == 0) s->k_sym = val;
-            else if (strcmp(key, "k_sym_rec") == 0) s->k_sym_rec = val;
-            else if (strcmp(key, "w_back") == 0) s->k_sym = val; /* backward compat: w_back now aliases k_sym */
-            else if (strcmp(key, "k_f") == 0) s->k_f = val;
-            else if (strcmp(key, "k_b") == 0) s->k_b = val;
-            else if (strcmp(key, "k_rep") == 0) s->k_rep = val;
-            else if (strcmp(key, "k_f_rec") == 0) s->k_f_rec = val;
-            else if (strcmp(key, "k_b_rec") == 0) s->k_b_rec = val;
-            else if (strcmp(key, "alpha") == 0) s->alpha = val;
-            else if (strcmp(key, "beta") == 0) s->beta = val;
-            else if (strcmp(key, "V_cap") == 0) s->V_cap = val;
-            else if (strcmp(key, "epsilon") == 0) s->epsilon = val;
-            else if (strcmp(key, "steps") == 0) s->steps = (int)val;
-            else if (strcmp(key, "dt") == 0) s->dt = val;
-            else if (strcmp(key, "num_losses") == 0) s->num_losses = (int)val;
-            else if (strcmp(key, "seed") == 0) s->seed = (unsigned int)val;
-            else if (strcmp(key, "resilience") == 0) s->resilience = (int)val;
-            else if (strcmp(key, "min_spare_delay_steps") == 0) s->min_spare_delay_steps = (int)val;
-            else if (strcmp(key, "min_spare_interval_steps") == 0) s->min_spare_interval_steps = (int)val;
-            else if (strcmp(key, "spare_interval_min_steps") == 0) s->spare_interval_min_steps = (int)val;
-            else if (strcmp(key, "spare_interval_max_steps") == 0) s->spare_interval_max_steps = (int)val;
-            else if (strcmp(key, "incoming_hold_steps") == 0) s->incoming_hold_steps = (int)val;
-            else if (strcmp(key, "incoming_v") == 0) s->incoming_v = val;
-            else if (strcmp(key, "extra_spares") == 0) s->extra_spares = (int)val;
-            else if (strcmp(key, "max_spares") == 0) s->max_spares = (int)val;
-
-            else if (strcmp(key, "controller_mode") == 0) s->controller_mode = (int)val;
-            else if (strcmp(key, "variantA_gamma") == 0) s->variantA_gamma = val;
-            else if (strcmp(key, "balanced_gap_eps") == 0) s->balanced_gap_eps = val;
-            else if (strcmp(key, "speed_relax_rate") == 0) s->speed_relax_rate = val;
-            else if (strcmp(key, "loss_to_spare_delay_min_steps") == 0) s->loss_to_spare_delay_min_steps = (int)val;
-            else if (strcmp(key, "loss_to_spare_delay_max_steps") == 0) s->loss_to_spare_delay_max_steps = (int)val;
-            else if (strcmp(key, "preventive_spares_frac") == 0) s->preventive_spares_frac = val;
-        }
+static void scenario_defaults(Scenario *s) {
+    memset(s, 0, sizeof(*s));
+    s->V = 1.0; s->Vmax = 2.0; s->d_star = 5.0; s->d_safe = 1.0;
+    s->k_sym = 0.5; s->k_sym_rec = 0.5; /* symmetric gap controller (front-back) */
+    s->k_f = 0.5; s->k_b = 0.3; s->k_rep = 0.2; s->k_f_rec = 0.8; s->k_b_rec = 0.0;
+    s->alpha = 1.2; s->beta = 0.8; s->V_cap = 1.5; s->epsilon = 0.1; s->steps = 500; s->dt = 0.1;
+    s->num_losses = 0; s->seed = 1; s->resilience = 0; s->min_spare_delay_steps = 0; s->min_spare_interval_steps = 0;
+    s->spare_interval_min_steps = 0; s->spare_interval_max_steps = 0; s->incoming_hold_steps = 50;
+    s->incoming_v = 0.0; s->extra_spares = 0; s->max_spares = 0;
+
+    s->controller_mode = 0; s->variantA_gamma = 0.0; s->balanced_gap_eps = 0.0; s->speed_relax_rate = 1.0;
+    s->loss_to_spare_delay_min_steps = 0; s->loss_to_spare_delay_max_steps = 0;
+    s->preventive_spares_frac = 0.0; s->preventive_spares = 0;
+    s->summary_every = 1; s->trace_every = 1;
+}
+
+/* Apply one key=value setting; returns 0 for unknown keys. */
+static int apply_scenario_key(Scenario *s, const char *key, double val) {
+    if (strcmp(key, "n") == 0) {
+        int n = (int)val;
+        if (s->n_initial <= 0) s->n_initial = n;
+        if (s->n_total <= 0) s->n_total = n;
     }
-    fclose(f);
+    else if (strcmp(key, "n_initial") == 0) s->n_initial = (int)val;
+    else if (strcmp(key, "n_total") == 0) s->n_total = (int)val;
+    else if (strcmp(key, "perimeter") == 0) s->perimeter = val;
+    else if (strcmp(key, "V") == 0) s->V = val;
+    else if (strcmp(key, "Vmax") == 0) s->Vmax = val;
+    else if (strcmp(key, "d_star") == 0) s->d_star = val;
+    else if (strcmp(key, "d_safe") == 0) s->d_safe = val;
+    else if (strcmp(key, "k_sym") == 0) s->k_sym = val;
+    else if (strcmp(key, "k_sym_rec") == 0) s->k_sym_rec = val;
+    else if (strcmp(key, "w_back") == 0) s->k_sym = val; /* backward compat: w_back now aliases k_sym */
+    else if (strcmp(key, "k_f") == 0) s->k_f = val;
+    else if (strcmp(key, "k_b") == 0) s->k_b = val;
+    else if (strcmp(key, "k_rep") == 0) s->k_rep = val;
+    else if (strcmp(key, "k_f_rec") == 0) s->k_f_rec = val;
+    else if (strcmp(key, "k_b_rec") == 0) s->k_b_rec = val;
+    else if (strcmp(key, "alpha") == 0) s->alpha = val;
+    else if (strcmp(key, "beta") == 0) s->beta = val;
+    else if (strcmp(key, "V_cap") == 0) s->V_cap = val;
+    else if (strcmp(key, "epsilon") == 0) s->epsilon = val;
+    else if (strcmp(key, "steps") == 0) s->steps = (int)val;
+    else if (strcmp(key, "dt") == 0) s->dt = val;
+    else if (strcmp(key, "num_losses") == 0) s->num_losses = (int)val;
+    else if (strcmp(key, "seed") == 0) s->seed = (unsigned int)val;
+    else if (strcmp(key, "resilience") == 0) s->resilience = (int)val;
+    else if (strcmp(key, "min_spare_delay_steps") == 0) s->min_spare_delay_steps = (int)val;
+    else if (strcmp(key, "min_spare_interval_steps") == 0) s->min_spare_interval_steps = (int)val;
+    else if (strcmp(key, "spare_interval_min_steps") == 0) s->spare_interval_min_steps = (int)val;
+    else if (strcmp(key, "spare_interval_max_steps") == 0) s->spare_interval_max_steps = (int)val;
+    else if (strcmp(key, "incoming_hold_steps") == 0) s->incoming_hold_steps = (int)val;
+    else if (strcmp(key, "incoming_v") == 0) s->incoming_v = val;
+    else if (strcmp(key, "extra_spares") == 0) s->extra_spares = (int)val;
+    else if (strcmp(key, "max_spares") == 0) s->max_spares = (int)val;
+
+    else if (strcmp(key, "controller_mode") == 0) s->controller_mode = (int)val;
+    else if (strcmp(key, "variantA_gamma") == 0) s->variantA_gamma = val;
+    else if (strcmp(key, "balanced_gap_eps") == 0) s->balanced_gap_eps = val;
+    else if (strcmp(key, "speed_relax_rate") == 0) s->speed_relax_rate = val;
+    else if (strcmp(key, "loss_to_spare_delay_min_steps") == 0) s->loss_to_spare_delay_min_steps = (int)val;
+    else if (strcmp(key, "loss_to_spare_delay_max_steps") == 0) s->loss_to_spare_delay_max_steps = (int)val;
+    else if (strcmp(key, "preventive_spares_frac") == 0) s->preventive_spares_frac = val;
+    else if (strcmp(key, "summary_every") == 0) s->summary_every = (int)val;
+    else if (strcmp(key, "trace_every") == 0) s->trace_every = (int)val;
+    else if (strcmp(key, "trace_alive_only") == 0) s->trace_alive_only = (int)val;
+    else if (strcmp(key, "event_window") == 0) s->event_window = (int)val;
+    else return 0;
+    return 1;
+}
+
+/* Derived values and clamping; call once after all keys are applied. */
+static void finalize_scenario(Scenario *s) {
     if (s->n_total <= 0 && s->n_initial > 0) s->n_total = s->n_initial;
     if (s->n_initial <= 0 && s->n_total > 0) s->n_initial = s->n_total;
     if (s->n_total < s->n_initial) s->n_total = s->n_initial;
@@ -214,6 +236,47 @@ static int read_scenario(const char *path, Scenario *s) {
     }
     if (s->preventive_spares < 0) s->preventive_spares = 0;
 
+    if (s->summary_every < 1) s->summary_every = 1;
+    if (s->trace_every < 1) s->trace_every = 1;
+    if (s->event_window < 0) s->event_window = 0;
+}
+
+/* trace_idx is the only non-numeric key: indices and ranges, e.g. "0-4,7". */
+static int set_trace_idx(Scenario *s, const char *text) {
+    size_t len = strlen(text);
+    if (len >= sizeof(s->trace_idx) || strspn(text, "0123456789,-") != len) return 0;
+    memcpy(s->trace_idx, text, len + 1);
+    return 1;
+}
+
+/* Parse "key=value" (comments and surrounding blanks allowed) and apply it. */
+static int apply_scenario_line(Scenario *s, char *line) {
+    strip_inline_comment(line);
+    trim_inplace(line);
+    if (line[0] == '\0') return 1;
+    char key[64];
+    char text[128];
+    double val;
+    if (sscanf(line, " %63[^=]= %127s", key, text) == 2) {
+        trim_inplace(key);
+        if (strcmp(key, "trace_idx") == 0) return set_trace_idx(s, text);
+    }
+    if (sscanf(line, " %63[^=]= %lf", key, &val) != 2) return 0;
+    trim_inplace(key);
+    return apply_scenario_key(s, key, val);
+}
+
+/* File readers (command line and batch mode; the library takes data in memory) */
+#ifndef BSIM_LIBRARY
+/* Reads key=value settings on top of *s; does not finalize. */
+static int read_scenario(const char *path, Scenario *s) {
+    FILE *f = fopen(path, "r");
+    if (!f) return -1;
+    char line[256];
+    while (fgets(line, sizeof(line), f)) {
+        apply_scenario_line(s, line);
+    }
+    fclose(f);
     return 0;
 }
 
@@ -242,6 +305,7 @@ static int read_losses(const char *path, Loss **losses_out, int *count_out) {
     *count_out = count;
     return 0;
 }
+#endif
 
 typedef struct {
     int idx;
@@ -278,352 +342,1078 @@ static void generate_losses(const Scenario *s, Loss **losses_out, int *count_out
     *count_out = count;
 }
 
-static void compute_gaps(Drone *fleet, const Scenario *s) {
-    int n = s->n_total;
-    Ordered *order = malloc(n * sizeof(Ordered));
-    int alive_count = 0;
-    /* reset gaps each step; dead drones stay at zero */
+/* Alive drones in ascending position order, kept across steps.
+ * Speeds are bounded, so the cyclic order barely changes between steps:
+ * ring_fixup() is an insertion pass that costs O(n) when nothing moved, plus
+ * one shift per overtake or per drone wrapping past s=perimeter (tail->head).
+ * Losses and spare insertions update the ring in place; no per-step allocation.
+ * Positions are read as pos[idx * stride] (see Ensemble below).
+ */
+typedef struct {
+    int *order;
+    int count;
+} Ring;
+
+static void ring_init(Ring *ring, const double *pos, const int *alive, int stride, int n) {
+    Ordered *tmp = malloc((n > 0 ? n : 1) * sizeof(Ordered));
+    int count = 0;
     for (int i = 0; i < n; i++) {
-        fleet[i].gap_f = 0.0;
-        fleet[i].gap_b = 0.0;
-        order[i].idx = i;
-        order[i].pos = fleet[i].s;
-        if (fleet[i].alive) alive_count++;
-    }
-    /* sort by position */
-    qsort(order, n, sizeof(Ordered), cmp_pos);
-    /* compute gaps only for alive drones */
-    int prev_alive = -1;
-    double prev_pos = 0;
-    double first_pos = -1, last_pos = -1;
-    for (int k = 0; k < n; k++) {
-        int idx = order[k].idx;
-        if (!fleet[idx].alive) continue;
-        double pos = order[k].pos;
-        if (first_pos < 0) first_pos = pos;
-        if (prev_alive >= 0) {
-            double gap = pos - prev_pos;
-            fleet[idx].gap_b = gap;
-            fleet[prev_alive].gap_f = gap;
-        }
-        prev_alive = idx;
-        prev_pos = pos;
-        last_pos = pos;
+        if (!alive[i * stride]) continue;
+        tmp[count].idx = i;
+        tmp[count].pos = pos[i * stride];
+        count++;
     }
-    /* close the ring */
-    if (alive_count > 1) {
-        double wrap_gap = s->perimeter - last_pos + first_pos;
-        fleet[prev_alive].gap_f = wrap_gap;
-        for (int k = 0; k < n; k++) {
-            int idx = order[k].idx;
-            if (!fleet[idx].alive) continue;
-            if (fleet[idx].gap_b == 0 && idx != prev_alive) {
-                /* set back gap when not yet set */
-                fleet[idx].gap_b = (idx == order[0].idx) ? wrap_gap : fleet[idx].gap_b;
-            }
+    qsort(tmp, count, sizeof(Ordered), cmp_pos);
+    ring->order = malloc((n > 0 ? n : 1) * sizeof(int));
+    for (int k = 0; k < count; k++) ring->order[k] = tmp[k].idx;
+    ring->count = count;
+    free(tmp);
+}
+
+static void ring_free(Ring *ring) {
+    free(ring->order);
+    ring->order = NULL;
+    ring->count = 0;
+}
+
+/* First slot in order[0..hi) whose position is > x. */
+static int ring_upper_bound(const Ring *ring, const double *pos, int stride, int hi, double x) {
+    int lo = 0;
+    while (lo < hi) {
+        int mid = (lo + hi) / 2;
+        if (pos[ring->order[mid] * stride] <= x) lo = mid + 1;
+        else hi = mid;
+    }
+    return lo;
+}
+
+static void ring_remove(Ring *ring, int idx) {
+    for (int k = 0; k < ring->count; k++) {
+        if (ring->order[k] != idx) continue;
+        memmove(&ring->order[k], &ring->order[k + 1], (ring->count - k - 1) * sizeof(int));
+        ring->count--;
+        return;
+    }
+}
+
+static void ring_insert(Ring *ring, const double *pos, int stride, int idx) {
+    int k = ring_upper_bound(ring, pos, stride, ring->count, pos[idx * stride]);
+    memmove(&ring->order[k + 1], &ring->order[k], (ring->count - k) * sizeof(int));
+    ring->order[k] = idx;
+    ring->count++;
+}
+
+static void ring_fixup(Ring *ring, const double *pos, int stride) {
+    int *ord = ring->order;
+    for (int k = 1; k < ring->count; k++) {
+        double x = pos[ord[k] * stride];
+        if (x >= pos[ord[k - 1] * stride]) continue;
+        int idx = ord[k];
+        int j = ring_upper_bound(ring, pos, stride, k, x);
+        memmove(&ord[j + 1], &ord[j], (k - j) * sizeof(int));
+        ord[j] = idx;
+    }
+}
+
+typedef struct {
+    double density;
+    double avg_speed;
+    double speed_std;
+    double max_gap;
+    double avg_gap;
+    double stability;
+} RunMetrics;
+
+/* Per-step fleet aggregates. Also the record layout of in-memory and binary summaries. */
+typedef struct {
+    int32_t step;
+    int32_t alive;
+    double mean_v, min_v, max_v, std_v;
+    double min_gap, max_gap, mean_gap, std_gap;
+} SummaryRow;
+
+/* Per-drone state at one step (same in binary traces). Gaps are NaN for dead drones (empty in CSV). */
+typedef struct {
+    int32_t step, idx, alive;
+    double s, v, gap_f, gap_b;
+} TraceRow;
+
+/* Output file formats: text CSV, the records above (see write_binary_header()),
+ * or the same records delta-coded and compressed in chunks (see ChunkWriter) */
+enum { OUTPUT_CSV = 0, OUTPUT_BINARY = 1, OUTPUT_ZDELTA = 2 };
+
+typedef struct ChunkWriter ChunkWriter;
+
+/* Where simulate() writes per-step data; every sink is optional. */
+typedef struct {
+    FILE *summary_file;
+    FILE *trace_file;
+    SummaryRow *summary_rows;   /* steps rows */
+    TraceRow *trace_rows;       /* steps * n_total rows */
+    int trace_stride;           /* rows per step in trace_rows (n_total) */
+    int format;                 /* of the files: OUTPUT_CSV, OUTPUT_BINARY or OUTPUT_ZDELTA */
+    ChunkWriter *summary_z;     /* OUTPUT_ZDELTA encoders, set up by write_output_headers() */
+    ChunkWriter *trace_z;
+} SimOutput;
+
+/* ---- Lockstep ensemble engine ----------------------------------------------
+ * simulate_ensemble() advances K replicas with the same n_total, steps and
+ * controller_mode together (seed sweeps, gain/hold families, ...).
+ * Per-drone state is struct-of-arrays, drone-major and replica-minor
+ * (x[i * K + r]), so the speed update is an inner loop over replicas with
+ * per-replica parameters, which the compiler vectorizes. Losses, spare
+ * insertion and the ring order are handled per replica (rare, branchy).
+ * Each replica produces exactly the output of a single run; simulate() is
+ * the K = 1 case.
+ */
+
+/* With an event_window, file rows wait event_window steps before they are
+ * written: by then it is known whether a loss or spare insertion happened
+ * within event_window steps of them (before or after). */
+typedef struct {
+    int cap;                    /* event_window + 1, or 0 to write rows directly */
+    int count;
+    int head;                   /* oldest row */
+    int *step;
+    SummaryRow *summary;        /* cap rows, with a summary file */
+    TraceRow *trace;            /* cap * n rows, with a trace file */
+} RowQueue;
+
+/* Step phases timed with --profile */
+enum {
+    PHASE_LOSSES, PHASE_GAPS, PHASE_SPARES, PHASE_SPEEDS, PHASE_INTEGRATE,
+    PHASE_SUMMARY, PHASE_TRACE, PHASE_OUTPUT, PHASE_COUNT
+};
+/* Monotonic-clock time and call count per phase, summed over simulate_ensemble() calls.
+ * losses/gaps/spares/summary/trace are per replica, speeds/integrate per
+ * ensemble step; summary and trace include writing their rows, output is
+ * headers and delayed (event_window) rows. */
+typedef struct {
+    int64_t ns[PHASE_COUNT];
+    int64_t calls[PHASE_COUNT];
+    int64_t simulate_ns;        /* whole simulate_ensemble() calls, incl. setup and metrics */
+    int64_t replica_steps;
+    int64_t drone_steps;        /* replica_steps * n_total */
+    int runs;                   /* replicas */
+} Profile;
+
+/* Current time in ns, or 0 without a profile. */
+static int64_t profile_clock(const Profile *p) {
+    if (!p) return 0;
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (int64_t)ts.tv_sec * 1000000000 + ts.tv_nsec;
+}
+
+/* Charge the time since t0 to a phase; returns the current time (start of the next phase). */
+static int64_t profile_add(Profile *p, int phase, int64_t t0) {
+    if (!p) return 0;
+    int64_t t = profile_clock(p);
+    p->ns[phase] += t - t0;
+    p->calls[phase]++;
+    return t;
+}
+
+typedef struct {
+    const Scenario *s;
+    const Loss *losses;
+    int loss_count;
+    SimOutput *out;
+    Ring ring;
+    int loss_idx;
+    int dead_deployed;          /* drones lost and not (yet) replaced in their slot */
+    int first_dead;             /* dead/standby drone first in position order, -1 if none */
+    int total_losses_seen;
+    int total_spares_inserted;
+    int next_spare_after_loss_step;
+    int next_spare_allowed_step;
+    uint32_t spare_rng;
+    int last_event;             /* step of the latest loss/spare insertion (tracked with an event_window) */
+    unsigned char *trace_mask;  /* drones written to the trace file, NULL = all */
+    RowQueue queue;
+} Replica;
+
+typedef struct {
+    int K;
+    int n;
+    int controller_mode;
+    /* per drone and replica, x[i * K + r] */
+    double *s;          /* curvilinear position on perimeter */
+    double *v;          /* current speed */
+    double *gap_f;      /* front gap (computed per step, alive drones only) */
+    double *gap_b;      /* back gap (computed per step, alive drones only) */
+    int *alive;         /* 1 alive, 0 failed or standby */
+    int *ever_deployed; /* 1 once activated at least once; distinguishes standby from failed */
+    int *mode;          /* 0=BASELINE, 1=INCOMING */
+    int *incoming_timer; /* steps remaining at fixed speed when incoming */
+    /* per replica controller parameters, copied out of the scenarios */
+    double *V, *Vmax, *d_safe, *k_sym, *k_sym_rec, *k_rep, *alpha_d, *beta_d, *V_cap;
+    double *gamma, *balanced_eps, *relax, *incoming_v, *dt, *perimeter;
+    double *target;     /* scratch, max(K, n) */
+    int *flag;          /* scratch, max(K, n) */
+    Replica *rep;
+    Profile *profile;   /* NULL unless profiling */
+} Ensemble;
+
+static uint32_t spare_rng_seed(unsigned int seed) {
+    return ((uint32_t)(seed ? seed : 1u)) ^ 0x9e3779b9u;
+}
+
+/* Dead and standby drones do not move, so the one sorting first only changes
+ * on losses and spare insertions. */
+static void update_first_dead(Ensemble *E, int r) {
+    int K = E->K;
+    const double *pos = E->s + r;
+    const int *alive = E->alive + r;
+    int first_dead = -1;
+    for (int i = 0; i < E->n; i++) {
+        if (!alive[i * K] && (first_dead < 0 || pos[i * K] < pos[first_dead * K])) first_dead = i;
+    }
+    E->rep[r].first_dead = first_dead;
+}
+
+/* Drones selected by a trace_idx list such as "0-4,7"; NULL selects all. */
+static unsigned char *trace_mask(const char *spec, int n) {
+    if (!spec[0]) return NULL;
+    unsigned char *mask = calloc(n > 0 ? n : 1, 1);
+    const char *p = spec;
+    while (*p) {
+        char *end;
+        long lo = strtol(p, &end, 10), hi = lo;
+        if (end == p) {
+            p++;
+            continue;
         }
-        /* set back gap for first alive */
-        for (int k = 0; k < n; k++) {
-            int idx = order[k].idx;
-            if (!fleet[idx].alive) continue;
-            if (idx == order[0].idx) {
-                fleet[idx].gap_b = wrap_gap;
-                break;
-            }
+        if (*end == '-' && end[1] >= '0' && end[1] <= '9') hi = strtol(end + 1, &end, 10);
+        for (long i = lo < 0 ? 0 : lo; i <= hi && i < n; i++) mask[i] = 1;
+        p = end;
+    }
+    return mask;
+}
+
+static void row_queue_init(RowQueue *q, const SimOutput *out, int window, int n) {
+    memset(q, 0, sizeof(*q));
+    if (window <= 0 || !(out->summary_file || out->trace_file)) return;
+    q->cap = window + 1;
+    q->step = calloc(q->cap, sizeof(int));
+    if (out->summary_file) q->summary = calloc(q->cap, sizeof(SummaryRow));
+    if (out->trace_file) q->trace = calloc((size_t)q->cap * (size_t)(n > 0 ? n : 1), sizeof(TraceRow));
+}
+
+static void ensemble_init(Ensemble *E, const Scenario *const *sc, const Loss *const *losses,
+                          const int *loss_counts, SimOutput *outs, int K) {
+    int n = sc[0]->n_total;
+    size_t cells = (size_t)(n > 0 ? n : 1) * (size_t)K;
+    E->K = K;
+    E->n = n;
+    E->controller_mode = sc[0]->controller_mode;
+    E->s = calloc(cells, sizeof(double));
+    E->v = calloc(cells, sizeof(double));
+    E->gap_f = calloc(cells, sizeof(double));
+    E->gap_b = calloc(cells, sizeof(double));
+    E->alive = calloc(cells, sizeof(int));
+    E->ever_deployed = calloc(cells, sizeof(int));
+    E->mode = calloc(cells, sizeof(int));
+    E->incoming_timer = calloc(cells, sizeof(int));
+    double **params[] = { &E->V, &E->Vmax, &E->d_safe, &E->k_sym, &E->k_sym_rec, &E->k_rep,
+                          &E->alpha_d, &E->beta_d, &E->V_cap, &E->gamma, &E->balanced_eps,
+                          &E->relax, &E->incoming_v, &E->dt, &E->perimeter };
+    for (size_t p = 0; p < sizeof(params) / sizeof(params[0]); p++) *params[p] = calloc(K, sizeof(double));
+    int span = K > n ? K : (n > 0 ? n : 1);
+    E->target = calloc(span, sizeof(double));
+    E->flag = calloc(span, sizeof(int));
+    E->rep = calloc(K, sizeof(Replica));
+
+    for (int r = 0; r < K; r++) {
+        const Scenario *s = sc[r];
+        E->V[r] = s->V;
+        E->Vmax[r] = s->Vmax;
+        E->d_safe[r] = s->d_safe;
+        E->k_sym[r] = s->k_sym;
+        E->k_sym_rec[r] = s->k_sym_rec;
+        E->k_rep[r] = s->k_rep;
+        E->alpha_d[r] = s->alpha * s->d_star;
+        E->beta_d[r] = s->beta * s->d_star;
+        E->V_cap[r] = s->V_cap;
+        E->gamma[r] = s->variantA_gamma;
+        E->balanced_eps[r] = s->balanced_gap_eps;
+        E->relax[r] = s->speed_relax_rate;
+        E->incoming_v[r] = s->incoming_v;
+        E->dt[r] = s->dt;
+        E->perimeter[r] = s->perimeter;
+        for (int i = 0; i < n; i++) {
+            int c = i * K + r;
+            E->s[c] = fmod(i * (s->perimeter / (s->n_initial > 0 ? s->n_initial : 1)), s->perimeter);
+            E->v[c] = s->V;
+            E->alive[c] = (i < s->n_initial) ? 1 : 0;
+            E->ever_deployed[c] = (i < s->n_initial) ? 1 : 0;
         }
+
+        Replica *R = &E->rep[r];
+        R->s = s;
+        R->losses = losses[r];
+        R->loss_count = loss_counts[r];
+        R->out = &outs[r];
+        ring_init(&R->ring, E->s + r, E->alive + r, K, n);
+        update_first_dead(E, r);
+        R->next_spare_after_loss_step = -1000000;
+        R->next_spare_allowed_step = -1000000;
+        R->spare_rng = spare_rng_seed(s->seed);
+        R->last_event = -1000000;
+        R->trace_mask = trace_mask(s->trace_idx, n);
+        row_queue_init(&R->queue, R->out, s->event_window, n);
     }
-    free(order);
 }
 
-static int find_spare_slot(Drone *fleet, int n) {
-    /* Prefer true standby (never deployed) over reusing a failed index. */
-    for (int i = 0; i < n; i++) {
-        if (!fleet[i].alive && !fleet[i].ever_deployed) return i;
+static void ensemble_free(Ensemble *E) {
+    for (int r = 0; r < E->K; r++) {
+        Replica *R = &E->rep[r];
+        ring_free(&R->ring);
+        free(R->trace_mask);
+        free(R->queue.step);
+        free(R->queue.summary);
+        free(R->queue.trace);
     }
-    for (int i = 0; i < n; i++) {
-        if (!fleet[i].alive) return i;
+    void *blocks[] = { E->s, E->v, E->gap_f, E->gap_b, E->alive, E->ever_deployed, E->mode,
+                       E->incoming_timer, E->V, E->Vmax, E->d_safe, E->k_sym, E->k_sym_rec,
+                       E->k_rep, E->alpha_d, E->beta_d, E->V_cap, E->gamma, E->balanced_eps,
+                       E->relax, E->incoming_v, E->dt, E->perimeter, E->target, E->flag, E->rep };
+    for (size_t b = 0; b < sizeof(blocks) / sizeof(blocks[0]); b++) free(blocks[b]);
+}
+
+/* Front/back gaps of the alive drones. Gaps of dead drones are never read
+ * (summaries, traces and metrics skip them), so they are not reset. */
+static void compute_gaps(Ensemble *E, int r) {
+    int K = E->K;
+    const double *pos = E->s + r;
+    double *gap_f = E->gap_f + r;
+    double *gap_b = E->gap_b + r;
+    Ring *ring = &E->rep[r].ring;
+    int first_dead = E->rep[r].first_dead;
+    ring_fixup(ring, pos, K);
+    int count = ring->count;
+    const int *ord = ring->order;
+    if (count < 2) {
+        /* a lone drone has no neighbours */
+        if (count == 1) gap_f[ord[0] * K] = gap_b[ord[0] * K] = 0.0;
+        return;
+    }
+    for (int k = 1; k < count; k++) {
+        double gap = pos[ord[k] * K] - pos[ord[k - 1] * K];
+        gap_b[ord[k] * K] = gap;
+        gap_f[ord[k - 1] * K] = gap;
+    }
+    /* close the ring */
+    double wrap_gap = E->perimeter[r] - pos[ord[count - 1] * K] + pos[ord[0] * K];
+    gap_f[ord[count - 1] * K] = wrap_gap;
+    /* Historical behaviour, kept so results stay reproducible: the first alive
+     * drone only gets the wrap gap as its back gap when no dead/standby drone
+     * sits before it (ties broken by index, as the former stable sort did);
+     * otherwise its back gap stays 0. */
+    int first = ord[0];
+    if (first_dead < 0 || pos[first_dead * K] > pos[first * K] ||
+        (pos[first_dead * K] == pos[first * K] && first_dead > first)) {
+        gap_b[first * K] = wrap_gap;
+    } else {
+        gap_b[first * K] = 0.0;
     }
-    return -1;
 }
 
-static int find_largest_gap(const Drone *fleet, const Scenario *s, int *from_idx, double *from_pos, double *gap_out) {
-    int n = s->n_total;
-    Ordered *order = malloc(n * sizeof(Ordered));
-    int alive_count = 0;
-    for (int i = 0; i < n; i++) {
-        order[i].idx = i;
-        order[i].pos = fleet[i].s;
-        if (fleet[i].alive) alive_count++;
+static int find_spare_slot(const Ensemble *E, int r) {
+    /* Prefer true standby (never deployed) over reusing a failed index. */
+    for (int i = 0; i < E->n; i++) {
+        int c = i * E->K + r;
+        if (!E->alive[c] && !E->ever_deployed[c]) return i;
     }
-    if (alive_count < 2) {
-        free(order);
-        return 0;
+    for (int i = 0; i < E->n; i++) {
+        if (!E->alive[i * E->K + r]) return i;
     }
-    qsort(order, n, sizeof(Ordered), cmp_pos);
+    return -1;
+}
+
+/* Largest front gap among alive drones; needs gaps from compute_gaps() on the current positions. */
+static int find_largest_gap(const Ensemble *E, int r, int *from_idx, double *from_pos, double *gap_out) {
+    const Ring *ring = &E->rep[r].ring;
+    if (ring->count < 2) return 0;
     double best_gap = -1.0;
     int best_from = -1;
-    double best_pos = 0.0;
-    int first_alive_seen = 0;
-    double first_pos = 0.0;
-    double prev_pos = 0.0;
-    int prev_idx = -1;
-    for (int k = 0; k < n; k++) {
-        int idx = order[k].idx;
-        if (!fleet[idx].alive) continue;
-        double pos = order[k].pos;
-        if (!first_alive_seen) {
-            first_alive_seen = 1;
-            first_pos = pos;
-        }
-        if (prev_idx != -1) {
-            double gap = pos - prev_pos;
-            if (gap > best_gap) {
-                best_gap = gap;
-                best_from = prev_idx;
-                best_pos = prev_pos;
-            }
+    for (int k = 0; k < ring->count; k++) {
+        int idx = ring->order[k];
+        double g = E->gap_f[idx * E->K + r];
+        if (g > best_gap) {
+            best_gap = g;
+            best_from = idx;
         }
-        prev_idx = idx;
-        prev_pos = pos;
     }
-    /* wrap gap */
-    double wrap_gap = s->perimeter - prev_pos + first_pos;
-    if (wrap_gap > best_gap) {
-        best_gap = wrap_gap;
-        best_from = prev_idx;
-        best_pos = prev_pos;
-    }
-    free(order);
     if (best_gap <= 0 || best_from < 0) return 0;
     *from_idx = best_from;
-    *from_pos = best_pos;
+    *from_pos = E->s[best_from * E->K + r];
     *gap_out = best_gap;
     return 1;
 }
 
-static void simulate(Scenario *s, Loss *losses, int loss_count, FILE *summary, FILE *trace) {
-    int n = s->n_total;
-    Drone *fleet = calloc(n, sizeof(Drone));
-    for (int i = 0; i < n; i++) {
-        fleet[i].s = fmod(i * (s->perimeter / (s->n_initial > 0 ? s->n_initial : 1)), s->perimeter);
-        fleet[i].v = s->V;
-        fleet[i].alive = (i < s->n_initial) ? 1 : 0;
-        fleet[i].ever_deployed = (i < s->n_initial) ? 1 : 0;
-        fleet[i].mode = 0;
-        fleet[i].incoming_timer = 0;
-    }
-    int loss_idx = 0;
-    int total_losses_seen = 0;
-    int total_spares_inserted = 0;
-    int next_spare_after_loss_step = -1000000;
-    int next_spare_allowed_step = -1000000;
-    uint32_t spare_rng = ((uint32_t)(s->seed ? s->seed : 1u)) ^ 0x9e3779b9u;
-    double dt = s->dt;
-
-    /* Optional headers */
-    if (summary) {
-        fprintf(summary, "step;alive;mean_v;min_v;max_v;std_v;min_gap;max_gap;mean_gap;std_gap\n");
-    }
-    if (trace) {
-        fprintf(trace, "step;idx;alive;s;v;gap_f;gap_b\n");
-    }
-
-    for (int step = 0; step < s->steps; step++) {
-        int loss_this_step = 0;
-        /* apply losses scheduled at this step */
-        while (loss_idx < loss_count && losses[loss_idx].step == step) {
-            int idx = losses[loss_idx].idx;
-            if (idx >= 0 && idx < n && fleet[idx].alive) {
-                fleet[idx].alive = 0;
-                loss_this_step = 1;
-                if (s->loss_to_spare_delay_min_steps > 0 || s->loss_to_spare_delay_max_steps > 0) {
-                    int d = rng_uniform_int(&spare_rng, s->loss_to_spare_delay_min_steps, s->loss_to_spare_delay_max_steps);
-                    if (d < 0) d = 0;
-                    next_spare_after_loss_step = step + d;
-                } else {
-                    next_spare_after_loss_step = step + s->min_spare_delay_steps;
-                }
+/* Apply the losses scheduled at `step`; returns 1 if a drone was lost. */
+static int apply_losses(Ensemble *E, int r, int step) {
+    Replica *R = &E->rep[r];
+    const Scenario *s = R->s;
+    int loss_this_step = 0;
+    while (R->loss_idx < R->loss_count && R->losses[R->loss_idx].step == step) {
+        int idx = R->losses[R->loss_idx].idx;
+        if (idx >= 0 && idx < E->n && E->alive[idx * E->K + r]) {
+            E->alive[idx * E->K + r] = 0;
+            ring_remove(&R->ring, idx);
+            R->dead_deployed++;
+            loss_this_step = 1;
+            if (s->loss_to_spare_delay_min_steps > 0 || s->loss_to_spare_delay_max_steps > 0) {
+                int d = rng_uniform_int(&R->spare_rng, s->loss_to_spare_delay_min_steps, s->loss_to_spare_delay_max_steps);
+                if (d < 0) d = 0;
+                R->next_spare_after_loss_step = step + d;
+            } else {
+                R->next_spare_after_loss_step = step + s->min_spare_delay_steps;
             }
-            loss_idx++;
         }
+        R->loss_idx++;
+    }
+    if (loss_this_step) update_first_dead(E, r);
+    return loss_this_step;
+}
 
-        compute_gaps(fleet, s);
+/* optional spare insertion: only after losses, capped by num_losses; returns 1 if a spare was inserted */
+static int insert_spare(Ensemble *E, int r, int step) {
+    Replica *R = &E->rep[r];
+    const Scenario *s = R->s;
+    int K = E->K;
+    /* dead drones gate the spare pool */
+    if (R->total_losses_seen < R->dead_deployed) R->total_losses_seen = R->dead_deployed;
+    int max_spares = s->max_spares > 0 ? s->max_spares : s->num_losses;
+    int target_spares = R->total_losses_seen + s->preventive_spares + s->extra_spares;
+    if (target_spares < R->total_losses_seen) target_spares = R->total_losses_seen;
+    if (max_spares > 0 && target_spares > max_spares) target_spares = max_spares;
+    int ok_after_loss = (R->total_losses_seen > 0) ? (step >= R->next_spare_after_loss_step) : 1;
+    int ok_after_prev_spare = step >= R->next_spare_allowed_step;
+    int allow_before_loss = (s->preventive_spares > 0);
+    if (!((R->total_losses_seen > 0 || allow_before_loss) && R->total_spares_inserted < target_spares &&
+          ok_after_loss && ok_after_prev_spare)) {
+        return 0;
+    }
+    int from_idx = -1;
+    double from_pos = 0.0;
+    double gap = 0.0;
+    if (!find_largest_gap(E, r, &from_idx, &from_pos, &gap)) return 0;
+    int slot = find_spare_slot(E, r);
+    if (slot < 0) return 0;
+    int c = slot * K + r;
+    if (E->ever_deployed[c]) R->dead_deployed--;
+    E->alive[c] = 1;
+    E->ever_deployed[c] = 1;
+    E->s[c] = fmod(from_pos + 0.5 * gap + s->perimeter, s->perimeter);
+    E->v[c] = s->V;
+    E->mode[c] = 1;
+    E->incoming_timer[c] = s->incoming_hold_steps;
+    ring_insert(&R->ring, E->s + r, K, slot);
+    update_first_dead(E, r);
+    R->total_spares_inserted++;
+    int interval = rng_uniform_int(&R->spare_rng, s->spare_interval_min_steps, s->spare_interval_max_steps);
+    if (interval < 0) interval = 0;
+    R->next_spare_allowed_step = step + interval;
+    compute_gaps(E, r);
+    return 1;
+}
 
-        /* optional spare insertion: only after losses, capped by num_losses */
-        if (s->resilience && !loss_this_step) {
-            /* count how many are dead to gate spare pool */
-            int dead_now = 0;
-            for (int i = 0; i < n; i++) {
-                if (fleet[i].ever_deployed && !fleet[i].alive) dead_now++;
-            }
-            if (total_losses_seen < dead_now) total_losses_seen = dead_now;
-            int max_spares = s->max_spares > 0 ? s->max_spares : s->num_losses;
-            int target_spares = total_losses_seen + s->preventive_spares + s->extra_spares;
-            if (target_spares < total_losses_seen) target_spares = total_losses_seen;
-            if (max_spares > 0 && target_spares > max_spares) target_spares = max_spares;
-            int ok_after_loss = (total_losses_seen > 0) ? (step >= next_spare_after_loss_step) : 1;
-            int ok_after_prev_spare = step >= next_spare_allowed_step;
-            int allow_before_loss = (s->preventive_spares > 0);
-            if ((total_losses_seen > 0 || allow_before_loss) && total_spares_inserted < target_spares && ok_after_loss && ok_after_prev_spare) {
-                int from_idx = -1; 
-                double from_pos = 0.0; 
-                double gap = 0.0;
-                if (find_largest_gap(fleet, s, &from_idx, &from_pos, &gap)) {
-                    int slot = find_spare_slot(fleet, n);
-                    if (slot >= 0) {
-                        double insert_pos = fmod(from_pos + 0.5 * gap + s->perimeter, s->perimeter);
-                        fleet[slot].alive = 1;
-                        fleet[slot].ever_deployed = 1;
-                        fleet[slot].s = insert_pos;
-                        fleet[slot].v = s->V;
-                        fleet[slot].mode = 1;
-                        fleet[slot].incoming_timer = s->incoming_hold_steps;
-                        total_spares_inserted++;
-                        int interval = rng_uniform_int(&spare_rng, s->spare_interval_min_steps, s->spare_interval_max_steps);
-                        if (interval < 0) interval = 0;
-                        next_spare_allowed_step = step + interval;
-                        compute_gaps(fleet, s);
-                    }
-                }
-            }
-        }
+/* The speed and position updates work on spans of `count` consecutive cells
+ * starting at c0, reading per-replica parameter j at p[j * pstride]:
+ * pstride = 1 walks the K replicas of one drone, pstride = 0 walks all drones
+ * of a single run (K = 1). The loops are branch-free (selects only, `omp simd`)
+ * so they vectorize either way; dead drones keep their speed and position. */
+static inline void update_speed_span(Ensemble *E, int c0, int count, int pstride) {
+    const double *restrict V = E->V, *restrict Vmax = E->Vmax, *restrict d_safe = E->d_safe;
+    const double *restrict k_sym = E->k_sym, *restrict k_sym_rec = E->k_sym_rec, *restrict k_rep = E->k_rep;
+    const double *restrict alpha_d = E->alpha_d, *restrict beta_d = E->beta_d, *restrict V_cap = E->V_cap;
+    const double *restrict gamma = E->gamma, *restrict balanced_eps = E->balanced_eps, *restrict relax = E->relax;
+    const double *restrict incoming_v = E->incoming_v;
+    double *restrict target = E->target;
+    int *restrict flag = E->flag;
+    double *restrict v = E->v + c0;
+    const double *restrict gap_f = E->gap_f + c0;
+    const double *restrict gap_b = E->gap_b + c0;
+    const int *restrict alive = E->alive + c0;
+    int *restrict mode = E->mode + c0;
+    int *restrict timer = E->incoming_timer + c0;
 
-        /* update speeds */
-        for (int i = 0; i < n; i++) {
-            if (!fleet[i].alive) continue;
-            double d_f = fleet[i].gap_f;
-            double d_b = fleet[i].gap_b;
+    switch (E->controller_mode) {
+    case 0:
+        /* legacy behavior (kept for backward compatibility) */
+        #pragma omp simd
+        for (int j = 0; j < count; j++) {
+            int r = j * pstride;
+            /* all operands are loaded up front so the selects if-convert */
+            double d_f = gap_f[j], d_b = gap_b[j], safe = d_safe[r];
+            double ks = k_sym[r], krec = k_sym_rec[r], vcap = V_cap[r];
             double gap_delta = d_f - d_b; /* accelerate if front gap > back gap, brake otherwise */
+            int rec = (d_f > alpha_d[r]) | (d_b < beta_d[r]);
+            double k = (rec & (krec > 0)) ? krec : ks;
+            double vn = V[r] + k * gap_delta;
+            double cap = V[r] * (d_f / safe);
+            vn = ((d_f < safe) & (vn > cap)) ? cap : vn;
+            double rep = vn + k_rep[r] * (safe - d_b);
+            vn = d_b < safe ? rep : vn;
+            target[j] = (rec & (vn > vcap)) ? vcap : vn;
+        }
+        break;
+    case 1:
+        /* Fresh-start baseline: midpoint seeking only */
+        #pragma omp simd
+        for (int j = 0; j < count; j++) {
+            int r = j * pstride;
+            target[j] = V[r] + k_sym[r] * (gap_f[j] - gap_b[j]);
+        }
+        break;
+    case 2:
+        /* Variant A: adapt gain based on imbalance magnitude */
+        #pragma omp simd
+        for (int j = 0; j < count; j++) {
+            int r = j * pstride;
+            double gap_delta = gap_f[j] - gap_b[j];
+            double denom = gap_f[j] + gap_b[j] + 1e-9;
+            double imbalance = fabs(gap_delta) / denom; /* 0..1-ish */
+            double gain = k_sym[r] * (1.0 + gamma[r] * imbalance);
+            target[j] = V[r] + gain * gap_delta;
+        }
+        break;
+    case 3:
+        /* Variant C: balanced drones relax speed toward nominal progressively */
+        #pragma omp simd
+        for (int j = 0; j < count; j++) {
+            int r = j * pstride;
+            double gap_delta = gap_f[j] - gap_b[j];
+            double nominal = V[r], seek = V[r] + k_sym[r] * gap_delta;
+            double t = fabs(gap_delta) <= balanced_eps[r] ? nominal : seek;
+            target[j] = v[j] + relax[r] * (t - v[j]);
+        }
+        break;
+    default:
+        for (int j = 0; j < count; j++) target[j] = v[j];
+        break;
+    }
 
-            double v = fleet[i].v;
-            if (s->controller_mode == 0) {
-                /* legacy behavior (kept for backward compatibility) */
-                int rec = (d_f > s->alpha * s->d_star) || (d_b < s->beta * s->d_star);
-                double k_sym = rec && s->k_sym_rec > 0 ? s->k_sym_rec : s->k_sym;
-                v = s->V + k_sym * gap_delta;
-                if (d_f < s->d_safe) {
-                    double cap = s->V * (d_f / s->d_safe);
-                    if (v > cap) v = cap;
-                }
-                if (d_b < s->d_safe) {
-                    v += s->k_rep * (s->d_safe - d_b);
-                }
-                if (rec && v > s->V_cap) v = s->V_cap;
-            } else if (s->controller_mode == 1) {
-                /* Fresh-start baseline: midpoint seeking only */
-                v = s->V + s->k_sym * gap_delta;
-            } else if (s->controller_mode == 2) {
-                /* Variant A: adapt gain based on imbalance magnitude */
-                double denom = d_f + d_b + 1e-9;
-                double imbalance = fabs(gap_delta) / denom; /* 0..1-ish */
-                double gain = s->k_sym * (1.0 + s->variantA_gamma * imbalance);
-                v = s->V + gain * gap_delta;
-            } else if (s->controller_mode == 3) {
-                /* Variant C: balanced drones relax speed toward nominal progressively */
-                double target = s->V + s->k_sym * gap_delta;
-                if (fabs(gap_delta) <= s->balanced_gap_eps) {
-                    target = s->V;
-                }
-                v = fleet[i].v + s->speed_relax_rate * (target - fleet[i].v);
-            }
+    /* incoming drones stay at nominal speed for a fixed window */
+    #pragma omp simd
+    for (int j = 0; j < count; j++) {
+        int on = alive[j], m = mode[j], left = timer[j];
+        int incoming = on & (m == 1) & (left > 0);
+        left -= incoming;
+        timer[j] = left;
+        mode[j] = (incoming & (left == 0)) ? 0 : m;
+        flag[j] = incoming;
+    }
+    #pragma omp simd
+    for (int j = 0; j < count; j++) {
+        int r = j * pstride;
+        double vn = target[j], vmax = Vmax[r], vin = incoming_v[r], vold = v[j];
+        vn = vn < 0 ? 0 : vn;
+        vn = vn > vmax ? vmax : vn;
+        vn = flag[j] ? vin : vn;
+        v[j] = alive[j] ? vn : vold;
+    }
+}
 
-            if (v < 0) v = 0;
-            if (v > s->Vmax) v = s->Vmax;
-            /* incoming drones stay at nominal speed for a fixed window */
-            if (fleet[i].mode == 1 && fleet[i].incoming_timer > 0) {
-                v = s->incoming_v;
-                fleet[i].incoming_timer--;
-                if (fleet[i].incoming_timer == 0) {
-                    fleet[i].mode = 0;
-                }
-            }
-            fleet[i].v = v;
-        }
-
-        /* per-step summary */
-        if (summary) {
-            int alive = 0;
-            double min_v = 0, max_v = 0, sum_v = 0, sum_v2 = 0;
-            double min_g = 0, max_g = 0, sum_g = 0, sum_g2 = 0; int gap_count = 0;
-            for (int i = 0; i < n; i++) {
-                if (!fleet[i].alive) continue;
-                alive++;
-                double v = fleet[i].v;
-                if (alive == 1) {
-                    min_v = max_v = v;
-                } else {
-                    if (v < min_v) min_v = v;
-                    if (v > max_v) max_v = v;
-                }
-                sum_v += v;
-                sum_v2 += v * v;
-                double g = fleet[i].gap_f;
-                if (gap_count == 0) {
-                    min_g = max_g = g;
-                } else {
-                    if (g < min_g) min_g = g;
-                    if (g > max_g) max_g = g;
-                }
-                sum_g += g;
-                sum_g2 += g * g;
-                gap_count++;
+static void update_speeds(Ensemble *E) {
+    if (E->K == 1) {
+        update_speed_span(E, 0, E->n, 0);
+        return;
+    }
+    for (int i = 0; i < E->n; i++) update_speed_span(E, i * E->K, E->K, 1);
+}
+
+/* s <- fmod(s + v*dt + perimeter, perimeter). For x in [perimeter, 2*perimeter)
+ * the subtraction is exact, i.e. bit-identical to fmod; other values (not
+ * reachable with v >= 0 and v*dt < perimeter) are stored as x and reduced
+ * with fmod afterwards. */
+static inline void advance_span(Ensemble *E, int c0, int count, int pstride) {
+    const double *restrict dt = E->dt, *restrict perimeter = E->perimeter;
+    double *restrict pos = E->s + c0;
+    const double *restrict v = E->v + c0;
+    const int *restrict alive = E->alive + c0;
+    #pragma omp simd
+    for (int j = 0; j < count; j++) {
+        int r = j * pstride;
+        double p = perimeter[r], old = pos[j];
+        int on = alive[j];
+        double x = old + v[j] * dt[r] + p;
+        int fast = (x >= p) & (x < 2.0 * p);
+        double wrapped = x - p;
+        double moved = fast ? wrapped : x;
+        pos[j] = on ? moved : old;
+    }
+    for (int j = 0; j < count; j++) {
+        int r = j * pstride;
+        if (pos[j] < 0 || pos[j] >= perimeter[r]) pos[j] = fmod(pos[j], perimeter[r]);
+    }
+}
+
+static void advance_positions(Ensemble *E) {
+    if (E->K == 1) {
+        advance_span(E, 0, E->n, 0);
+        return;
+    }
+    for (int i = 0; i < E->n; i++) advance_span(E, i * E->K, E->K, 1);
+}
+
+static void summarize_replica(const Ensemble *E, int r, int step, SummaryRow *row) {
+    int alive = 0;
+    double min_v = 0, max_v = 0, sum_v = 0, sum_v2 = 0;
+    double min_g = 0, max_g = 0, sum_g = 0, sum_g2 = 0; int gap_count = 0;
+    for (int i = 0; i < E->n; i++) {
+        int c = i * E->K + r;
+        if (!E->alive[c]) continue;
+        alive++;
+        double v = E->v[c];
+        if (alive == 1) {
+            min_v = max_v = v;
+        } else {
+            if (v < min_v) min_v = v;
+            if (v > max_v) max_v = v;
+        }
+        sum_v += v;
+        sum_v2 += v * v;
+        double g = E->gap_f[c];
+        if (gap_count == 0) {
+            min_g = max_g = g;
+        } else {
+            if (g < min_g) min_g = g;
+            if (g > max_g) max_g = g;
+        }
+        sum_g += g;
+        sum_g2 += g * g;
+        gap_count++;
+    }
+    double std_v = 0, std_g = 0; double mean_g = 0; double mean_v = 0;
+    if (alive > 0) {
+        mean_v = sum_v / alive;
+        double var_v = (sum_v2 / alive) - (mean_v * mean_v);
+        if (var_v < 0) var_v = 0;
+        std_v = sqrt(var_v);
+    }
+    if (gap_count > 0) {
+        mean_g = sum_g / gap_count;
+        double var_g = (sum_g2 / gap_count) - (mean_g * mean_g);
+        if (var_g < 0) var_g = 0;
+        std_g = sqrt(var_g);
+    }
+    row->step = step;
+    row->alive = alive;
+    row->mean_v = mean_v;
+    row->min_v = alive ? min_v : 0.0;
+    row->max_v = alive ? max_v : 0.0;
+    row->std_v = std_v;
+    row->min_gap = gap_count ? min_g : 0.0;
+    row->max_gap = gap_count ? max_g : 0.0;
+    row->mean_gap = gap_count ? mean_g : 0.0;
+    row->std_gap = std_g;
+}
+
+static void write_summary_csv(FILE *f, const SummaryRow *row) {
+    fprintf(f, "%d;%d;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f\n",
+            row->step, row->alive, row->mean_v, row->min_v, row->max_v, row->std_v,
+            row->min_gap, row->max_gap, row->mean_gap, row->std_gap);
+}
+
+static void write_trace_csv(FILE *f, const TraceRow *row) {
+    if (row->alive) {
+        fprintf(f, "%d;%d;%d;%.6f;%.6f;%.6f;%.6f\n",
+                row->step, row->idx, row->alive, row->s, row->v, row->gap_f, row->gap_b);
+    } else {
+        /* dead drone: gaps left empty to signal no neighbors */
+        fprintf(f, "%d;%d;%d;%.6f;%.6f;;\n", row->step, row->idx, row->alive, row->s, row->v);
+    }
+}
+
+/* ---- Binary output (--format bin) ------------------------------------------
+ * "BSIMREC1", the header length L as a little-endian uint32, L bytes of JSON
+ * (space-padded so that records start at a multiple of 64 bytes), then
+ * SummaryRow / TraceRow records exactly as in memory, in host byte order
+ * (recorded in the header). The record count follows from the file size.
+ * The JSON header holds the kind ("summary"/"trace"), record_size, the
+ * columns as name / NumPy dtype / byte offset, and the finalized scenario.
+ * sim_io.py memory-maps these files into NumPy structured arrays.
+ *
+ * ---- Compressed output (--format z) -----------------------------------------
+ * "BSIMZRC1", then the same padded JSON header plus "codec", "decimals" and
+ * "chunk_rows", then independent chunks of whole steps (about chunk_rows
+ * records each): int32 first_step, int32 last_step, uint32 rows, uint32 lag,
+ * uint32 size (little-endian) and `size` bytes of zlib data. Doubles are
+ * kept to the CSV's precision, as int64 multiples of 1e-6 (NaN: INT64_MIN);
+ * int32 columns as they are. Each column is delta-coded twice against the
+ * value `lag` rows earlier (the same drone one step before when every step
+ * has `lag` rows; rows < lag are kept as is), so a drone moving at constant
+ * speed codes as zeros. The deltas are zigzag-coded (small magnitudes ->
+ * small unsigned values) and stored as one plane per column, in header
+ * order, byte-transposed: the lowest bytes of all rows, then the next bytes,
+ * and so on; the mostly zero high bytes deflate to nearly nothing.
+ * Chunks can be concatenated after one header (sim_fork.py does) and are
+ * decoded one at a time by sim_io.py.
+ */
+static const char BINARY_MAGIC[8] = { 'B', 'S', 'I', 'M', 'R', 'E', 'C', '1' };
+static const char ZDELTA_MAGIC[8] = { 'B', 'S', 'I', 'M', 'Z', 'R', 'C', '1' };
+#define ZDELTA_CHUNK_ROWS 65536
+#define ZDELTA_SCALE 1e6
+
+/* x * ZDELTA_SCALE rounded as printf("%.6f") rounds x for the CSV writer, so a
+ * compressed file exports to the same digits as the CSV. The product is off by
+ * up to half an ulp, which only changes the result next to a half-way point:
+ * there the exact decimal rounding is taken from snprintf. */
+static int64_t zdelta_quantize(double x) {
+    double r = x * ZDELTA_SCALE;
+    if (!(fabs(fabs(r - trunc(r)) - 0.5) <= 4.0 * DBL_EPSILON * fabs(r))) return llrint(r);
+    char buf[64], digits[64];
+    int n = 0;
+    snprintf(buf, sizeof(buf), "%.6f", x);
+    for (const char *c = buf; *c; c++) {
+        if (*c != '.') digits[n++] = *c;
+    }
+    digits[n] = '\0';
+    return strtoll(digits, NULL, 10);
+}
+
+typedef struct {
+    const char *name;
+    char type;                  /* 'i': int32, 'f': float64 */
+    size_t offset;
+} BinaryColumn;
+
+static const BinaryColumn SUMMARY_COLUMNS[] = {
+    { "step", 'i', offsetof(SummaryRow, step) },       { "alive", 'i', offsetof(SummaryRow, alive) },
+    { "mean_v", 'f', offsetof(SummaryRow, mean_v) },   { "min_v", 'f', offsetof(SummaryRow, min_v) },
+    { "max_v", 'f', offsetof(SummaryRow, max_v) },     { "std_v", 'f', offsetof(SummaryRow, std_v) },
+    { "min_gap", 'f', offsetof(SummaryRow, min_gap) }, { "max_gap", 'f', offsetof(SummaryRow, max_gap) },
+    { "mean_gap", 'f', offsetof(SummaryRow, mean_gap) }, { "std_gap", 'f', offsetof(SummaryRow, std_gap) },
+};
+
+static const BinaryColumn TRACE_COLUMNS[] = {
+    { "step", 'i', offsetof(TraceRow, step) },   { "idx", 'i', offsetof(TraceRow, idx) },
+    { "alive", 'i', offsetof(TraceRow, alive) }, { "s", 'f', offsetof(TraceRow, s) },
+    { "v", 'f', offsetof(TraceRow, v) },         { "gap_f", 'f', offsetof(TraceRow, gap_f) },
+    { "gap_b", 'f', offsetof(TraceRow, gap_b) },
+};
+
+/* Shortest of %.15g / %.17g that reads back as x. */
+static void json_number(FILE *f, double x) {
+    char buf[32];
+    snprintf(buf, sizeof(buf), "%.15g", x);
+    if (strtod(buf, NULL) != x) snprintf(buf, sizeof(buf), "%.17g", x);
+    fputs(buf, f);
+}
+
+static void scenario_json(FILE *f, const Scenario *s) {
+#define JSON_INT(key) fprintf(f, "\"" #key "\":%d,", s->key)
+#define JSON_DBL(key) (fputs("\"" #key "\":", f), json_number(f, s->key), fputc(',', f))
+    fputc('{', f);
+    JSON_INT(n_initial); JSON_INT(n_total); JSON_DBL(perimeter); JSON_DBL(V); JSON_DBL(Vmax);
+    JSON_DBL(d_star); JSON_DBL(d_safe); JSON_DBL(k_sym); JSON_DBL(k_sym_rec); JSON_DBL(k_f); JSON_DBL(k_b);
+    JSON_DBL(k_rep); JSON_DBL(k_f_rec); JSON_DBL(k_b_rec); JSON_DBL(alpha); JSON_DBL(beta); JSON_DBL(V_cap);
+    JSON_DBL(epsilon); JSON_INT(steps); JSON_DBL(dt); JSON_INT(num_losses);
+    fprintf(f, "\"seed\":%u,", s->seed);
+    JSON_INT(resilience); JSON_INT(min_spare_delay_steps); JSON_INT(min_spare_interval_steps);
+    JSON_INT(spare_interval_min_steps); JSON_INT(spare_interval_max_steps); JSON_INT(incoming_hold_steps);
+    JSON_DBL(incoming_v); JSON_INT(extra_spares); JSON_INT(max_spares); JSON_INT(controller_mode);
+    JSON_DBL(variantA_gamma); JSON_DBL(balanced_gap_eps); JSON_DBL(speed_relax_rate);
+    JSON_INT(loss_to_spare_delay_min_steps); JSON_INT(loss_to_spare_delay_max_steps);
+    JSON_DBL(preventive_spares_frac); JSON_INT(preventive_spares); JSON_INT(summary_every); JSON_INT(trace_every);
+    JSON_INT(trace_alive_only); JSON_INT(event_window);
+    fprintf(f, "\"trace_idx\":\"%s\"}", s->trace_idx); /* charset checked by set_trace_idx() */
+#undef JSON_INT
+#undef JSON_DBL
+}
+
+static void write_binary_header(FILE *f, int format, const char *kind, const BinaryColumn *cols, int ncols,
+                                size_t record_size, const Scenario *s) {
+    const uint16_t probe = 1;
+    char order = *(const unsigned char *)&probe ? '<' : '>';
+    char *json = NULL;
+    size_t len = 0;
+    FILE *m = open_memstream(&json, &len);
+    fprintf(m, "{\"kind\":\"%s\",\"version\":1,\"byteorder\":\"%s\",\"record_size\":%zu,\"columns\":[",
+            kind, order == '<' ? "little" : "big", record_size);
+    for (int c = 0; c < ncols; c++) {
+        fprintf(m, "%s{\"name\":\"%s\",\"dtype\":\"%c%c%d\",\"offset\":%zu}", c ? "," : "", cols[c].name, order,
+                cols[c].type, cols[c].type == 'i' ? 4 : 8, cols[c].offset);
+    }
+    fprintf(m, "],\"n_total\":%d,\"steps\":%d,", s->n_total, s->steps);
+    if (format == OUTPUT_ZDELTA) fprintf(m, "\"codec\":\"zlib\",\"decimals\":6,\"chunk_rows\":%d,", ZDELTA_CHUNK_ROWS);
+    fputs("\"scenario\":", m);
+    scenario_json(m, s);
+    fputc('}', m);
+    fclose(m);
+    size_t total = sizeof(BINARY_MAGIC) + 4 + len + 1;
+    size_t padded = (total + 63) / 64 * 64 - sizeof(BINARY_MAGIC) - 4;
+    unsigned char hlen[4] = { padded & 0xff, (padded >> 8) & 0xff, (padded >> 16) & 0xff, (padded >> 24) & 0xff };
+    fwrite(format == OUTPUT_ZDELTA ? ZDELTA_MAGIC : BINARY_MAGIC, 1, sizeof(BINARY_MAGIC), f);
+    fwrite(hlen, 1, sizeof(hlen), f);
+    fwrite(json, 1, len, f);
+    for (size_t k = len; k + 1 < padded; k++) fputc(' ', f);
+    fputc('\n', f);
+    free(json);
+}
+
+struct ChunkWriter {
+    FILE *f;
+    const BinaryColumn *cols;
+    int ncols;
+    size_t record_size;
+    unsigned char *rows;        /* buffered records of whole steps */
+    int count, cap;
+    uint64_t *values;           /* one column of a chunk */
+    unsigned char *raw;         /* column planes of a chunk */
+    unsigned char *packed;      /* compressed chunk */
+    size_t raw_cap, packed_cap;
+};
+
+static ChunkWriter *chunk_writer_new(FILE *f, const BinaryColumn *cols, int ncols, size_t record_size) {
+    ChunkWriter *w = calloc(1, sizeof(*w));
+    w->f = f;
+    w->cols = cols;
+    w->ncols = ncols;
+    w->record_size = record_size;
+    return w;
+}
+
+static int32_t chunk_row_step(const ChunkWriter *w, int i) {
+    int32_t step;
+    memcpy(&step, w->rows + (size_t)i * w->record_size, sizeof(step)); /* step is the first column */
+    return step;
+}
+
+static void put_u32(unsigned char *p, uint32_t x) {
+    for (int b = 0; b < 4; b++) p[b] = (unsigned char)(x >> (8 * b));
+}
+
+/* Encode and write the buffered rows as one chunk (layout above). */
+static void chunk_flush(ChunkWriter *w) {
+    int n = w->count;
+    if (n == 0) return;
+    int32_t first = chunk_row_step(w, 0), last = chunk_row_step(w, n - 1);
+    int lag = 1;
+    while (lag < n && chunk_row_step(w, lag) == first) lag++;
+    size_t raw_len = 0;
+    for (int c = 0; c < w->ncols; c++) raw_len += (size_t)n * (w->cols[c].type == 'i' ? 4 : 8);
+    if (raw_len > w->raw_cap) {
+        w->raw_cap = raw_len;
+        w->raw = realloc(w->raw, raw_len);
+        w->values = realloc(w->values, (size_t)n * sizeof(uint64_t));
+    }
+    uint64_t *q = w->values;
+    unsigned char *plane = w->raw;
+    for (int c = 0; c < w->ncols; c++) {
+        int width = w->cols[c].type == 'i' ? 4 : 8;
+        const unsigned char *field = w->rows + w->cols[c].offset;
+        for (int i = 0; i < n; i++) {
+            if (width == 4) {
+                int32_t x;
+                memcpy(&x, field + (size_t)i * w->record_size, 4);
+                q[i] = (uint64_t)(int64_t)x;
+            } else {
+                double x;
+                memcpy(&x, field + (size_t)i * w->record_size, 8);
+                q[i] = isnan(x) ? (uint64_t)INT64_MIN : (uint64_t)zdelta_quantize(x);
             }
-            double std_v = 0, std_g = 0; double mean_g = 0; double mean_v = 0;
-            if (alive > 0) {
-                mean_v = sum_v / alive;
-                double var_v = (sum_v2 / alive) - (mean_v * mean_v);
-                if (var_v < 0) var_v = 0;
-                std_v = sqrt(var_v);
+        }
+        for (int pass = 0; pass < 2; pass++) {
+            for (int i = n - 1; i >= lag; i--) q[i] -= q[i - lag];
+        }
+        for (int i = 0; i < n; i++) {
+            uint64_t d = q[i], z;
+            if (width == 4) {
+                uint32_t d32 = (uint32_t)d;
+                z = (uint32_t)((d32 << 1) ^ (0u - (d32 >> 31)));
+            } else {
+                z = (d << 1) ^ (0 - (d >> 63));
             }
-            if (gap_count > 0) {
-                mean_g = sum_g / gap_count;
-                double var_g = (sum_g2 / gap_count) - (mean_g * mean_g);
-                if (var_g < 0) var_g = 0;
-                std_g = sqrt(var_g);
+            for (int b = 0; b < width; b++) plane[(size_t)b * n + i] = (unsigned char)(z >> (8 * b));
+        }
+        plane += (size_t)n * width;
+    }
+    uLongf packed_len = compressBound(raw_len);
+    if (packed_len > w->packed_cap) {
+        w->packed_cap = packed_len;
+        w->packed = realloc(w->packed, packed_len);
+    }
+    unsigned char head[20];
+    compress2(w->packed, &packed_len, w->raw, raw_len, Z_BEST_SPEED);
+    put_u32(head, (uint32_t)first);
+    put_u32(head + 4, (uint32_t)last);
+    put_u32(head + 8, (uint32_t)n);
+    put_u32(head + 12, (uint32_t)lag);
+    put_u32(head + 16, (uint32_t)packed_len);
+    fwrite(head, 1, sizeof(head), w->f);
+    fwrite(w->packed, 1, packed_len, w->f);
+    w->count = 0;
+}
+
+/* Chunks hold whole steps: a full buffer is written when the next step starts. */
+static void chunk_write(ChunkWriter *w, const void *row) {
+    int32_t step;
+    memcpy(&step, row, sizeof(step));
+    if (w->count >= ZDELTA_CHUNK_ROWS && chunk_row_step(w, w->count - 1) != step) chunk_flush(w);
+    if (w->count == w->cap) {
+        w->cap = w->cap ? 2 * w->cap : 1024;
+        w->rows = realloc(w->rows, (size_t)w->cap * w->record_size);
+    }
+    memcpy(w->rows + (size_t)w->count++ * w->record_size, row, w->record_size);
+}
+
+static void chunk_writer_free(ChunkWriter *w) {
+    if (!w) return;
+    chunk_flush(w);
+    free(w->rows);
+    free(w->values);
+    free(w->raw);
+    free(w->packed);
+    free(w);
+}
+
+/* Writes the last chunks of compressed outputs; the files stay open. */
+static void finish_outputs(SimOutput *out) {
+    chunk_writer_free(out->summary_z);
+    chunk_writer_free(out->trace_z);
+    out->summary_z = out->trace_z = NULL;
+}
+
+static void write_output_headers(SimOutput *out, const Scenario *s) {
+    if (out->format != OUTPUT_CSV) {
+        int nsum = (int)(sizeof(SUMMARY_COLUMNS) / sizeof(SUMMARY_COLUMNS[0]));
+        int ntrace = (int)(sizeof(TRACE_COLUMNS) / sizeof(TRACE_COLUMNS[0]));
+        if (out->summary_file) {
+            write_binary_header(out->summary_file, out->format, "summary", SUMMARY_COLUMNS, nsum, sizeof(SummaryRow), s);
+            if (out->format == OUTPUT_ZDELTA) {
+                out->summary_z = chunk_writer_new(out->summary_file, SUMMARY_COLUMNS, nsum, sizeof(SummaryRow));
             }
-                fprintf(summary, "%d;%d;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f\n",
-                    step, alive,
-                    mean_v,
-                    alive ? min_v : 0.0, alive ? max_v : 0.0, std_v,
-                    gap_count ? min_g : 0.0, gap_count ? max_g : 0.0,
-                    gap_count ? mean_g : 0.0, std_g);
-        }
-
-        /* emit trace after speed update, before position advance */
-        if (trace) {
-            for (int i = 0; i < n; i++) {
-                if (fleet[i].alive) {
-                    fprintf(trace, "%d;%d;%d;%.6f;%.6f;%.6f;%.6f\n",
-                            step, i, fleet[i].alive, fleet[i].s, fleet[i].v,
-                            fleet[i].gap_f, fleet[i].gap_b);
-                } else {
-                    /* dead drone: gaps left empty to signal no neighbors */
-                    fprintf(trace, "%d;%d;%d;%.6f;%.6f;;\n",
-                            step, i, fleet[i].alive, fleet[i].s, fleet[i].v);
-                }
+        }
+        if (out->trace_file) {
+            write_binary_header(out->trace_file, out->format, "trace", TRACE_COLUMNS, ntrace, sizeof(TraceRow), s);
+            if (out->format == OUTPUT_ZDELTA) {
+                out->trace_z = chunk_writer_new(out->trace_file, TRACE_COLUMNS, ntrace, sizeof(TraceRow));
             }
         }
+        return;
+    }
+    if (out->summary_file) {
+        fprintf(out->summary_file, "step;alive;mean_v;min_v;max_v;std_v;min_gap;max_gap;mean_gap;std_gap\n");
+    }
+    if (out->trace_file) {
+        fprintf(out->trace_file, "step;idx;alive;s;v;gap_f;gap_b\n");
+    }
+}
 
-        /* advance positions */
-        for (int i = 0; i < n; i++) {
-            if (!fleet[i].alive) continue;
-            fleet[i].s = fmod(fleet[i].s + fleet[i].v * dt + s->perimeter, s->perimeter);
+static void fill_trace_row(const Ensemble *E, int r, int step, int i, TraceRow *row) {
+    int c = i * E->K + r;
+    int alive = E->alive[c];
+    memset(row, 0, sizeof(*row)); /* padding is written out in binary traces */
+    row->step = step;
+    row->idx = i;
+    row->alive = alive;
+    row->s = E->s[c];
+    row->v = E->v[c];
+    row->gap_f = alive ? E->gap_f[c] : NAN;
+    row->gap_b = alive ? E->gap_b[c] : NAN;
+}
+
+static int near_event(const Replica *R, int step) {
+    return step - R->last_event <= R->s->event_window;
+}
+
+/* File writers applying the scenario's decimation and trace filters. */
+static void write_summary_row(const Replica *R, const SummaryRow *row) {
+    if (row->step % R->s->summary_every != 0 && !near_event(R, row->step)) return;
+    if (R->out->format == OUTPUT_BINARY) fwrite(row, sizeof(*row), 1, R->out->summary_file);
+    else if (R->out->format == OUTPUT_ZDELTA) chunk_write(R->out->summary_z, row);
+    else write_summary_csv(R->out->summary_file, row);
+}
+
+static void write_trace_row(const Replica *R, const TraceRow *row) {
+    if (R->s->trace_alive_only && !row->alive) return;
+    if (R->trace_mask && !R->trace_mask[row->idx]) return;
+    if (row->step % R->s->trace_every != 0 && !near_event(R, row->step)) return;
+    if (R->out->format == OUTPUT_BINARY) fwrite(row, sizeof(*row), 1, R->out->trace_file);
+    else if (R->out->format == OUTPUT_ZDELTA) chunk_write(R->out->trace_z, row);
+    else write_trace_csv(R->out->trace_file, row);
+}
+
+/* Write the queued rows of steps <= upto. */
+static void flush_rows(const Ensemble *E, int r, int upto) {
+    Replica *R = &E->rep[r];
+    RowQueue *q = &R->queue;
+    while (q->count > 0 && q->step[q->head] <= upto) {
+        int slot = q->head;
+        if (q->summary) write_summary_row(R, &q->summary[slot]);
+        if (q->trace) {
+            for (int i = 0; i < E->n; i++) write_trace_row(R, &q->trace[(size_t)slot * (size_t)E->n + (size_t)i]);
         }
+        q->head = (q->head + 1) % q->cap;
+        q->count--;
     }
+}
 
-    /* final metrics */
+/* Per-step summary and trace rows of replica r. Row buffers get every step;
+ * file rows are queued (event_window) or written right away, and rows that
+ * cannot be written are not computed. */
+static void emit_step(const Ensemble *E, int r, int step) {
+    Replica *R = &E->rep[r];
+    SimOutput *out = R->out;
+    const Scenario *s = R->s;
+    RowQueue *q = &R->queue;
+    int slot = -1;
+    if (q->cap > 0) {
+        slot = (q->head + q->count) % q->cap;
+        q->step[slot] = step;
+        q->count++;
+    }
+    int summary_file = out->summary_file && (slot >= 0 || step % s->summary_every == 0);
+    int trace_file = out->trace_file && (slot >= 0 || step % s->trace_every == 0);
+    int64_t t = profile_clock(E->profile);
+    if (summary_file || out->summary_rows) {
+        SummaryRow row;
+        summarize_replica(E, r, step, &row);
+        if (out->summary_rows) out->summary_rows[step] = row;
+        if (summary_file) {
+            if (slot >= 0) q->summary[slot] = row;
+            else write_summary_row(R, &row);
+        }
+        t = profile_add(E->profile, PHASE_SUMMARY, t);
+    }
+    if (trace_file || out->trace_rows) {
+        for (int i = 0; i < E->n; i++) {
+            TraceRow row;
+            fill_trace_row(E, r, step, i, &row);
+            if (out->trace_rows) out->trace_rows[(size_t)step * (size_t)out->trace_stride + (size_t)i] = row;
+            if (trace_file) {
+                if (slot >= 0) q->trace[(size_t)slot * (size_t)E->n + (size_t)i] = row;
+                else write_trace_row(R, &row);
+            }
+        }
+        t = profile_add(E->profile, PHASE_TRACE, t);
+    }
+    if (slot >= 0) {
+        flush_rows(E, r, step - s->event_window);
+        profile_add(E->profile, PHASE_OUTPUT, t);
+    }
+}
+
+static RunMetrics final_metrics(Ensemble *E, int r) {
+    const Scenario *s = E->rep[r].s;
+    int n = E->n;
     int alive = 0;
     double sum_v = 0, sum_v2 = 0, sum_gap = 0; int gap_count = 0;
-    for (int i = 0; i < n; i++) if (fleet[i].alive) alive++;
-    compute_gaps(fleet, s);
+    for (int i = 0; i < n; i++) if (E->alive[i * E->K + r]) alive++;
+    compute_gaps(E, r);
     double max_gap = 0;
     for (int i = 0; i < n; i++) {
-        if (!fleet[i].alive) continue;
-        sum_v += fleet[i].v;
-        sum_v2 += fleet[i].v * fleet[i].v;
-        sum_gap += fleet[i].gap_f;
+        int c = i * E->K + r;
+        if (!E->alive[c]) continue;
+        sum_v += E->v[c];
+        sum_v2 += E->v[c] * E->v[c];
+        sum_gap += E->gap_f[c];
         gap_count++;
-        if (fleet[i].gap_f > max_gap) max_gap = fleet[i].gap_f;
+        if (E->gap_f[c] > max_gap) max_gap = E->gap_f[c];
     }
     int denom = s->n_initial > 0 ? s->n_initial : n;
     double density = denom > 0 ? ((double)alive / denom) : 0.0;
@@ -634,88 +1424,1208 @@ static void simulate(Scenario *s, Loss *losses, int loss_count, FILE *summary, F
     double stability = 0;
     if (avg_gap > 0) stability = 1.0 / (1.0 + fabs(avg_gap - s->d_star) / s->d_star);
 
-    printf("density=%.4f\n", density);
-    printf("avg_speed=%.4f\n", avg_speed);
-    printf("speed_std=%.4f\n", speed_std);
-    printf("max_gap=%.4f\n", max_gap);
-    printf("avg_gap=%.4f\n", avg_gap);
-    printf("stability=%.4f\n", stability);
+    RunMetrics m;
+    m.density = density;
+    m.avg_speed = avg_speed;
+    m.speed_std = speed_std;
+    m.max_gap = max_gap;
+    m.avg_gap = avg_gap;
+    m.stability = stability;
+    return m;
+}
 
-    free(fleet);
+/* ---- Snapshots ---------------------------------------------------------------
+ * Full state of one replica at the start of a step: per-drone arrays, ring
+ * order, loss cursor, spare bookkeeping and the spare RNG. Gaps and
+ * first_dead are recomputed from these, so they are not stored. A replica
+ * resumed from a snapshot continues exactly where the run that took it
+ * stopped, with its own scenario's parameters from that step on; variants
+ * that only differ in settings not read before the snapshot step thus share
+ * the simulated prefix (see sim_fork.py).
+ */
+typedef struct {
+    int n;                      /* n_total */
+    int step;                   /* first step still to simulate */
+    unsigned int seed;          /* seed of the run that took the snapshot */
+    uint32_t spare_rng;
+    int loss_idx;
+    int dead_deployed;
+    int total_losses_seen;
+    int total_spares_inserted;
+    int next_spare_after_loss_step;
+    int next_spare_allowed_step;
+    int last_event;
+    int ring_count;
+    double *s, *v;              /* n each */
+    int *alive, *ever_deployed, *mode, *incoming_timer;
+    int *ring;                  /* ring order, ring_count entries */
+} Snapshot;
+
+/* snapshot_at values other than a step */
+enum { SNAPSHOT_FIRST_LOSS = -1, SNAPSHOT_FIRST_SPARE = -2 };
+
+/* Per-replica fork settings for simulate_ensemble(); both parts are optional. */
+typedef struct {
+    const Snapshot *resume;     /* start from this state instead of step 0 */
+    Snapshot *snapshot;         /* filled at the fork point, where the replica stops */
+    int snapshot_at;            /* step, SNAPSHOT_FIRST_LOSS or SNAPSHOT_FIRST_SPARE */
+} ForkSpec;
+
+static void snapshot_alloc(Snapshot *snap, int n) {
+    size_t cells = (size_t)(n > 0 ? n : 1);
+    snap->s = calloc(cells, sizeof(double));
+    snap->v = calloc(cells, sizeof(double));
+    snap->alive = calloc(cells, sizeof(int));
+    snap->ever_deployed = calloc(cells, sizeof(int));
+    snap->mode = calloc(cells, sizeof(int));
+    snap->incoming_timer = calloc(cells, sizeof(int));
+    snap->ring = calloc(cells, sizeof(int));
 }
 
-int main(int argc, char **argv) {
-    if (argc < 3 || argc > 5) {
-        fprintf(stderr, "Usage: %s <scenario.cfg> <losses.csv> [summary.csv] [trace.csv]\n", argv[0]);
-        fprintf(stderr, "scenario.cfg: key=value per line (see sample_scenario.cfg)\n");
-        fprintf(stderr, "  supports seed=<uint> and num_losses=<int> for auto-generated losses\n");
-        fprintf(stderr, "losses.csv: step,idx per line (header optional, ',' or ';'); if missing/empty and num_losses>0, losses are generated with seed\n");
-        fprintf(stderr, "summary.csv (optional): per-step aggregates (alive, mean/min/max/std of v and gaps)\n");
-        fprintf(stderr, "trace.csv (optional): per-step dump of s,v,gaps per drone\n");
-        return 1;
+static void snapshot_capture(const Ensemble *E, int r, int step, Snapshot *snap) {
+    const Replica *R = &E->rep[r];
+    if (!snap->s) snapshot_alloc(snap, E->n);
+    snap->n = E->n;
+    snap->step = step;
+    snap->seed = R->s->seed;
+    snap->spare_rng = R->spare_rng;
+    snap->loss_idx = R->loss_idx;
+    snap->dead_deployed = R->dead_deployed;
+    snap->total_losses_seen = R->total_losses_seen;
+    snap->total_spares_inserted = R->total_spares_inserted;
+    snap->next_spare_after_loss_step = R->next_spare_after_loss_step;
+    snap->next_spare_allowed_step = R->next_spare_allowed_step;
+    snap->last_event = R->last_event;
+    for (int i = 0; i < E->n; i++) {
+        int c = i * E->K + r;
+        snap->s[i] = E->s[c];
+        snap->v[i] = E->v[c];
+        snap->alive[i] = E->alive[c];
+        snap->ever_deployed[i] = E->ever_deployed[c];
+        snap->mode[i] = E->mode[c];
+        snap->incoming_timer[i] = E->incoming_timer[c];
     }
-    Scenario s = {0};
-    s.n_initial = 0;
-    s.n_total = 0;
-    s.V = 1.0; s.Vmax = 2.0; s.d_star = 5.0; s.d_safe = 1.0;
-    s.k_sym = 0.5; s.k_sym_rec = 0.5; /* symmetric gap controller (front-back) */
-    s.k_f = 0.5; s.k_b = 0.3; s.k_rep = 0.2; s.k_f_rec = 0.8; s.k_b_rec = 0.0;
-    s.alpha = 1.2; s.beta = 0.8; s.V_cap = 1.5; s.epsilon = 0.1; s.steps = 500; s.dt = 0.1;
-    s.num_losses = 0; s.seed = 1; s.resilience = 0; s.min_spare_delay_steps = 0; s.min_spare_interval_steps = 0;
-    s.spare_interval_min_steps = 0; s.spare_interval_max_steps = 0; s.incoming_hold_steps = 50;
-    s.incoming_v = 0.0; s.extra_spares = 0; s.max_spares = 0;
-
-    s.controller_mode = 0; s.variantA_gamma = 0.0; s.balanced_gap_eps = 0.0; s.speed_relax_rate = 1.0;
-    s.loss_to_spare_delay_min_steps = 0; s.loss_to_spare_delay_max_steps = 0;
-    s.preventive_spares_frac = 0.0; s.preventive_spares = 0;
-
-    if (read_scenario(argv[1], &s) != 0) {
-        fprintf(stderr, "Could not read scenario file %s\n", argv[1]);
-        return 1;
+    snap->ring_count = R->ring.count;
+    memcpy(snap->ring, R->ring.order, R->ring.count * sizeof(int));
+}
+
+/* The snapshot must match the replica's n_total (checked by the callers). */
+static void snapshot_restore(Ensemble *E, int r, const Snapshot *snap) {
+    Replica *R = &E->rep[r];
+    for (int i = 0; i < E->n; i++) {
+        int c = i * E->K + r;
+        E->s[c] = snap->s[i];
+        E->v[c] = snap->v[i];
+        E->alive[c] = snap->alive[i];
+        E->ever_deployed[c] = snap->ever_deployed[i];
+        E->mode[c] = snap->mode[i];
+        E->incoming_timer[c] = snap->incoming_timer[i];
     }
+    R->ring.count = snap->ring_count;
+    memcpy(R->ring.order, snap->ring, snap->ring_count * sizeof(int));
+    R->loss_idx = snap->loss_idx;
+    R->dead_deployed = snap->dead_deployed;
+    R->total_losses_seen = snap->total_losses_seen;
+    R->total_spares_inserted = snap->total_spares_inserted;
+    R->next_spare_after_loss_step = snap->next_spare_after_loss_step;
+    R->next_spare_allowed_step = snap->next_spare_allowed_step;
+    R->last_event = snap->last_event;
+    /* a generator still in its seeded state was never drawn from: use this run's seed */
+    R->spare_rng = snap->spare_rng == spare_rng_seed(snap->seed) ? spare_rng_seed(R->s->seed) : snap->spare_rng;
+    update_first_dead(E, r);
+}
+
+/* Run K replicas in lockstep. All scenarios must be ensemble_compatible() with sc[0].
+ * With `forks` (one per replica), replicas can resume from snapshots (all at
+ * the same step) and/or stop at a fork point, leaving their state in
+ * forks[r].snapshot: the start of step snapshot_at, or of the step in which
+ * the first loss / spare insertion happens. A fork point that is never
+ * reached snapshots the state after the last step. Stopped replicas emit no
+ * rows from the fork step on and get zero metrics. */
+static void simulate_ensemble(const Scenario *const *sc, const Loss *const *losses, const int *loss_counts,
+                              SimOutput *outs, int K, const ForkSpec *forks, RunMetrics *metrics_out,
+                              Profile *profile) {
+    int64_t t_start = profile_clock(profile);
+    Ensemble E;
+    ensemble_init(&E, sc, losses, loss_counts, outs, K);
+    E.profile = profile;
+    int *stopped = calloc(K, sizeof(int));
+    int running = K;
+    int start = 0;
+    for (int r = 0; forks && r < K; r++) {
+        if (!forks[r].resume) continue;
+        snapshot_restore(&E, r, forks[r].resume);
+        start = forks[r].resume->step;
+    }
+
+    /* Optional headers */
+    int64_t t = profile_clock(profile);
+    for (int r = 0; r < K; r++) {
+        write_output_headers(&outs[r], sc[r]);
+        outs[r].trace_stride = E.n;
+    }
+    profile_add(profile, PHASE_OUTPUT, t);
+
+    for (int step = start; step < sc[0]->steps && running > 0; step++) {
+        for (int r = 0; r < K; r++) {
+            if (stopped[r]) continue;
+            Snapshot *snap = forks ? forks[r].snapshot : NULL;
+            int at = snap ? forks[r].snapshot_at : 0;
+            /* event fork points are only known after the step's events: keep the step's start state */
+            if (snap && (at < 0 || at == step)) snapshot_capture(&E, r, step, snap);
+            if (snap && at == step) {
+                stopped[r] = 1;
+                running--;
+                flush_rows(&E, r, INT_MAX);
+                continue;
+            }
+            t = profile_clock(profile);
+            int loss_this_step = apply_losses(&E, r, step);
+            t = profile_add(profile, PHASE_LOSSES, t);
+            compute_gaps(&E, r);
+            t = profile_add(profile, PHASE_GAPS, t);
+            int spare_this_step = 0;
+            if (E.rep[r].s->resilience && !loss_this_step) {
+                spare_this_step = insert_spare(&E, r, step);
+                profile_add(profile, PHASE_SPARES, t);
+            }
+            if ((loss_this_step || spare_this_step) && E.rep[r].s->event_window > 0) E.rep[r].last_event = step;
+            if ((at == SNAPSHOT_FIRST_LOSS && loss_this_step) || (at == SNAPSHOT_FIRST_SPARE && spare_this_step)) {
+                stopped[r] = 1;
+                running--;
+                flush_rows(&E, r, INT_MAX);
+            }
+        }
+
+        t = profile_clock(profile);
+        update_speeds(&E);
+        profile_add(profile, PHASE_SPEEDS, t);
+
+        /* emit rows after speed update, before position advance */
+        for (int r = 0; r < K; r++) {
+            if (!stopped[r]) emit_step(&E, r, step);
+        }
+        if (profile) {
+            profile->replica_steps += running;
+            profile->drone_steps += (int64_t)running * E.n;
+        }
+
+        t = profile_clock(profile);
+        advance_positions(&E);
+        profile_add(profile, PHASE_INTEGRATE, t);
+    }
+
+    for (int r = 0; r < K; r++) {
+        if (stopped[r]) {
+            memset(&metrics_out[r], 0, sizeof(RunMetrics));
+            continue;
+        }
+        flush_rows(&E, r, INT_MAX);
+        if (forks && forks[r].snapshot) snapshot_capture(&E, r, sc[0]->steps, forks[r].snapshot);
+        metrics_out[r] = final_metrics(&E, r);
+    }
+    t = profile_clock(profile);
+    for (int r = 0; r < K; r++) finish_outputs(&outs[r]);
+    profile_add(profile, PHASE_OUTPUT, t);
+    free(stopped);
+    ensemble_free(&E);
+    if (profile) {
+        profile->runs += K;
+        profile->simulate_ns += profile_clock(profile) - t_start;
+    }
+}
+
+static RunMetrics simulate(const Scenario *s, const Loss *losses, int loss_count, SimOutput *out) {
+    RunMetrics m;
+    simulate_ensemble(&s, &losses, &loss_count, out, 1, NULL, &m, NULL);
+    return m;
+}
+
+/* ---- Shared-library API (make lib; see sim_binding.py) ----------------------
+ * Scenario settings are passed as "key=value" lines (same syntax as a .cfg).
+ * Losses are parallel step/idx arrays sorted by step; with no losses and
+ * num_losses > 0 a schedule is generated from the seed, as for a missing file.
+ * Outputs go to caller-owned buffers: `steps` SummaryRow records and,
+ * optionally, steps * n_total TraceRow records (step-major).
+ */
+
+/* Returns 0, or -1 when strict and a line is not a known key=value setting. */
+static int parse_scenario_text(const char *text, int strict, Scenario *s) {
+    scenario_defaults(s);
+    size_t len = strlen(text);
+    char *buf = malloc(len + 1);
+    memcpy(buf, text, len + 1);
+    int rc = 0;
+    char *save = NULL;
+    for (char *line = strtok_r(buf, "\n", &save); line; line = strtok_r(NULL, "\n", &save)) {
+        if (!apply_scenario_line(s, line) && strict) rc = -1;
+    }
+    free(buf);
+    finalize_scenario(s);
+    return rc;
+}
+
+int bsim_record_sizes(int *summary_size, int *trace_size) {
+    *summary_size = (int)sizeof(SummaryRow);
+    *trace_size = (int)sizeof(TraceRow);
+    return 0;
+}
+
+int bsim_shape(const char *scenario_text, int strict, int *steps_out, int *n_total_out) {
+    Scenario s;
+    if (parse_scenario_text(scenario_text, strict, &s) != 0) return -1;
+    *steps_out = s.steps;
+    *n_total_out = s.n_total;
+    return 0;
+}
+
+int bsim_run(const char *scenario_text, int strict,
+             const int *loss_steps, const int *loss_idx, int loss_count,
+             SummaryRow *summary_out, TraceRow *trace_out, double *metrics_out) {
+    Scenario s;
+    if (parse_scenario_text(scenario_text, strict, &s) != 0) return -1;
+    Loss *losses = NULL;
+    if (loss_count > 0) {
+        losses = malloc(loss_count * sizeof(Loss));
+        for (int i = 0; i < loss_count; i++) {
+            losses[i].step = loss_steps[i];
+            losses[i].idx = loss_idx[i];
+        }
+    } else if (s.num_losses > 0) {
+        generate_losses(&s, &losses, &loss_count);
+    }
+    SimOutput out = { NULL, NULL, summary_out, trace_out, 0, OUTPUT_CSV, NULL, NULL };
+    RunMetrics m = simulate(&s, losses, loss_count, &out);
+    free(losses);
+    if (metrics_out) {
+        metrics_out[0] = m.density;
+        metrics_out[1] = m.avg_speed;
+        metrics_out[2] = m.speed_std;
+        metrics_out[3] = m.max_gap;
+        metrics_out[4] = m.avg_gap;
+        metrics_out[5] = m.stability;
+    }
+    return 0;
+}
+
+#ifndef BSIM_LIBRARY
+
+static const char *const PHASE_NAMES[PHASE_COUNT] = {
+    "losses", "gaps", "spares", "speeds", "integrate", "summary", "trace", "output"
+};
+
+static void profile_merge(Profile *dst, const Profile *src) {
+    for (int k = 0; k < PHASE_COUNT; k++) {
+        dst->ns[k] += src->ns[k];
+        dst->calls[k] += src->calls[k];
+    }
+    dst->simulate_ns += src->simulate_ns;
+    dst->replica_steps += src->replica_steps;
+    dst->drone_steps += src->drone_steps;
+    dst->runs += src->runs;
+}
+
+/* --profile report: one JSON object. "other" is simulate time outside the
+ * phases (setup, snapshots, metrics); wall_ns also covers parsing and
+ * loading. With --jobs > 1, phase times add up over threads. */
+/* Peak resident set of this process in kB. Linux keeps ru_maxrss across
+ * exec (a child of a large Python process reports the parent's size), so
+ * VmHWM is preferred where it exists. */
+static long peak_rss_kb(void) {
+    FILE *f = fopen("/proc/self/status", "r");
+    if (f) {
+        char line[256];
+        long kb = -1;
+        while (fgets(line, sizeof(line), f)) {
+            if (sscanf(line, "VmHWM: %ld", &kb) == 1) break;
+        }
+        fclose(f);
+        if (kb >= 0) return kb;
+    }
+    struct rusage ru;
+    getrusage(RUSAGE_SELF, &ru);
+#ifdef __APPLE__
+    return ru.ru_maxrss / 1024; /* bytes on macOS */
+#else
+    return ru.ru_maxrss;
+#endif
+}
+
+static void write_profile(FILE *f, const Profile *p, int64_t wall_ns) {
+    double per = p->drone_steps > 0 ? 1.0 / (double)p->drone_steps : 0.0;
+    int64_t other = p->simulate_ns;
+    fprintf(f, "{\"runs\":%d,\"replica_steps\":%lld,\"drone_steps\":%lld,\"wall_ns\":%lld,\"simulate_ns\":%lld,",
+            p->runs, (long long)p->replica_steps, (long long)p->drone_steps, (long long)wall_ns, (long long)p->simulate_ns);
+    fprintf(f, "\"ns_per_drone_step\":%.3f,\"phases\":{", (double)p->simulate_ns * per);
+    for (int k = 0; k < PHASE_COUNT; k++) {
+        fprintf(f, "\"%s\":{\"calls\":%lld,\"ns\":%lld,\"ns_per_drone_step\":%.3f},", PHASE_NAMES[k],
+                (long long)p->calls[k], (long long)p->ns[k], (double)p->ns[k] * per);
+        other -= p->ns[k];
+    }
+    fprintf(f, "\"other\":{\"ns\":%lld,\"ns_per_drone_step\":%.3f}},\"peak_rss_kb\":%ld}\n",
+            (long long)other, (double)other * per, peak_rss_kb());
+}
+
+static void print_metrics(FILE *out, const RunMetrics *m) {
+    fprintf(out, "density=%.4f\n", m->density);
+    fprintf(out, "avg_speed=%.4f\n", m->avg_speed);
+    fprintf(out, "speed_std=%.4f\n", m->speed_std);
+    fprintf(out, "max_gap=%.4f\n", m->max_gap);
+    fprintf(out, "avg_gap=%.4f\n", m->avg_gap);
+    fprintf(out, "stability=%.4f\n", m->stability);
+}
+
+/* Read the loss schedule, or generate (and write) one when it is missing/empty and num_losses > 0. */
+static int load_losses(const char *path, const Scenario *s, Loss **losses_out, int *count_out) {
     Loss *losses = NULL; int loss_count = 0;
-    int read_ok = read_losses(argv[2], &losses, &loss_count);
+    int read_ok = read_losses(path, &losses, &loss_count);
     if (read_ok != 0 || loss_count == 0) {
-        if (s.num_losses > 0) {
-            /* auto-generate losses with seed */
+        if (s->num_losses <= 0) {
             if (losses) free(losses);
-            generate_losses(&s, &losses, &loss_count);
-            FILE *out = fopen(argv[2], "w");
-            if (out) {
-                fprintf(out, "step;idx\n");
-                for (int i = 0; i < loss_count; i++) {
-                    fprintf(out, "%d;%d\n", losses[i].step, losses[i].idx);
-                }
-                fclose(out);
+            return -1;
+        }
+        /* auto-generate losses with seed */
+        if (losses) free(losses);
+        generate_losses(s, &losses, &loss_count);
+        FILE *out = fopen(path, "w");
+        if (out) {
+            fprintf(out, "step;idx\n");
+            for (int i = 0; i < loss_count; i++) {
+                fprintf(out, "%d;%d\n", losses[i].step, losses[i].idx);
             }
-        } else {
-            fprintf(stderr, "Could not read losses file %s and num_losses not set\n", argv[2]);
-            if (losses) free(losses);
+            fclose(out);
+        }
+    }
+    *losses_out = losses;
+    *count_out = loss_count;
+    return 0;
+}
+
+/* Snapshot files: magic, header fields and arrays in native byte order (a
+ * scratch artifact for resuming on the same machine, not an exchange format). */
+static const char SNAPSHOT_MAGIC[8] = { 'B', 'S', 'I', 'M', 'S', 'N', 'P', '2' };
+
+static void snapshot_free(Snapshot *snap) {
+    void *blocks[] = { snap->s, snap->v, snap->alive, snap->ever_deployed, snap->mode,
+                       snap->incoming_timer, snap->ring };
+    for (size_t b = 0; b < sizeof(blocks) / sizeof(blocks[0]); b++) free(blocks[b]);
+    memset(snap, 0, sizeof(*snap));
+}
+
+static int write_snapshot(const char *path, const Snapshot *snap) {
+    FILE *f = fopen(path, "wb");
+    if (!f) return -1;
+    unsigned int rng[2] = { snap->seed, snap->spare_rng };
+    int hdr[10] = { snap->n, snap->step, snap->loss_idx, snap->dead_deployed, snap->total_losses_seen,
+                    snap->total_spares_inserted, snap->next_spare_after_loss_step,
+                    snap->next_spare_allowed_step, snap->ring_count, snap->last_event };
+    size_t n = (size_t)snap->n;
+    int ok = fwrite(SNAPSHOT_MAGIC, 1, sizeof(SNAPSHOT_MAGIC), f) == sizeof(SNAPSHOT_MAGIC) &&
+             fwrite(rng, sizeof(rng), 1, f) == 1 && fwrite(hdr, sizeof(hdr), 1, f) == 1 &&
+             fwrite(snap->s, sizeof(double), n, f) == n && fwrite(snap->v, sizeof(double), n, f) == n &&
+             fwrite(snap->alive, sizeof(int), n, f) == n && fwrite(snap->ever_deployed, sizeof(int), n, f) == n &&
+             fwrite(snap->mode, sizeof(int), n, f) == n && fwrite(snap->incoming_timer, sizeof(int), n, f) == n &&
+             fwrite(snap->ring, sizeof(int), (size_t)snap->ring_count, f) == (size_t)snap->ring_count;
+    if (fclose(f) != 0) ok = 0;
+    return ok ? 0 : -1;
+}
+
+static int read_snapshot(const char *path, Snapshot *snap) {
+    memset(snap, 0, sizeof(*snap));
+    FILE *f = fopen(path, "rb");
+    if (!f) return -1;
+    char magic[sizeof(SNAPSHOT_MAGIC)];
+    unsigned int rng[2];
+    int hdr[10];
+    int ok = fread(magic, 1, sizeof(magic), f) == sizeof(magic) && memcmp(magic, SNAPSHOT_MAGIC, sizeof(magic)) == 0 &&
+             fread(rng, sizeof(rng), 1, f) == 1 && fread(hdr, sizeof(hdr), 1, f) == 1 &&
+             hdr[0] > 0 && hdr[1] >= 0 && hdr[8] >= 0 && hdr[8] <= hdr[0];
+    if (ok) {
+        size_t n = (size_t)hdr[0];
+        snapshot_alloc(snap, hdr[0]);
+        ok = fread(snap->s, sizeof(double), n, f) == n && fread(snap->v, sizeof(double), n, f) == n &&
+             fread(snap->alive, sizeof(int), n, f) == n && fread(snap->ever_deployed, sizeof(int), n, f) == n &&
+             fread(snap->mode, sizeof(int), n, f) == n && fread(snap->incoming_timer, sizeof(int), n, f) == n &&
+             fread(snap->ring, sizeof(int), (size_t)hdr[8], f) == (size_t)hdr[8];
+    }
+    fclose(f);
+    if (!ok) {
+        snapshot_free(snap);
+        return -1;
+    }
+    snap->seed = rng[0];
+    snap->spare_rng = rng[1];
+    snap->n = hdr[0];
+    snap->step = hdr[1];
+    snap->loss_idx = hdr[2];
+    snap->dead_deployed = hdr[3];
+    snap->total_losses_seen = hdr[4];
+    snap->total_spares_inserted = hdr[5];
+    snap->next_spare_after_loss_step = hdr[6];
+    snap->next_spare_allowed_step = hdr[7];
+    snap->ring_count = hdr[8];
+    snap->last_event = hdr[9];
+    return 0;
+}
+
+/* Can a run of `s` with this loss schedule resume from `snap`? Returns 0, or -1 with a message in err. */
+static int check_resume(const Snapshot *snap, const Scenario *s, const Loss *losses, int loss_count,
+                        char *err, size_t err_size) {
+    int consumed = 0;
+    while (consumed < loss_count && losses[consumed].step < snap->step) consumed++;
+    if (snap->n != s->n_total) {
+        snprintf(err, err_size, "snapshot has n_total=%d, scenario has %d", snap->n, s->n_total);
+    } else if (snap->step > s->steps) {
+        snprintf(err, err_size, "snapshot step %d is past steps=%d", snap->step, s->steps);
+    } else if (snap->loss_idx != consumed) {
+        snprintf(err, err_size, "loss schedule does not match the snapshot at step %d", snap->step);
+    } else if (snap->spare_rng != spare_rng_seed(snap->seed) && s->seed != snap->seed) {
+        snprintf(err, err_size, "snapshot already drew from the spare RNG of seed %u; seed cannot change", snap->seed);
+    } else {
+        return 0;
+    }
+    return -1;
+}
+
+/* "first_loss", "first_spare" or a step number. */
+static int parse_snapshot_at(const char *text, int *at) {
+    char *end;
+    if (strcmp(text, "first_loss") == 0) *at = SNAPSHOT_FIRST_LOSS;
+    else if (strcmp(text, "first_spare") == 0) *at = SNAPSHOT_FIRST_SPARE;
+    else {
+        long step = strtol(text, &end, 10);
+        if (end == text || *end != '\0' || step < 0 || step > 2147483647L) return -1;
+        *at = (int)step;
+    }
+    return 0;
+}
+
+static int parse_output_format(const char *text, int *format) {
+    if (strcmp(text, "csv") == 0) *format = OUTPUT_CSV;
+    else if (strcmp(text, "bin") == 0) *format = OUTPUT_BINARY;
+    else if (strcmp(text, "z") == 0) *format = OUTPUT_ZDELTA;
+    else return -1;
+    return 0;
+}
+
+/* ---- Batch mode ------------------------------------------------------------
+ * Manifest: one job per line, whitespace-separated key=value tokens:
+ *   scenario=<cfg> losses=<csv> [summary=<csv>] [trace=<csv>] [<scenario key>=<value> ...]
+ * Scenario keys override the cfg file (e.g. seed=7 incoming_hold_steps=200).
+ * Blank lines and lines starting with '#' are ignored; paths cannot contain blanks.
+ * Scenario and loss files are parsed once per distinct path. Jobs run on
+ * --jobs worker threads; one result line per job is written to stdout as it
+ * completes:  job=<i> status=ok density=... | job=<i> status=error message=...
+ * With --lockstep K, up to K jobs with the same n_total, steps and
+ * controller_mode run as one lockstep ensemble (simulate_ensemble()); groups
+ * are capped so that every worker thread still gets work.
+ * `format=bin` writes the summary/trace as binary records, `format=z` as
+ * compressed records (default csv).
+ * Forking (see Snapshots): `resume=<file>` starts the job from a snapshot and
+ * its outputs cover the remaining steps only; `snapshot=<file>
+ * [snapshot_at=first_loss|first_spare|<step>]` (default first_loss) stops the
+ * job at the fork point and writes its state there; the result line is then
+ * job=<i> status=ok snapshot_step=<step>. Only jobs resuming at the same
+ * step share an ensemble.
+ * Streaming: with --stream <path>, jobs with `summary=@stream` write their
+ * summary into that one file or pipe instead of a file of their own. The
+ * stream is STREAM_MAGIC followed by frames <int32 job><uint32 length><bytes>
+ * (little-endian); a job's frame bytes, concatenated, are exactly the summary
+ * file it would have written, and a zero-length frame ends it. Frames of
+ * concurrent jobs interleave; each job's bytes arrive in order.
+ */
+
+#define STREAM_TOKEN "@stream"
+#define STREAM_BUFFER (1 << 16)
+static const char STREAM_MAGIC[8] = { 'B', 'S', 'I', 'M', 'S', 'T', 'R', '1' };
+
+typedef struct {
+    FILE *f;
+    pthread_mutex_t lock;
+} Stream;
+
+typedef struct {
+    Stream *stream;
+    int job;
+} StreamSink;
+
+static void stream_frame(Stream *st, int job, const char *buf, uint32_t len) {
+    unsigned char head[8];
+    for (int b = 0; b < 4; b++) {
+        head[b] = ((uint32_t)job >> (8 * b)) & 0xff;
+        head[4 + b] = (len >> (8 * b)) & 0xff;
+    }
+    pthread_mutex_lock(&st->lock);
+    fwrite(head, 1, sizeof(head), st->f);
+    if (len) fwrite(buf, 1, len, st->f);
+    if (!len) fflush(st->f);
+    pthread_mutex_unlock(&st->lock);
+}
+
+static ssize_t stream_write(void *cookie, const char *buf, size_t size) {
+    StreamSink *sink = cookie;
+    for (size_t done = 0; done < size;) {
+        uint32_t len = size - done > UINT32_MAX ? UINT32_MAX : (uint32_t)(size - done);
+        stream_frame(sink->stream, sink->job, buf + done, len);
+        done += len;
+    }
+    return (ssize_t)size;
+}
+
+static int stream_close(void *cookie) {
+    StreamSink *sink = cookie;
+    stream_frame(sink->stream, sink->job, NULL, 0);
+    free(sink);
+    return 0;
+}
+
+/* A FILE that writes job `job`'s frames into the stream (fully buffered, one frame per buffer). */
+static FILE *stream_open(Stream *st, int job) {
+    StreamSink *sink = malloc(sizeof(StreamSink));
+    sink->stream = st;
+    sink->job = job;
+    cookie_io_functions_t io = { NULL, stream_write, NULL, stream_close };
+    FILE *f = fopencookie(sink, "w", io);
+    if (!f) {
+        free(sink);
+        return NULL;
+    }
+    setvbuf(f, NULL, _IOFBF, STREAM_BUFFER);
+    return f;
+}
+
+typedef struct {
+    char *path;
+    Scenario scenario;      /* parsed, not finalized */
+} ScenarioCacheEntry;
+
+typedef struct {
+    char *path;
+    Loss *losses;
+    int count;
+} LossCacheEntry;
+
+typedef struct {
+    char *path;
+    Snapshot *snapshot;     /* owned; jobs keep pointers across cache growth */
+} SnapshotCacheEntry;
+
+typedef struct {
+    Scenario scenario;
+    const Loss *losses;
+    int loss_count;
+    char *summary_path;
+    char *trace_path;
+    int format;                 /* OUTPUT_CSV, OUTPUT_BINARY or OUTPUT_ZDELTA */
+    const Snapshot *resume;     /* from the snapshot cache */
+    char *snapshot_path;
+    int snapshot_at;
+    Snapshot snapshot;          /* taken by this job */
+    int failed;
+    char error[256];
+    RunMetrics metrics;
+} BatchJob;
+
+typedef struct {
+    int *members;           /* job indices, in manifest order */
+    int count;
+} BatchGroup;
+
+typedef struct {
+    BatchJob *jobs;
+    BatchGroup *groups;
+    int count;              /* groups */
+    int next;
+    int failed;
+    Stream *stream;         /* NULL unless --stream */
+    Profile *profile;       /* NULL unless --profile */
+    pthread_mutex_t lock;
+} BatchQueue;
+
+/* Replicas can share an ensemble when they have the same array shapes and controller. */
+static int ensemble_compatible(const Scenario *a, const Scenario *b) {
+    return a->n_total == b->n_total && a->steps == b->steps && a->controller_mode == b->controller_mode;
+}
+
+static int batch_start_step(const BatchJob *job) {
+    return job->resume ? job->resume->step : 0;
+}
+
+static char *dup_string(const char *src) {
+    size_t len = strlen(src) + 1;
+    char *out = malloc(len);
+    memcpy(out, src, len);
+    return out;
+}
+
+static int open_batch_outputs(BatchJob *job, int index, Stream *stream, FILE **summary, FILE **trace) {
+    *summary = NULL;
+    *trace = NULL;
+    const char *mode = job->format == OUTPUT_CSV ? "w" : "wb";
+    if (job->summary_path && strcmp(job->summary_path, STREAM_TOKEN) == 0) {
+        if (!stream || !(*summary = stream_open(stream, index))) {
+            snprintf(job->error, sizeof(job->error), "summary=%s needs --stream", STREAM_TOKEN);
+            job->failed = 1;
+            return -1;
+        }
+    } else if (job->summary_path && !(*summary = fopen(job->summary_path, mode))) {
+        snprintf(job->error, sizeof(job->error), "could not open summary file %s", job->summary_path);
+        job->failed = 1;
+        return -1;
+    }
+    if (job->trace_path && !(*trace = fopen(job->trace_path, mode))) {
+        snprintf(job->error, sizeof(job->error), "could not open trace file %s", job->trace_path);
+        job->failed = 1;
+        if (*summary) fclose(*summary);
+        *summary = NULL;
+        return -1;
+    }
+    return 0;
+}
+
+static void run_batch_group(BatchJob *jobs, const BatchGroup *g, Stream *stream, Profile *profile) {
+    const Scenario **scenarios = malloc(g->count * sizeof(Scenario *));
+    const Loss **losses = malloc(g->count * sizeof(Loss *));
+    int *loss_counts = malloc(g->count * sizeof(int));
+    SimOutput *outs = malloc(g->count * sizeof(SimOutput));
+    RunMetrics *metrics = malloc(g->count * sizeof(RunMetrics));
+    ForkSpec *forks = malloc(g->count * sizeof(ForkSpec));
+    BatchJob **running = malloc(g->count * sizeof(BatchJob *));
+    int k = 0;
+    for (int m = 0; m < g->count; m++) {
+        BatchJob *job = &jobs[g->members[m]];
+        FILE *summary, *trace;
+        if (job->failed || open_batch_outputs(job, g->members[m], stream, &summary, &trace) != 0) continue;
+        scenarios[k] = &job->scenario;
+        losses[k] = job->losses;
+        loss_counts[k] = job->loss_count;
+        outs[k] = (SimOutput){ summary, trace, NULL, NULL, 0, job->format, NULL, NULL };
+        forks[k] = (ForkSpec){ job->resume, job->snapshot_path ? &job->snapshot : NULL, job->snapshot_at };
+        running[k++] = job;
+    }
+    if (k > 0) simulate_ensemble(scenarios, losses, loss_counts, outs, k, forks, metrics, profile);
+    for (int r = 0; r < k; r++) {
+        BatchJob *job = running[r];
+        job->metrics = metrics[r];
+        if (outs[r].summary_file) fclose(outs[r].summary_file);
+        if (outs[r].trace_file) fclose(outs[r].trace_file);
+        if (job->snapshot_path && write_snapshot(job->snapshot_path, &job->snapshot) != 0) {
+            snprintf(job->error, sizeof(job->error), "could not write snapshot file %s", job->snapshot_path);
+            job->failed = 1;
+        }
+    }
+    free(scenarios);
+    free(losses);
+    free(loss_counts);
+    free(outs);
+    free(metrics);
+    free(forks);
+    free(running);
+}
+
+static void *batch_worker(void *arg) {
+    BatchQueue *q = (BatchQueue *)arg;
+    for (;;) {
+        pthread_mutex_lock(&q->lock);
+        int g = q->next++;
+        pthread_mutex_unlock(&q->lock);
+        if (g >= q->count) break;
+        Profile profile;
+        memset(&profile, 0, sizeof(profile));
+        run_batch_group(q->jobs, &q->groups[g], q->stream, q->profile ? &profile : NULL);
+
+        pthread_mutex_lock(&q->lock);
+        if (q->profile) profile_merge(q->profile, &profile);
+        for (int m = 0; m < q->groups[g].count; m++) {
+            int i = q->groups[g].members[m];
+            BatchJob *job = &q->jobs[i];
+            if (job->failed) {
+                q->failed++;
+                printf("job=%d status=error message=%s\n", i, job->error);
+            } else if (job->snapshot_path) {
+                printf("job=%d status=ok snapshot_step=%d\n", i, job->snapshot.step);
+            } else {
+                const RunMetrics *rm = &job->metrics;
+                printf("job=%d status=ok density=%.4f avg_speed=%.4f speed_std=%.4f max_gap=%.4f avg_gap=%.4f stability=%.4f\n",
+                       i, rm->density, rm->avg_speed, rm->speed_std, rm->max_gap, rm->avg_gap, rm->stability);
+            }
+        }
+        fflush(stdout);
+        pthread_mutex_unlock(&q->lock);
+    }
+    return NULL;
+}
+
+/* Partition jobs into lockstep groups of up to `lockstep` compatible jobs. */
+static BatchGroup *group_batch_jobs(const BatchJob *jobs, int job_count, int lockstep, int *group_count) {
+    BatchGroup *groups = malloc((job_count > 0 ? job_count : 1) * sizeof(BatchGroup));
+    int count = 0;
+    for (int i = 0; i < job_count; i++) {
+        int g = -1;
+        if (!jobs[i].failed) {
+            for (int c = 0; c < count && g < 0; c++) {
+                const BatchJob *first = &jobs[groups[c].members[0]];
+                if (groups[c].count < lockstep && !first->failed && ensemble_compatible(&first->scenario, &jobs[i].scenario) &&
+                    batch_start_step(first) == batch_start_step(&jobs[i])) g = c;
+            }
+        }
+        if (g < 0) {
+            g = count++;
+            groups[g].members = malloc(lockstep * sizeof(int));
+            groups[g].count = 0;
+        }
+        groups[g].members[groups[g].count++] = i;
+    }
+    *group_count = count;
+    return groups;
+}
+
+static const Scenario *cached_scenario(ScenarioCacheEntry **cache, int *count, const char *path) {
+    for (int i = 0; i < *count; i++) {
+        if (strcmp((*cache)[i].path, path) == 0) return &(*cache)[i].scenario;
+    }
+    Scenario s;
+    scenario_defaults(&s);
+    if (read_scenario(path, &s) != 0) return NULL;
+    *cache = realloc(*cache, (*count + 1) * sizeof(ScenarioCacheEntry));
+    (*cache)[*count].path = dup_string(path);
+    (*cache)[*count].scenario = s;
+    return &(*cache)[(*count)++].scenario;
+}
+
+static const LossCacheEntry *cached_losses(LossCacheEntry **cache, int *count, const char *path, const Scenario *s) {
+    for (int i = 0; i < *count; i++) {
+        if (strcmp((*cache)[i].path, path) == 0) return &(*cache)[i];
+    }
+    Loss *losses = NULL; int loss_count = 0;
+    if (load_losses(path, s, &losses, &loss_count) != 0) return NULL;
+    *cache = realloc(*cache, (*count + 1) * sizeof(LossCacheEntry));
+    (*cache)[*count].path = dup_string(path);
+    (*cache)[*count].losses = losses;
+    (*cache)[*count].count = loss_count;
+    return &(*cache)[(*count)++];
+}
+
+static const Snapshot *cached_snapshot(SnapshotCacheEntry **cache, int *count, const char *path) {
+    for (int i = 0; i < *count; i++) {
+        if (strcmp((*cache)[i].path, path) == 0) return (*cache)[i].snapshot;
+    }
+    Snapshot *snap = malloc(sizeof(Snapshot));
+    if (read_snapshot(path, snap) != 0) {
+        free(snap);
+        return NULL;
+    }
+    *cache = realloc(*cache, (*count + 1) * sizeof(SnapshotCacheEntry));
+    (*cache)[*count].path = dup_string(path);
+    (*cache)[*count].snapshot = snap;
+    return (*cache)[(*count)++].snapshot;
+}
+
+static int hex_digit(char c) {
+    if (c >= '0' && c <= '9') return c - '0';
+    if (c >= 'a' && c <= 'f') return c - 'a' + 10;
+    if (c >= 'A' && c <= 'F') return c - 'A' + 10;
+    return -1;
+}
+
+/* Decode the %XX escapes of a manifest value in place (sim_batch.py escapes
+ * whitespace, '%' and control characters); -1 on a malformed escape or %00. */
+static int percent_decode(char *s) {
+    char *out = s;
+    for (const char *in = s; *in; in++) {
+        if (*in != '%') {
+            *out++ = *in;
+            continue;
+        }
+        int hi = hex_digit(in[1]);
+        int lo = hi < 0 ? -1 : hex_digit(in[2]);
+        if (lo < 0 || hi * 16 + lo == 0) return -1;
+        *out++ = (char)(hi * 16 + lo);
+        in += 2;
+    }
+    *out = '\0';
+    return 0;
+}
+
+/* Parse one manifest line into *job (job->failed is set on errors). */
+static void parse_batch_line(char *line, BatchJob *job,
+                             ScenarioCacheEntry **scen_cache, int *scen_count,
+                             LossCacheEntry **loss_cache, int *loss_count,
+                             SnapshotCacheEntry **snap_cache, int *snap_count) {
+    memset(job, 0, sizeof(*job));
+    job->snapshot_at = SNAPSHOT_FIRST_LOSS;
+    const char *scenario_path = NULL;
+    const char *losses_path = NULL;
+    const char *resume_path = NULL;
+    const char *snapshot_at = NULL;
+    char *overrides[128];
+    int n_overrides = 0;
+    for (char *tok = strtok(line, " \t\r\n"); tok; tok = strtok(NULL, " \t\r\n")) {
+        char *eq = strchr(tok, '=');
+        if (!eq) {
+            snprintf(job->error, sizeof(job->error), "malformed token '%s'", tok);
+            job->failed = 1;
+            return;
+        }
+        *eq = '\0';
+        char *val = eq + 1;
+        if (percent_decode(val) != 0) {
+            snprintf(job->error, sizeof(job->error), "malformed %%XX escape in '%s=%s'", tok, val);
+            job->failed = 1;
+            return;
+        }
+        if (strcmp(tok, "scenario") == 0) scenario_path = val;
+        else if (strcmp(tok, "losses") == 0) losses_path = val;
+        else if (strcmp(tok, "summary") == 0) job->summary_path = dup_string(val);
+        else if (strcmp(tok, "trace") == 0) job->trace_path = dup_string(val);
+        else if (strcmp(tok, "resume") == 0) resume_path = val;
+        else if (strcmp(tok, "snapshot") == 0) job->snapshot_path = dup_string(val);
+        else if (strcmp(tok, "snapshot_at") == 0) snapshot_at = val;
+        else if (strcmp(tok, "format") == 0) {
+            if (parse_output_format(val, &job->format) != 0) {
+                snprintf(job->error, sizeof(job->error), "invalid format '%s' (csv, bin or z)", val);
+                job->failed = 1;
+                return;
+            }
+        }
+        else {
+            *eq = '=';
+            if (n_overrides >= (int)(sizeof(overrides) / sizeof(overrides[0]))) {
+                snprintf(job->error, sizeof(job->error), "too many overrides (at most %d)",
+                         (int)(sizeof(overrides) / sizeof(overrides[0])));
+                job->failed = 1;
+                return;
+            }
+            overrides[n_overrides++] = tok;
+        }
+    }
+    if (!scenario_path || !losses_path) {
+        snprintf(job->error, sizeof(job->error), "scenario= and losses= are required");
+        job->failed = 1;
+        return;
+    }
+    if (snapshot_at && (!job->snapshot_path || parse_snapshot_at(snapshot_at, &job->snapshot_at) != 0)) {
+        snprintf(job->error, sizeof(job->error), "invalid snapshot_at '%s' (needs snapshot=; first_loss, first_spare or a step)", snapshot_at);
+        job->failed = 1;
+        return;
+    }
+    const Scenario *base = cached_scenario(scen_cache, scen_count, scenario_path);
+    if (!base) {
+        snprintf(job->error, sizeof(job->error), "could not read scenario file %s", scenario_path);
+        job->failed = 1;
+        return;
+    }
+    job->scenario = *base;
+    for (int i = 0; i < n_overrides; i++) {
+        if (!apply_scenario_line(&job->scenario, overrides[i])) {
+            snprintf(job->error, sizeof(job->error), "invalid override '%s'", overrides[i]);
+            job->failed = 1;
+            return;
+        }
+    }
+    finalize_scenario(&job->scenario);
+    const LossCacheEntry *le = cached_losses(loss_cache, loss_count, losses_path, &job->scenario);
+    if (!le) {
+        snprintf(job->error, sizeof(job->error), "could not read losses file %s and num_losses not set", losses_path);
+        job->failed = 1;
+        return;
+    }
+    job->losses = le->losses;
+    job->loss_count = le->count;
+    if (resume_path) {
+        job->resume = cached_snapshot(snap_cache, snap_count, resume_path);
+        if (!job->resume) {
+            snprintf(job->error, sizeof(job->error), "could not read snapshot file %s", resume_path);
+            job->failed = 1;
+            return;
+        }
+        if (check_resume(job->resume, &job->scenario, job->losses, job->loss_count, job->error, sizeof(job->error)) != 0) {
+            job->failed = 1;
+        }
+    }
+}
+
+static int run_batch(const char *manifest_path, const char *stream_path, int n_threads, int lockstep, Profile *profile) {
+    FILE *f = strcmp(manifest_path, "-") == 0 ? stdin : fopen(manifest_path, "r");
+    if (!f) {
+        fprintf(stderr, "Could not open manifest %s\n", manifest_path);
+        return 1;
+    }
+    Stream stream = { NULL, PTHREAD_MUTEX_INITIALIZER };
+    if (stream_path) {
+        if (!(stream.f = fopen(stream_path, "wb"))) {
+            fprintf(stderr, "Could not open stream %s\n", stream_path);
+            if (f != stdin) fclose(f);
             return 1;
         }
+        setvbuf(stream.f, NULL, _IOFBF, STREAM_BUFFER);
+        fwrite(STREAM_MAGIC, 1, sizeof(STREAM_MAGIC), stream.f);
+    }
+    ScenarioCacheEntry *scen_cache = NULL; int scen_count = 0;
+    LossCacheEntry *loss_cache = NULL; int loss_count = 0;
+    SnapshotCacheEntry *snap_cache = NULL; int snap_count = 0;
+    BatchJob *jobs = NULL; int job_count = 0, job_cap = 0;
+    char *line = NULL; size_t line_cap = 0;
+    while (getline(&line, &line_cap, f) != -1) {
+        char *p = line;
+        while (*p == ' ' || *p == '\t') p++;
+        if (*p == '\0' || *p == '\n' || *p == '\r' || *p == '#') continue;
+        if (job_count >= job_cap) {
+            job_cap = job_cap ? job_cap * 2 : 64;
+            jobs = realloc(jobs, job_cap * sizeof(BatchJob));
+        }
+        parse_batch_line(p, &jobs[job_count++], &scen_cache, &scen_count, &loss_cache, &loss_count,
+                         &snap_cache, &snap_count);
+    }
+    free(line);
+    if (f != stdin) fclose(f);
+
+    if (n_threads < 1) n_threads = 1;
+    if (n_threads > job_count) n_threads = job_count > 0 ? job_count : 1;
+    /* keep every worker busy: no more replicas per group than jobs per thread */
+    int per_thread = (job_count + n_threads - 1) / n_threads;
+    if (lockstep > per_thread) lockstep = per_thread;
+    if (lockstep < 1) lockstep = 1;
+    int group_count = 0;
+    BatchGroup *groups = group_batch_jobs(jobs, job_count, lockstep, &group_count);
+    BatchQueue q = { jobs, groups, group_count, 0, 0, stream_path ? &stream : NULL, profile, PTHREAD_MUTEX_INITIALIZER };
+    if (n_threads == 1) {
+        batch_worker(&q);
+    } else {
+        pthread_t *threads = malloc(n_threads * sizeof(pthread_t));
+        for (int t = 0; t < n_threads; t++) pthread_create(&threads[t], NULL, batch_worker, &q);
+        for (int t = 0; t < n_threads; t++) pthread_join(threads[t], NULL);
+        free(threads);
+    }
+    if (stream.f) fclose(stream.f);
+
+    for (int i = 0; i < job_count; i++) {
+        free(jobs[i].summary_path);
+        free(jobs[i].trace_path);
+        free(jobs[i].snapshot_path);
+        snapshot_free(&jobs[i].snapshot);
+    }
+    free(jobs);
+    for (int g = 0; g < group_count; g++) free(groups[g].members);
+    free(groups);
+    for (int i = 0; i < scen_count; i++) free(scen_cache[i].path);
+    free(scen_cache);
+    for (int i = 0; i < loss_count; i++) {
+        free(loss_cache[i].path);
+        free(loss_cache[i].losses);
+    }
+    free(loss_cache);
+    for (int i = 0; i < snap_count; i++) {
+        free(snap_cache[i].path);
+        snapshot_free(snap_cache[i].snapshot);
+        free(snap_cache[i].snapshot);
     }
+    free(snap_cache);
+    return q.failed ? 1 : 0;
+}
+
+static void usage(const char *prog) {
+    fprintf(stderr, "Usage: %s <scenario.cfg> <losses.csv> [summary.csv] [trace.csv]\n", prog);
+    fprintf(stderr, "       %s --batch <manifest|-> [--jobs N] [--lockstep K] [--stream PATH]\n", prog);
+    fprintf(stderr, "       %s --print-scenario <scenario.cfg> [--set key=value ...]\n", prog);
+    fprintf(stderr, "both take [--profile]: per-phase timings and peak memory as JSON on stderr\n");
+    fprintf(stderr, "single runs also take [--resume snap.bin] [--snapshot snap.bin [--snapshot-at first_loss|first_spare|STEP]]\n");
+    fprintf(stderr, "  and [--format csv|bin|z] [--summary-every N] [--trace-every N] [--trace-alive-only] [--trace-idx LIST] [--event-window W]\n");
+    fprintf(stderr, "scenario.cfg: key=value per line (see sample_scenario.cfg)\n");
+    fprintf(stderr, "  supports seed=<uint> and num_losses=<int> for auto-generated losses\n");
+    fprintf(stderr, "losses.csv: step,idx per line (header optional, ',' or ';'); if missing/empty and num_losses>0, losses are generated with seed\n");
+    fprintf(stderr, "summary.csv (optional): per-step aggregates (alive, mean/min/max/std of v and gaps); '-' writes them to stdout\n");
+    fprintf(stderr, "trace.csv (optional): per-step dump of s,v,gaps per drone\n");
+    fprintf(stderr, "--batch: one job per manifest line: scenario=<cfg> losses=<csv> [summary=<csv>] [trace=<csv>] [key=value overrides]\n"
+    "  (values %%XX-escaped where they contain whitespace or '%%')\n");
+    fprintf(stderr, "--jobs: worker threads for --batch (default 1)\n");
+    fprintf(stderr, "--lockstep: run up to K compatible --batch jobs as one lockstep ensemble (default 1)\n");
+    fprintf(stderr, "--stream: jobs with summary=@stream write their summary as framed chunks into PATH (e.g. a pipe)\n");
+    fprintf(stderr, "--resume: continue from a snapshot; outputs cover the remaining steps only\n");
+    fprintf(stderr, "--snapshot: stop at the fork point (--snapshot-at, default first_loss) and save the state there\n");
+    fprintf(stderr, "  (batch manifests use resume=, snapshot= and snapshot_at= tokens)\n");
+    fprintf(stderr, "--format bin: write summary/trace as binary records with a JSON header (read with sim_io.py; batch token format=bin)\n");
+    fprintf(stderr, "--format z: the same records delta-coded and zlib-compressed in chunks, e.g. trace.z (batch token format=z)\n");
+    fprintf(stderr, "--summary-every/--trace-every: write every N-th step only (scenario keys summary_every, trace_every)\n");
+    fprintf(stderr, "--trace-alive-only, --trace-idx 0-9,42: restrict trace rows to alive / listed drones\n");
+    fprintf(stderr, "--event-window: also write all steps within W of a loss or spare insertion\n");
+    fprintf(stderr, "--set key=value: override a scenario key of a single run (repeatable)\n");
+    fprintf(stderr, "--print-scenario: print the finalized scenario (defaults, aliases, clamping applied) as JSON\n");
+}
+
+int main(int argc, char **argv) {
+    const char *batch_path = NULL;
+    const char *stream_path = NULL;
+    int n_threads = 1;
+    int lockstep = 1;
+    const char *resume_path = NULL;
+    const char *snapshot_path = NULL;
+    const char *snapshot_at = NULL;
+    int format = OUTPUT_CSV;
+    int profiling = 0;
+    int print_scenario = 0;
+    Profile profile;
+    memset(&profile, 0, sizeof(profile));
+    int64_t t_main = profile_clock(&profile);
+    const char *pos[4];
+    int npos = 0;
+    /* output options, applied as scenario lines after the file */
+    static const struct { const char *flag, *key; } output_flags[] = {
+        { "--summary-every", "summary_every" }, { "--trace-every", "trace_every" },
+        { "--trace-idx", "trace_idx" }, { "--event-window", "event_window" },
+    };
+    char overrides[32][160];
+    int n_overrides = 0;
+    const int max_overrides = (int)(sizeof(overrides) / sizeof(overrides[0]));
+    for (int i = 1; i < argc; i++) {
+        int flag = -1;
+        for (int k = 0; k < (int)(sizeof(output_flags) / sizeof(output_flags[0])); k++) {
+            if (strcmp(argv[i], output_flags[k].flag) == 0) flag = k;
+        }
+        int is_override = flag >= 0 || strcmp(argv[i], "--trace-alive-only") == 0 || strcmp(argv[i], "--set") == 0;
+        if (is_override && n_overrides >= max_overrides) {
+            fprintf(stderr, "Too many overrides (at most %d)\n", max_overrides);
+            return 1;
+        }
+        if (flag >= 0 && i + 1 < argc) {
+            snprintf(overrides[n_overrides++], sizeof(overrides[0]), "%s=%s", output_flags[flag].key, argv[++i]);
+            continue;
+        }
+        if (strcmp(argv[i], "--trace-alive-only") == 0) {
+            snprintf(overrides[n_overrides++], sizeof(overrides[0]), "trace_alive_only=1");
+            continue;
+        }
+        if (strcmp(argv[i], "--set") == 0 && i + 1 < argc) {
+            snprintf(overrides[n_overrides++], sizeof(overrides[0]), "%s", argv[++i]);
+            continue;
+        }
+        if (strcmp(argv[i], "--batch") == 0 && i + 1 < argc) batch_path = argv[++i];
+        else if (strcmp(argv[i], "--stream") == 0 && i + 1 < argc) stream_path = argv[++i];
+        else if (strcmp(argv[i], "--jobs") == 0 && i + 1 < argc) n_threads = atoi(argv[++i]);
+        else if (strcmp(argv[i], "--lockstep") == 0 && i + 1 < argc) lockstep = atoi(argv[++i]);
+        else if (strcmp(argv[i], "--resume") == 0 && i + 1 < argc) resume_path = argv[++i];
+        else if (strcmp(argv[i], "--snapshot") == 0 && i + 1 < argc) snapshot_path = argv[++i];
+        else if (strcmp(argv[i], "--snapshot-at") == 0 && i + 1 < argc) snapshot_at = argv[++i];
+        else if (strcmp(argv[i], "--profile") == 0) profiling = 1;
+        else if (strcmp(argv[i], "--print-scenario") == 0) print_scenario = 1;
+        else if (strcmp(argv[i], "--format") == 0 && i + 1 < argc) {
+            if (parse_output_format(argv[++i], &format) != 0) {
+                usage(argv[0]);
+                return 1;
+            }
+        }
+        else if (strncmp(argv[i], "--", 2) == 0 || npos >= 4) {
+            usage(argv[0]);
+            return 1;
+        }
+        else pos[npos++] = argv[i];
+    }
+    ForkSpec fork = { NULL, NULL, SNAPSHOT_FIRST_LOSS };
+    if (snapshot_at && (!snapshot_path || parse_snapshot_at(snapshot_at, &fork.snapshot_at) != 0)) {
+        usage(argv[0]);
+        return 1;
+    }
+    if (batch_path) {
+        if (npos != 0 || resume_path || snapshot_path || n_overrides > 0 || format != OUTPUT_CSV) {
+            usage(argv[0]);
+            return 1;
+        }
+        int rc = run_batch(batch_path, stream_path, n_threads, lockstep, profiling ? &profile : NULL);
+        if (profiling) write_profile(stderr, &profile, profile_clock(&profile) - t_main);
+        return rc;
+    }
+    if ((npos < 2 && !(print_scenario && npos == 1)) || stream_path) {
+        usage(argv[0]);
+        return 1;
+    }
+
+    Scenario s;
+    scenario_defaults(&s);
+    if (read_scenario(pos[0], &s) != 0) {
+        fprintf(stderr, "Could not read scenario file %s\n", pos[0]);
+        return 1;
+    }
+    for (int k = 0; k < n_overrides; k++) {
+        if (!apply_scenario_line(&s, overrides[k])) {
+            fprintf(stderr, "Invalid option %s\n", overrides[k]);
+            return 1;
+        }
+    }
+    finalize_scenario(&s);
+    if (print_scenario) {
+        scenario_json(stdout, &s);
+        putchar('\n');
+        return 0;
+    }
+    Loss *losses = NULL; int loss_count = 0;
+    if (load_losses(pos[1], &s, &losses, &loss_count) != 0) {
+        fprintf(stderr, "Could not read losses file %s and num_losses not set\n", pos[1]);
+        return 1;
+    }
+    Snapshot resume, snapshot;
+    memset(&snapshot, 0, sizeof(snapshot));
+    if (resume_path) {
+        char err[256];
+        if (read_snapshot(resume_path, &resume) != 0) {
+            fprintf(stderr, "Could not read snapshot file %s\n", resume_path);
+            free(losses);
+            return 1;
+        }
+        if (check_resume(&resume, &s, losses, loss_count, err, sizeof(err)) != 0) {
+            fprintf(stderr, "Cannot resume from %s: %s\n", resume_path, err);
+            snapshot_free(&resume);
+            free(losses);
+            return 1;
+        }
+        fork.resume = &resume;
+    }
+    if (snapshot_path) fork.snapshot = &snapshot;
 
     FILE *summary = NULL;
     FILE *trace = NULL;
-    if (argc >= 4) {
-        summary = fopen(argv[3], "w");
+    int summary_stdout = npos >= 3 && strcmp(pos[2], "-") == 0;
+    if (summary_stdout) {
+        summary = stdout;
+    } else if (npos >= 3) {
+        summary = fopen(pos[2], format == OUTPUT_CSV ? "w" : "wb");
         if (!summary) {
-            fprintf(stderr, "Could not open summary file %s\n", argv[3]);
+            fprintf(stderr, "Could not open summary file %s\n", pos[2]);
             return 1;
         }
     }
-    if (argc == 5) {
-        trace = fopen(argv[4], "w");
+    if (npos == 4) {
+        trace = fopen(pos[3], format == OUTPUT_CSV ? "w" : "wb");
         if (!trace) {
-            fprintf(stderr, "Could not open trace file %s\n", argv[4]);
+            fprintf(stderr, "Could not open trace file %s\n", pos[3]);
             if (summary) fclose(summary);
             return 1;
         }
     }
 
-    simulate(&s, losses, loss_count, summary, trace);
-    if (summary) fclose(summary);
+    SimOutput out = { summary, trace, NULL, NULL, 0, format, NULL, NULL };
+    RunMetrics m;
+    const Scenario *sc = &s;
+    const Loss *sl = losses;
+    simulate_ensemble(&sc, &sl, &loss_count, &out, 1, &fork, &m, profiling ? &profile : NULL);
+    if (summary_stdout) fflush(stdout);
+    else if (summary) fclose(summary);
     if (trace) fclose(trace);
+    if (profiling) write_profile(stderr, &profile, profile_clock(&profile) - t_main);
+    int rc = 0;
+    if (snapshot_path) {
+        if (write_snapshot(snapshot_path, &snapshot) != 0) {
+            fprintf(stderr, "Could not write snapshot file %s\n", snapshot_path);
+            rc = 1;
+        } else {
+            fprintf(summary_stdout ? stderr : stdout, "snapshot_step=%d\n", snapshot.step);
+        }
+        snapshot_free(&snapshot);
+    } else {
+        print_metrics(summary_stdout ? stderr : stdout, &m);
+    }
+    if (resume_path) snapshot_free(&resume);
     free(losses);
-    return 0;
+    return rc;
 }
+
+#endif /* BSIM_LIBRARY */
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Scaling benchmark for baseline_simulator.
+
+Generates synthetic scenarios over a grid of fleet size, horizon, controller
+mode and trace output, runs each cell `--repeat` times with --profile, and
+appends one row per cell to a CSV history:
+
+- wall_s: median wall time of the simulator process (incl. startup/parsing)
+- simulate_s: median simulation time, from --profile
+- us_per_drone_step: median simulate time / (drones * steps); _min: fastest trial
+- bytes_written: size of the summary + trace files of one run
+- peak_rss_kb: peak resident memory of the simulator process
+
+Cells are compared against a stored baseline (fastest trial per cell, the
+least noisy statistic); slower than baseline * (1 + --tolerance) is reported
+as a regression and makes the exit status 1. Cells simulating for less than
+--min-time are too noisy to compare and are only recorded.
+
+Typical usage:
+  python3 Code/bench_simulator.py --save-baseline        # on the reference build
+  python3 Code/bench_simulator.py                        # after a change: compare
+  python3 Code/bench_simulator.py --sizes 20,1000 --steps 3000 --modes 0 --traces off,csv,bin,z
+
+Scenarios: n_initial = n with n // 10 standby spares, 5 m of perimeter per
+drone, n // 50 + 1 losses generated from the seed (once per cell, outside the
+timed trials), resilience on. Traced cells above --max-trace-rows rows
+(n_total * steps) are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from run_cache import build_hash
+
+BASE = Path(__file__).resolve().parent
+SIM = BASE / "baseline_simulator"
+OUT_DIR = BASE / ".bench"
+HISTORY = OUT_DIR / "history.csv"
+BASELINE = OUT_DIR / "baseline.json"
+
+HISTORY_FIELDS = [
+    "timestamp",
+    "git_rev",
+    "build",
+    "host",
+    "cell",
+    "n",
+    "steps",
+    "mode",
+    "trace",
+    "trials",
+    "wall_s",
+    "wall_s_min",
+    "simulate_s",
+    "us_per_drone_step",
+    "us_per_drone_step_min",
+    "bytes_written",
+    "peak_rss_kb",
+]
+
+
+def run(cmd: list[str], *, cwd: Path | None = None) -> None:
+    subprocess.run(cmd, cwd=str(cwd) if cwd else None, check=True)
+
+
+def int_list(text: str) -> list[int]:
+    return [int(x) for x in text.split(",") if x]
+
+
+def cell_key(n: int, steps: int, mode: int, trace: str) -> str:
+    return f"n={n},steps={steps},mode={mode},trace={trace}"
+
+
+def scenario_text(n: int, steps: int, mode: int) -> str:
+    settings = {
+        "n_initial": n,
+        "n_total": n + n // 10,
+        "perimeter": 5 * n,
+        "steps": steps,
+        "controller_mode": mode,
+        "num_losses": n // 50 + 1,
+        "seed": 123,
+        "resilience": 1,
+        "min_spare_delay_steps": 15,
+        "spare_interval_min_steps": 50,
+        "spare_interval_max_steps": 200,
+        "incoming_hold_steps": 100,
+        "k_sym": 0.5,
+    }
+    return "".join(f"{k}={v}\n" for k, v in settings.items())
+
+
+def git_rev() -> str:
+    proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(BASE), capture_output=True, text=True)
+    return proc.stdout.strip() if proc.returncode == 0 else ""
+
+
+def generate_losses(tmp: Path, cfg: Path) -> Path:
+    """Write the seeded loss schedule of `cfg`, untimed: a run that stops at step 0."""
+
+    losses = tmp / "losses.csv"
+    losses.unlink(missing_ok=True)  # else the simulator replays the previous cell's schedule
+    snapshot = tmp / "losses.snap"
+    proc = subprocess.run(
+        [str(SIM), str(cfg), str(losses), "--snapshot", str(snapshot), "--snapshot-at", "0"],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0 or not losses.exists():
+        raise RuntimeError(f"{cfg}: loss generation failed: {proc.stderr.strip()}")
+    snapshot.unlink(missing_ok=True)
+    return losses
+
+
+def run_cell(tmp: Path, n: int, steps: int, mode: int, trace: str, repeat: int) -> dict[str, object]:
+    """Run one grid cell `repeat` times; returns its history fields."""
+
+    cfg = tmp / "bench.cfg"
+    cfg.write_text(scenario_text(n, steps, mode), encoding="utf-8")
+    losses = generate_losses(tmp, cfg)
+    outputs = [] if trace == "off" else [tmp / "summary.out", tmp / "trace.out"]
+    cmd = [str(SIM), str(cfg), str(losses), *map(str, outputs), "--profile"]
+    if trace != "off":
+        cmd += ["--format", trace]
+
+    walls: list[float] = []
+    sims: list[float] = []
+    per_step: list[float] = []
+    written = peak = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        walls.append(time.perf_counter() - t0)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{cell_key(n, steps, mode, trace)}: simulator failed: {proc.stderr.strip()}")
+        profile = json.loads(proc.stderr.strip().splitlines()[-1])
+        sims.append(profile["simulate_ns"] / 1e9)
+        per_step.append(profile["simulate_ns"] / 1000.0 / max(1, profile["drone_steps"]))
+        peak = max(peak, int(profile["peak_rss_kb"]))
+        written = sum(p.stat().st_size for p in outputs)
+        for p in outputs:
+            p.unlink()
+    return {
+        "cell": cell_key(n, steps, mode, trace),
+        "n": n,
+        "steps": steps,
+        "mode": mode,
+        "trace": trace,
+        "trials": repeat,
+        "wall_s": round(statistics.median(walls), 6),
+        "wall_s_min": round(min(walls), 6),
+        "simulate_s": round(statistics.median(sims), 6),
+        "us_per_drone_step": round(statistics.median(per_step), 6),
+        "us_per_drone_step_min": round(min(per_step), 6),
+        "bytes_written": written,
+        "peak_rss_kb": peak,
+    }
+
+
+def append_history(rows: list[dict[str, object]], path: Path) -> None:
+    new = not path.exists()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=HISTORY_FIELDS)
+        if new:
+            w.writeheader()
+        w.writerows(rows)
+
+
+def regressions(rows: list[dict[str, object]], baseline: dict[str, float], tolerance: float, min_time: float) -> list[str]:
+    out: list[str] = []
+    for row in rows:
+        ref = baseline.get(str(row["cell"]))
+        cur = float(row["us_per_drone_step_min"])  # type: ignore[arg-type]
+        if float(row["simulate_s"]) < min_time:  # type: ignore[arg-type]
+            continue
+        if ref and cur > ref * (1.0 + tolerance):
+            out.append(f"{row['cell']}: {cur:.4f} us/drone/step vs baseline {ref:.4f} (+{(cur / ref - 1) * 100:.0f}%)")
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Benchmark baseline_simulator across fleet size and horizon")
+    ap.add_argument("--sizes", type=int_list, default=[20, 100, 1000, 10000, 100000], help="fleet sizes n (comma-separated)")
+    ap.add_argument("--steps", type=int_list, default=[1000], help="horizons (comma-separated)")
+    ap.add_argument("--modes", type=int_list, default=[0, 1, 2, 3], help="controller modes (comma-separated)")
+    ap.add_argument("--traces", default="off,bin", help="trace outputs: off, csv, bin and/or z (comma-separated)")
+    ap.add_argument("--repeat", type=int, default=3, help="trials per cell (median is recorded)")
+    ap.add_argument("--max-trace-rows", type=float, default=2e7, help="skip traced cells with more n_total*steps rows")
+    ap.add_argument("--history", type=Path, default=HISTORY, help="CSV history to append to")
+    ap.add_argument("--baseline", type=Path, default=BASELINE, help="baseline JSON to compare against")
+    ap.add_argument("--save-baseline", action="store_true", help="store this run's results as the baseline")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown vs baseline (0.15 = 15%%)")
+    ap.add_argument("--min-time", type=float, default=0.05, help="only compare cells simulating for at least this many seconds")
+    ap.add_argument("--no-build", action="store_true", help="benchmark the existing binary instead of running make first")
+    ap.add_argument("--build", action="store_true", help=argparse.SUPPRESS)  # make now runs by default; kept for old command lines
+    args = ap.parse_args()
+
+    traces = [t for t in args.traces.split(",") if t]
+    if any(t not in ("off", "csv", "bin", "z") for t in traces):
+        ap.error("--traces takes off, csv, bin and z")
+    if not args.no_build:
+        run(["make", "-s"], cwd=BASE)
+
+    stamp = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_rev": git_rev(),
+        "build": build_hash(SIM)[:12],
+        "host": platform.node(),
+    }
+    rows: list[dict[str, object]] = []
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp_dir:
+        tmp = Path(tmp_dir)
+        for n in args.sizes:
+            for steps in args.steps:
+                for mode in args.modes:
+                    for trace in traces:
+                        key = cell_key(n, steps, mode, trace)
+                        if trace != "off" and (n + n // 10) * steps > args.max_trace_rows:
+                            print(f"{key}: skipped (trace larger than --max-trace-rows)")
+                            continue
+                        row = dict(stamp, **run_cell(tmp, n, steps, mode, trace, args.repeat))
+                        rows.append(row)
+                        print(
+                            f"{key}: {row['us_per_drone_step']:.4f} us/drone/step, wall {row['wall_s']:.3f} s, "
+                            f"{row['bytes_written']} bytes, peak {row['peak_rss_kb']} kB"
+                        )
+
+    append_history(rows, args.history)
+    print(f"Appended {len(rows)} cells to {args.history}")
+
+    status = 0
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        slow = regressions(rows, baseline["cells"], args.tolerance, args.min_time)
+        for line in slow:
+            print(f"REGRESSION {line}")
+        print(f"Compared against {args.baseline} (build {baseline.get('build', '?')}): {len(slow)} regressions")
+        status = 1 if slow else 0
+    if args.save_baseline:
+        cells = {str(r["cell"]): float(r["us_per_drone_step_min"]) for r in rows}  # type: ignore[arg-type]
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(dict(stamp, cells=cells), indent=2) + "\n", encoding="utf-8")
+        print(f"Saved baseline: {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -5,85 +5,106 @@ Reads simulator summary CSV (step;mean_v;std_v;mean_gap;std_gap) and plots:
 - mean_v with ±1σ band
 - mean_gap with ±1σ band
 Also overlays loss (red dashed) and spare insertions (green) if trace is provided.
+
+Each series is reduced to the figure's pixel width (sim_downsample: min/max
+per pixel column, or --downsample lttb; the band to its per-column
+envelope), so long runs keep their peaks. Long ranges are drawn from the
+summary's min/max pyramid (sim_pyramid.py) at the level matching the range
+and figure width, so an overview or a --start/--stop zoom on one loss event
+reads O(pixels) records.
+
+run_all.py calls render() through the render cache (Code/render_cache.py)
+instead of this command line.
 """
 
 from __future__ import annotations
 
 import argparse
-import csv
+import sys
 from pathlib import Path
 
 import matplotlib.pyplot as plt
+import numpy as np
+
+CODE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CODE))
+
+from sim_downsample import METHODS, band_envelope, downsample  # noqa: E402
+from sim_io import load_loss_steps, load_summary, spare_steps  # noqa: E402
+from sim_pyramid import minmax_band, minmax_line, view  # noqa: E402
+
+FIG_SIZE = (9, 3.6)
+DPI = 150
+WIDTH_PX = int(FIG_SIZE[0] * DPI)
 
+# figure -> (mean column, std column, color, legend label, y label)
+FIGURES = {
+    "speed": ("mean_v", "std_v", "tab:blue", "mean speed", "speed"),
+    "gap": ("mean_gap", "std_gap", "tab:orange", "mean gap", "gap"),
+}
 
-def load_summary(path: Path) -> list[dict[str, float | int]]:
-    rows: list[dict[str, float | int]] = []
-    with path.open() as f:
-        r = csv.DictReader(f, delimiter=";")
-        for row in r:
-            rows.append(
-                {
-                    "step": int(row["step"]),
-                    "mean_v": float(row["mean_v"]),
-                    "std_v": float(row["std_v"]),
-                    "mean_gap": float(row["mean_gap"]),
-                    "std_gap": float(row["std_gap"]),
-                }
-            )
-    return rows
-
-
-def load_loss_steps(path: Path) -> list[int]:
-    if not path.exists():
-        return []
-    steps: list[int] = []
-    with path.open() as f:
-        next(f, None)
-        for line in f:
-            parts = line.strip().replace(";", ",").split(",")
-            if parts and parts[0].isdigit():
-                steps.append(int(parts[0]))
-    return sorted(steps)
-
-
-def load_spare_steps(trace_path: Path) -> list[int]:
-    if not trace_path.exists():
-        return []
-    prev_alive: dict[int, int] = {}
-    spare_steps: set[int] = set()
-    with trace_path.open() as f:
-        next(f, None)
-        for line in f:
-            parts = line.strip().split(";")
-            if len(parts) < 3:
-                continue
-            try:
-                step = int(parts[0])
-                idx = int(parts[1])
-                alive = int(parts[2])
-            except ValueError:
-                continue
-            prev = prev_alive.get(idx)
-            if prev is not None and prev == 0 and alive == 1:
-                spare_steps.add(step)
-            prev_alive[idx] = alive
-    return sorted(spare_steps)
-
-
-def plot_band(ax, x: list[int], y: list[float], s: list[float], *, color: str, label: str):
-    lower = [m - st for m, st in zip(y, s)]
-    upper = [m + st for m, st in zip(y, s)]
+
+def plot_band(ax, data: np.ndarray | tuple[np.ndarray, int], mean: str, std: str, *, color: str, label: str, method: str):
+    """Draw from summary rows, or from (records, block) of a pyramid level (sim_pyramid.view())."""
+
+    if isinstance(data, tuple):
+        records, block = data
+        x, y = minmax_line(records, mean, block, WIDTH_PX)
+        band = minmax_band(records, mean, std, block, WIDTH_PX)
+    else:
+        line = downsample(data, [data[mean]], WIDTH_PX, method=method)
+        x, y = line["step"], line[mean]
+        band = band_envelope(data["step"], data[mean] - data[std], data[mean] + data[std], WIDTH_PX)
     ax.plot(x, y, color=color, linewidth=1.8, label=label)
-    ax.fill_between(x, lower, upper, color=color, alpha=0.20, linewidth=0, label="±1σ")
+    ax.fill_between(*band, color=color, alpha=0.20, linewidth=0, label="±1σ")
 
 
-def add_markers(ax, loss_steps: list[int], spare_steps: list[int]):
+def add_markers(ax, loss_steps: np.ndarray, spares: np.ndarray):
     for s in loss_steps:
         ax.axvline(s, color="red", linestyle="--", linewidth=1.6, alpha=0.85)
-    for s in spare_steps:
+    for s in spares:
         ax.axvline(s, color="darkgreen", linestyle="-", linewidth=1.4, alpha=0.85)
 
 
+def render(
+    name: str,
+    summary: Path,
+    trace: Path,
+    losses: Path,
+    outdir: Path,
+    method: str = "minmax",
+    start: int | None = None,
+    stop: int | None = None,
+) -> list[Path]:
+    """Write <outdir>/<name>_speed.png and <name>_gap.png for steps [start, stop); returns their paths."""
+
+    data = view(summary, WIDTH_PX, start=start, stop=stop, source="summary") if method == "minmax" else None
+    if data is None:
+        data = load_summary(summary, ["step", "mean_v", "std_v", "mean_gap", "std_gap"], start=start, stop=stop)
+
+    loss_steps = load_loss_steps(losses)
+    spares = spare_steps(trace)
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    written: list[Path] = []
+    for metric, (mean, std, color, label, ylabel) in FIGURES.items():
+        fig, ax = plt.subplots(figsize=FIG_SIZE, dpi=DPI)
+        plot_band(ax, data, mean, std, color=color, label=label, method=method)
+        add_markers(ax, loss_steps, spares)
+        if start is not None or stop is not None:
+            ax.set_xlim(start, stop)
+        ax.set_xlabel("step")
+        ax.set_ylabel(ylabel)
+        ax.set_title(f"{name} — {metric}")
+        ax.legend(loc="best")
+        fig.tight_layout()
+        out = outdir / f"{name}_{metric}.png"
+        fig.savefig(out)
+        plt.close(fig)
+        written.append(out)
+    return written
+
+
 def main() -> int:
     ap = argparse.ArgumentParser()
     ap.add_argument("--name", required=True)
@@ -91,53 +112,12 @@ def main() -> int:
     ap.add_argument("--trace", type=Path, required=True)
     ap.add_argument("--losses", type=Path, required=True)
     ap.add_argument("--outdir", type=Path, required=True)
+    ap.add_argument("--downsample", choices=METHODS, default="minmax", help="how series are reduced to the figure width (default: minmax)")
+    ap.add_argument("--start", type=int, default=None, help="first step to plot (default: the first)")
+    ap.add_argument("--stop", type=int, default=None, help="plot steps before this one (default: all)")
     args = ap.parse_args()
 
-    rows = load_summary(args.summary)
-    x = [int(r["step"]) for r in rows]
-
-    loss_steps = load_loss_steps(args.losses)
-    spare_steps = load_spare_steps(args.trace)
-
-    # speed
-    fig, ax = plt.subplots(figsize=(9, 3.6), dpi=150)
-    plot_band(
-        ax,
-        x,
-        [float(r["mean_v"]) for r in rows],
-        [float(r["std_v"]) for r in rows],
-        color="tab:blue",
-        label="mean speed",
-    )
-    add_markers(ax, loss_steps, spare_steps)
-    ax.set_xlabel("step")
-    ax.set_ylabel("speed")
-    ax.set_title(f"{args.name} — speed")
-    ax.legend(loc="best")
-    fig.tight_layout()
-    args.outdir.mkdir(parents=True, exist_ok=True)
-    fig.savefig(args.outdir / f"{args.name}_speed.png")
-    plt.close(fig)
-
-    # gap
-    fig, ax = plt.subplots(figsize=(9, 3.6), dpi=150)
-    plot_band(
-        ax,
-        x,
-        [float(r["mean_gap"]) for r in rows],
-        [float(r["std_gap"]) for r in rows],
-        color="tab:orange",
-        label="mean gap",
-    )
-    add_markers(ax, loss_steps, spare_steps)
-    ax.set_xlabel("step")
-    ax.set_ylabel("gap")
-    ax.set_title(f"{args.name} — gap")
-    ax.legend(loc="best")
-    fig.tight_layout()
-    fig.savefig(args.outdir / f"{args.name}_gap.png")
-    plt.close(fig)
-
+    render(args.name, args.summary, args.trace, args.losses, args.outdir, args.downsample, args.start, args.stop)
     return 0
 
 
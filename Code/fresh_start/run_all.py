@@ -5,6 +5,21 @@ Runs a curated set of scenarios into fresh_start/runs/, then generates:
 - per-run time-series PNGs (speed and gap)
 - a single metrics.csv summary
 
+Simulations go through the content-addressed run cache (Code/run_cache.py):
+a run is re-simulated only when its scenario, the loss schedule or the
+simulator build changed since it was cached. All misses are submitted to one
+simulator process in batch mode; the Variant B sweep is expressed as scenario
+overrides rather than temporary .cfg files, and runs that only differ after
+their first loss or spare insertion share the simulated prefix (sim_fork.py).
+Every run is recorded in the run catalog (Code/run_catalog.py) under the
+experiment "fresh_start".
+
+Figures go through the render cache (Code/render_cache.py): a run's PNGs
+are re-rendered only when its summary, trace, the loss schedule or the
+plotting code changed, on a pool of --jobs processes that each import
+matplotlib once. With nothing changed, a full pass renders nothing and
+takes well under a second.
+
 This intentionally does not touch the legacy Code/*.png pipeline.
 """
 
@@ -12,12 +27,26 @@ from __future__ import annotations
 
 import argparse
 import csv
+import os
 import subprocess
+import sys
+from contextlib import nullcontext
 from dataclasses import dataclass
 from pathlib import Path
 
 BASE = Path(__file__).resolve().parent
 CODE = BASE.parent
+sys.path.insert(0, str(CODE))
+
+from run_cache import DEFAULT_MAX_MB, RunCache, run_cached_batch  # noqa: E402
+from render_cache import RenderCache, RenderJob, render_jobs  # noqa: E402
+from run_catalog import WINDOW_COLUMNS, RunCatalog  # noqa: E402
+from sim_batch import BatchJob, run_batch  # noqa: E402
+from sim_fork import run_forked  # noqa: E402
+from sim_io import load_loss_steps  # noqa: E402
+from sim_windows import phase_windows, summarize_files  # noqa: E402
+from summarize_metrics import write_metrics  # noqa: E402
+
 SIM = CODE / "baseline_simulator"
 LOSSES = CODE / "losses_seeded.csv"
 
@@ -31,6 +60,7 @@ AN_DIR = BASE / "analysis"
 class Experiment:
     name: str
     scenario: Path
+    overrides: tuple[tuple[str, str], ...] = ()
 
 
 EXPERIMENTS: list[Experiment] = [
@@ -55,115 +85,120 @@ def ensure_dirs() -> None:
     AN_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def regen_one(name: str, scenario_path: Path, *, tag: str = "") -> tuple[Path, Path]:
+def run_paths(name: str, *, tag: str = "") -> tuple[Path, Path]:
     out_dir = RUNS_DIR / name
     out_dir.mkdir(parents=True, exist_ok=True)
-    summary = out_dir / f"summary{tag}.csv"
-    trace = out_dir / f"trace{tag}.csv"
-    run([str(SIM), str(scenario_path), str(LOSSES), str(summary), str(trace)], cwd=CODE)
-    return summary, trace
-
-
-def write_variant_b_scenarios(tmp_dir: Path) -> list[Experiment]:
-    """Create temporary per-hold scenarios (minimal, deterministic)."""
-
-    template = (SCEN_DIR / "baseline_loss_delayed_insertion.cfg").read_text(encoding="utf-8")
-    experiments: list[Experiment] = []
-    for hold in VARIANT_B_HOLDS:
-        name = f"variantB_hold{hold}"
-        cfg = tmp_dir / f"{name}.cfg"
-        cfg.write_text(
-            template
-            + "\n# --- Variant B override ---\n"
-            + f"incoming_hold_steps={hold}\n"
-            + "incoming_v=1.0\n",
-            encoding="utf-8",
+    return out_dir / f"summary{tag}.csv", out_dir / f"trace{tag}.csv"
+
+
+def regen_all(
+    experiments: list[Experiment],
+    *,
+    cache: RunCache | None,
+    force: bool,
+    threads: int,
+    fork: bool = True,
+    catalog: RunCatalog | None = None,
+) -> list[tuple[str, Path, Path]]:
+    """Simulate (or serve from cache) every experiment in a single batch, and catalog the runs."""
+
+    runs = [(exp.name, *run_paths(exp.name)) for exp in experiments]
+    jobs = [
+        BatchJob(exp.scenario, LOSSES, summary=summary, trace=trace, overrides=exp.overrides)
+        for exp, (_, summary, trace) in zip(experiments, runs)
+    ]
+    runner = run_forked if fork else run_batch
+    hits = run_cached_batch(cache, SIM, jobs, force=force, cwd=CODE, threads=threads, runner=runner)
+    for (name, _, _), hit in zip(runs, hits):
+        print(f"{name}: {'cached' if hit else 'simulated'}")
+    if catalog is not None:
+        catalog.record_jobs("fresh_start", [name for name, _, _ in runs], jobs, simulator=SIM, cwd=CODE)
+    return runs
+
+
+def variant_b_experiments() -> list[Experiment]:
+    """Per-hold variants of the delayed-insertion baseline, as scenario overrides."""
+
+    template = SCEN_DIR / "baseline_loss_delayed_insertion.cfg"
+    return [
+        Experiment(
+            f"variantB_hold{hold}",
+            template,
+            overrides=(("incoming_hold_steps", str(hold)), ("incoming_v", "1.0")),
         )
-        experiments.append(Experiment(name, cfg))
-    return experiments
-
-
-def load_loss_steps(path: Path) -> list[int]:
-    if not path.exists():
-        return []
-    steps: list[int] = []
-    with path.open() as f:
-        next(f, None)
-        for line in f:
-            parts = line.strip().replace(";", ",").split(",")
-            if parts and parts[0].isdigit():
-                steps.append(int(parts[0]))
-    return sorted(steps)
-
-
-def plot_timeseries(exp_name: str, summary: Path, trace: Path) -> None:
-    run(
-        [
-            "python3",
-            str(BASE / "plot_timeseries.py"),
-            "--name",
-            exp_name,
-            "--summary",
-            str(summary),
-            "--trace",
-            str(trace),
-            "--losses",
-            str(LOSSES),
-            "--outdir",
-            str(FIG_DIR),
-        ],
-        cwd=CODE,
-    )
+        for hold in VARIANT_B_HOLDS
+    ]
+
+
+def figure_jobs(runs: list[tuple[str, Path, Path]]) -> list[RenderJob]:
+    """One plot_timeseries.render() job (speed and gap PNGs) per run."""
+
+    return [
+        RenderJob(
+            "plot_timeseries:render",
+            (name, summary, trace, LOSSES, FIG_DIR),
+            inputs=(summary, trace, LOSSES),
+            outputs=(FIG_DIR / f"{name}_speed.png", FIG_DIR / f"{name}_gap.png"),
+        )
+        for name, summary, trace in runs
+    ]
 
 
 def analyze_metrics(all_runs: list[tuple[str, Path]]) -> None:
-    """Write a compact table with end-of-run metrics."""
+    """Write a compact table with end-of-run metrics (summarize_metrics.py, in this process)."""
 
     out_csv = AN_DIR / "metrics.csv"
-    run(["python3", str(BASE / "summarize_metrics.py"), "--out", str(out_csv)] + [str(p) for _, p in all_runs], cwd=CODE)
+    loss_steps = load_loss_steps(LOSSES)
+    first_loss = int(loss_steps[0]) if len(loss_steps) else 0
+    summaries = [summary for _, summary in all_runs]
+    results = summarize_files(summaries, WINDOW_COLUMNS, [phase_windows], loss_steps, jobs=1)
+    write_metrics(out_csv, [(name, str(summary), metrics) for (name, summary), metrics in zip(all_runs, results)], first_loss)
+    print(f"Wrote {out_csv}")
 
 
 def main() -> int:
     ap = argparse.ArgumentParser()
-    ap.add_argument("--regen", action="store_true", help="Re-run all simulations and re-generate all PNGs/CSVs")
-    ap.add_argument("--build", action="store_true", help="Run make first")
+    ap.add_argument("--regen", action="store_true", help="Re-run all simulations (bypassing the run cache) and re-generate all PNGs/CSVs")
+    ap.add_argument("--no-build", action="store_true", help="Use the existing simulator binary instead of running make first")
+    ap.add_argument("--build", action="store_true", help=argparse.SUPPRESS)  # make now runs by default; kept for old command lines
+    ap.add_argument("--no-cache", action="store_true", help="Always simulate and render, without reading or filling the run and render caches")
+    ap.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_MB, help="Run cache size bound (LRU eviction)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Simulator worker threads for cache misses and figure render processes")
+    ap.add_argument("--no-fork", action="store_true", help="Simulate every run from step 0 instead of sharing common prefixes")
+    ap.add_argument("--no-catalog", action="store_true", help="Do not record the runs in the run catalog (run_catalog.sqlite)")
     args = ap.parse_args()
 
     ensure_dirs()
 
-    if args.build or args.regen:
-        run(["make"], cwd=CODE)
+    if not args.no_build:
+        run(["make", "-s"], cwd=CODE)  # a no-op when the binary is newer than its source
 
     if not SIM.exists():
-        raise FileNotFoundError(f"Missing {SIM}. Run with --build.")
+        raise FileNotFoundError(f"Missing {SIM}. Run without --no-build.")
     if not LOSSES.exists():
         raise FileNotFoundError(f"Missing {LOSSES}.")
 
-    all_runs: list[tuple[str, Path]] = []
-
-    # Core experiments
-    for exp in EXPERIMENTS:
-        out_dir = RUNS_DIR / exp.name
-        summary = out_dir / "summary.csv"
-        trace = out_dir / "trace.csv"
-        if args.regen or (not summary.exists()) or (not trace.exists()):
-            summary, trace = regen_one(exp.name, exp.scenario)
-        all_runs.append((exp.name, summary))
-        plot_timeseries(exp.name, summary, trace)
-
-    # Variant B sweep
-    tmp_dir = RUNS_DIR / "_tmp_scenarios"
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-    for exp in write_variant_b_scenarios(tmp_dir):
-        out_dir = RUNS_DIR / exp.name
-        summary = out_dir / "summary.csv"
-        trace = out_dir / "trace.csv"
-        if args.regen or (not summary.exists()) or (not trace.exists()):
-            summary, trace = regen_one(exp.name, exp.scenario)
-        all_runs.append((exp.name, summary))
-        plot_timeseries(exp.name, summary, trace)
-
-    analyze_metrics(all_runs)
+    cache = None if args.no_cache else RunCache(max_bytes=args.cache_max_mb << 20)
+
+    # Core experiments + Variant B sweep
+    with RunCatalog() if not args.no_catalog else nullcontext() as catalog:
+        runs = regen_all(
+            EXPERIMENTS + variant_b_experiments(),
+            cache=cache,
+            force=args.regen,
+            threads=args.jobs,
+            fork=not args.no_fork,
+            catalog=catalog,
+        )
+    rendered = render_jobs(
+        figure_jobs(runs),
+        cache=None if args.no_cache else RenderCache(),
+        workers=args.jobs,
+        force=args.regen,
+    )
+    print(f"Figures: {len(rendered)} of {len(runs)} runs re-rendered")
+
+    analyze_metrics([(name, summary) for name, summary, _ in runs])
 
     print("Fresh-start outputs:")
     print(f"  figures: {FIG_DIR}")
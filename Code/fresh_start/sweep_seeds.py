@@ -8,39 +8,156 @@ keeping the *loss schedule file* fixed (losses_seeded.csv).
 For large sweeps you typically want to:
 - keep outputs compact (just metrics.csv per seed)
 - aggregate later (mean/CI or boxplots)
+
+The whole sweep is submitted to one simulator process in batch mode, with the
+seed passed as a scenario override (no per-seed .cfg files); seeds run on
+--jobs worker threads (default: all cores). Seeds only matter from the first
+loss on, so that common prefix is simulated once and forked per seed
+(sim_fork.py). A failing seed is reported and left out of metrics.csv; it
+does not abort the rest of the sweep. Completed seeds are recorded in the run
+catalog (Code/run_catalog.py) as experiment "seed_sweep/<scenario stem>".
+
+With --stream no summary or trace files are written at all: the simulator
+streams each seed's summary rows through a pipe into running window
+accumulators (sim_windows.StreamWindows), and only metrics.csv is kept. Such
+seeds have no files to record in the run catalog.
+
+Sweeps are resumable. <sweep dir>/manifest.jsonl is an append-only log with
+one line per completed seed: the seed, its config hash (run_cache.run_key():
+scenario, seed, losses, simulator build and outputs) and the size/mtime/
+SHA-256 of its outputs (or, with --stream, its metrics). Outputs are written
+under .partial/ and renamed into place before their line is appended, so an
+interrupted sweep leaves only complete, recorded seeds behind. A rerun skips
+the seeds whose config hash matches and whose outputs are intact, re-runs
+missing, failed, changed or corrupted ones, and a larger --seeds or another
+--start only simulates the new seeds. metrics.csv always covers the requested
+range. --fresh discards the manifest and re-runs every seed.
 """
 
 from __future__ import annotations
 
 import argparse
+import hashlib
+import json
+import os
 import shutil
 import subprocess
+import sys
+import threading
+import time
 from pathlib import Path
+from typing import Any
 
 BASE = Path(__file__).resolve().parent
 CODE = BASE.parent
+sys.path.insert(0, str(CODE))
+
+from run_cache import run_key  # noqa: E402
+from run_catalog import WINDOW_COLUMNS, RunCatalog  # noqa: E402
+from sim_batch import STREAM, BatchJob, BatchResult, run_batch  # noqa: E402
+from sim_fork import run_forked  # noqa: E402
+from sim_io import load_loss_steps  # noqa: E402
+from sim_windows import StreamWindows, phase_windows  # noqa: E402
+from summarize_metrics import write_metrics  # noqa: E402
+
 SIM = CODE / "baseline_simulator"
 LOSSES = CODE / "losses_seeded.csv"
 SCEN_DIR = BASE / "scenarios"
 OUT_DIR = BASE / "analysis" / "seed_sweeps"
+MANIFEST = "manifest.jsonl"
+PARTIAL = ".partial"
 
 
 def run(cmd: list[str], *, cwd: Path | None = None) -> None:
     subprocess.run(cmd, cwd=str(cwd) if cwd else None, check=True)
 
 
-def patch_seed(cfg_text: str, seed: int) -> str:
-    lines = []
-    replaced = False
-    for line in cfg_text.splitlines():
-        if line.strip().startswith("seed="):
-            lines.append(f"seed={seed}")
-            replaced = True
-        else:
-            lines.append(line)
-    if not replaced:
-        lines.append(f"seed={seed}")
-    return "\n".join(lines) + "\n"
+def fmt_duration(seconds: float) -> str:
+    seconds = max(0, int(round(seconds)))
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h:d}:{m:02d}:{s:02d}" if h else f"{m:d}:{s:02d}"
+
+
+def report_progress(done: int, total: int, failed: int, t0: float) -> None:
+    elapsed = time.monotonic() - t0
+    eta = elapsed / done * (total - done) if done else 0.0
+    sys.stderr.write(
+        f"\r[{done}/{total}] failed={failed} elapsed={fmt_duration(elapsed)} eta={fmt_duration(eta)}"
+    )
+    if done == total:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def file_identity(path: Path, *, digest: bool = True) -> dict[str, Any]:
+    st = path.stat()
+    identity: dict[str, Any] = {"name": path.name, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if digest:
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        identity["sha256"] = h.hexdigest()
+    return identity
+
+
+def intact(path: Path, recorded: dict[str, Any]) -> bool:
+    """Whether `path` still holds the recorded output (hashed only if its size/mtime changed)."""
+
+    if not path.exists():
+        return False
+    now = file_identity(path, digest=False)
+    if now["size"] != recorded["size"]:
+        return False
+    return now["mtime_ns"] == recorded["mtime_ns"] or file_identity(path)["sha256"] == recorded["sha256"]
+
+
+class SweepManifest:
+    """Append-only log of the completed seeds of a sweep directory.
+
+    Each line is one JSON entry, appended with a single O_APPEND write and
+    fsync'ed. Later entries of a seed win; a torn last line (a crash while
+    appending) is ignored and terminated before the next append.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[int, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        torn = False
+        if path.exists():
+            data = path.read_bytes()
+            torn = bool(data) and not data.endswith(b"\n")
+            for line in data.splitlines():
+                try:
+                    entry = json.loads(line)
+                    self.entries[int(entry["seed"])] = entry
+                except (ValueError, KeyError, TypeError):
+                    continue
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if torn:
+            os.write(self._fd, b"\n")
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def completed(self, seed: int, config: str, sweep_dir: Path) -> dict[str, Any] | None:
+        """The entry of `seed` if it was completed with `config` and its outputs are intact."""
+
+        entry = self.entries.get(seed)
+        if entry is None or entry.get("config") != config:
+            return None
+        if not all(intact(sweep_dir / out["name"], out) for out in entry.get("outputs", {}).values()):
+            return None
+        return entry
+
+    def add(self, entry: dict[str, Any]) -> None:
+        line = (json.dumps(entry, sort_keys=True) + "\n").encode()
+        with self._lock:
+            os.write(self._fd, line)
+            os.fsync(self._fd)
+            self.entries[int(entry["seed"])] = entry
 
 
 def main() -> int:
@@ -48,38 +165,144 @@ def main() -> int:
     ap.add_argument("--scenario", required=True, help="scenario filename in fresh_start/scenarios (e.g., baseline_loss_delayed_insertion.cfg)")
     ap.add_argument("--seeds", type=int, default=100)
     ap.add_argument("--start", type=int, default=1)
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="simulator worker threads (default: all cores)")
+    ap.add_argument("--no-fork", action="store_true", help="simulate every seed from step 0 instead of sharing the pre-loss prefix")
+    ap.add_argument("--no-catalog", action="store_true", help="do not record the seeds in the run catalog")
+    ap.add_argument("--fresh", action="store_true", help="discard the sweep manifest and re-run every seed")
+    ap.add_argument("--no-build", action="store_true", help="use the existing simulator binary instead of running make first")
+    ap.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream summaries into in-process metrics instead of writing summary/trace files (no catalog)",
+    )
     args = ap.parse_args()
 
     cfg_path = SCEN_DIR / args.scenario
     if not cfg_path.exists():
         raise FileNotFoundError(cfg_path)
-    if not SIM.exists():
-        run(["make"], cwd=CODE)
+    if not args.no_build:
+        run(["make", "-s"], cwd=CODE)  # a no-op when the binary is newer than its source
     if not LOSSES.exists():
         raise FileNotFoundError(LOSSES)
 
     OUT_DIR.mkdir(parents=True, exist_ok=True)
     sweep_dir = OUT_DIR / cfg_path.stem
-    if sweep_dir.exists():
-        shutil.rmtree(sweep_dir)
-    sweep_dir.mkdir(parents=True, exist_ok=True)
+    partial = sweep_dir / PARTIAL
+    if partial.exists():
+        shutil.rmtree(partial)  # outputs of seeds that never completed
+    partial.mkdir(parents=True, exist_ok=True)
+    if args.fresh:
+        (sweep_dir / MANIFEST).unlink(missing_ok=True)
+    manifest = SweepManifest(sweep_dir / MANIFEST)
+
+    def seed_job(seed: int, out_dir: Path) -> BatchJob:
+        if args.stream:
+            return BatchJob(cfg_path, LOSSES, summary=STREAM, format="bin", overrides=(("seed", str(seed)),))
+        return BatchJob(
+            cfg_path,
+            LOSSES,
+            summary=out_dir / f"summary_seed_{seed}.csv",
+            trace=out_dir / f"trace_seed_{seed}.csv",
+            overrides=(("seed", str(seed)),),
+        )
+
+    requested = list(range(args.start, args.start + args.seeds))
+    configs: dict[int, str] = {}
+    done: dict[int, dict[str, Any]] = {}
+    for seed in requested:
+        job = seed_job(seed, sweep_dir)
+        configs[seed] = run_key(cfg_path, LOSSES, SIM, outputs=tuple(job.outputs()), overrides=job.overrides, fmt=job.format)
+        entry = manifest.completed(seed, configs[seed], sweep_dir)
+        if entry is not None:
+            done[seed] = entry
+    seeds = [seed for seed in requested if seed not in done]
+    jobs = [seed_job(seed, partial) for seed in seeds]
+    if done:
+        print(f"{len(done)} of {len(requested)} seeds already complete, running {len(seeds)}")
+
+    loss_steps = load_loss_steps(LOSSES)
+    windows = StreamWindows(WINDOW_COLUMNS, [phase_windows], loss_steps) if args.stream else None
+    completed: list[int] = []
+    failures: dict[int, str] = {}
+    ok_jobs: set[int] = set()
+
+    def complete(k: int) -> None:
+        """Publish job k's outputs and log it, once it succeeded (and its stream ended)."""
+
+        seed = seeds[k]
+        entry: dict[str, Any] = {"seed": seed, "config": configs[seed]}
+        if windows is not None:
+            if seed in done or k not in ok_jobs or windows.results.get(k) is None:
+                return
+            entry["metrics"] = windows.results[k]
+        else:
+            entry["outputs"] = {}
+            for name, src in jobs[k].outputs().items():
+                dst = sweep_dir / src.name
+                os.replace(src, dst)
+                entry["outputs"][name] = file_identity(dst)
+        manifest.add(entry)
+        done[seed] = entry
+        completed.append(seed)
+
+    if windows is not None:
+        stream_end = windows.demux.on_end
+        lock = threading.Lock()
+
+        def on_stream_end(k: int) -> None:
+            stream_end(k)
+            with lock:
+                complete(k)
+
+        windows.demux.on_end = on_stream_end
+
+    t0 = time.monotonic()
+    finished: list[int] = []
+
+    def on_result(res: BatchResult) -> None:
+        finished.append(res.job)
+        if res.ok:
+            if windows is not None:
+                with lock:
+                    ok_jobs.add(res.job)
+                    complete(res.job)
+            else:
+                complete(res.job)
+        else:
+            failures[seeds[res.job]] = res.message
+        report_progress(len(finished), len(jobs), len(failures), t0)
 
-    cfg_template = cfg_path.read_text(encoding="utf-8")
+    runner = run_batch if args.no_fork else run_forked
+    runner(jobs, threads=args.jobs, cwd=CODE, on_result=on_result, stream=windows.demux if windows else None)
+    manifest.close()
+    shutil.rmtree(partial)
 
-    summaries: list[Path] = []
+    for seed in sorted(failures):
+        print(f"seed {seed} failed: {failures[seed]}", file=sys.stderr)
+    if not done:
+        print("No seed completed successfully.", file=sys.stderr)
+        return 1
 
-    for seed in range(args.start, args.start + args.seeds):
-        tmp_cfg = sweep_dir / f"seed_{seed}.cfg"
-        tmp_cfg.write_text(patch_seed(cfg_template, seed), encoding="utf-8")
-        summary = sweep_dir / f"summary_seed_{seed}.csv"
-        trace = sweep_dir / f"trace_seed_{seed}.csv"
-        run([str(SIM), str(tmp_cfg), str(LOSSES), str(summary), str(trace)], cwd=CODE)
-        summaries.append(summary)
+    if not args.no_catalog and not args.stream and completed:
+        new = sorted(completed)
+        with RunCatalog() as catalog:
+            catalog.record_jobs(
+                f"seed_sweep/{cfg_path.stem}",
+                [f"seed_{seed}" for seed in new],
+                [seed_job(seed, sweep_dir) for seed in new],
+                simulator=SIM,
+                cwd=CODE,
+            )
 
     metrics_csv = sweep_dir / "metrics.csv"
-    run(["python3", str(BASE / "summarize_metrics.py"), "--out", str(metrics_csv)] + [str(p) for p in summaries], cwd=CODE)
+    if windows is not None:
+        first_loss = int(loss_steps[0]) if len(loss_steps) else 0
+        runs = [(sweep_dir.name, f"stream:seed_{s}", done[s]["metrics"]) for s in sorted(done)]
+        write_metrics(metrics_csv, runs, first_loss)
+    else:
+        run(["python3", str(BASE / "summarize_metrics.py"), "--out", str(metrics_csv)] + [str(sweep_dir / done[s]["outputs"]["summary"]["name"]) for s in sorted(done)], cwd=CODE)
     print(f"Wrote sweep metrics: {metrics_csv}")
-    return 0
+    return 1 if failures else 0
 
 
 if __name__ == "__main__":
@@ -3,20 +3,38 @@
 
 This script is intentionally simple:
 - Optionally (re)build + (re)run the baseline simulator to regenerate the summary/trace CSVs
-- Run the existing plotting scripts to (re)generate the PNG files
+- Render the sweep figures (plot_sweeps.py) to (re)generate the PNG files
+
+With --regen-data, simulations go through the content-addressed run cache
+(run_cache.py), so only runs whose scenario, loss schedule or simulator build
+changed are re-simulated; the misses run in one batch-mode simulator process.
+The runs are then recorded in the run catalog (run_catalog.py) under the
+experiment "generate_pngs".
+
+Figures go through the render cache (render_cache.py): each sweep of
+plot_sweeps.SWEEPS is one job, re-rendered only when its summaries, traces,
+loss schedule, spec or plotting code changed, on a pool of --jobs processes
+that each import matplotlib once. With nothing changed, nothing is drawn.
 
 Typical usage:
   python3 Code/generate_pngs.py
   python3 Code/generate_pngs.py --regen-data
+  python3 Code/generate_pngs.py --force-render
 """
 
 from __future__ import annotations
 
 import argparse
+import importlib.util
+import os
 import subprocess
-import sys
 from pathlib import Path
 
+from plot_sweeps import SWEEPS, sweep_job
+from render_cache import RenderCache, render_jobs
+from run_cache import DEFAULT_MAX_MB, RunCache, run_cached_batch
+from run_catalog import RunCatalog
+from sim_batch import EVENT_TRACE_OVERRIDES, BatchJob
 
 BASE = Path(__file__).resolve().parent
 
@@ -25,11 +43,13 @@ def run(cmd: list[str], *, cwd: Path | None = None) -> None:
     subprocess.run(cmd, cwd=str(cwd) if cwd else None, check=True)
 
 
-def regen_one(cfg: Path, losses: Path, summary: Path, trace: Path) -> None:
+def regen_all(jobs: list[BatchJob], *, cache: RunCache | None = None, force: bool = False, threads: int = 1) -> int:
+    """Simulate (or serve from cache) all jobs; return the number of cache hits."""
+
     exe = BASE / "baseline_simulator"
     if not exe.exists():
-        raise FileNotFoundError(f"Missing {exe}. Run with --build or --regen-data.")
-    run([str(exe), str(cfg), str(losses), str(summary), str(trace)], cwd=BASE)
+        raise FileNotFoundError(f"Missing {exe}. Run --regen-data without --no-build.")
+    return sum(run_cached_batch(cache, exe, jobs, force=force, cwd=BASE, threads=threads))
 
 
 def main() -> int:
@@ -42,25 +62,34 @@ def main() -> int:
     ap.add_argument(
         "--force",
         action="store_true",
-        help="With --regen-data: regenerate even if output CSVs already exist",
+        help="With --regen-data: re-simulate even on a run cache hit",
+    )
+    ap.add_argument("--no-cache", action="store_true", help="With --regen-data: always simulate, bypassing the run cache")
+    ap.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_MB, help="Run cache size bound (LRU eviction)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Figure render processes (and with --regen-data: simulator worker threads)")
+    ap.add_argument("--force-render", action="store_true", help="Re-render every figure, even if its inputs are unchanged")
+    ap.add_argument(
+        "--no-build",
+        action="store_true",
+        help="With --regen-data: use the existing baseline_simulator instead of running make first",
     )
+    ap.add_argument("--build", action="store_true", help=argparse.SUPPRESS)  # make now runs by default; kept for old command lines
     ap.add_argument(
-        "--build",
+        "--full-traces",
         action="store_true",
-        help="Build baseline_simulator via make before regenerating data",
+        help="With --regen-data: write every trace step, not just every 1000th and those around losses/spares",
     )
+    ap.add_argument("--no-catalog", action="store_true", help="With --regen-data: do not record the runs in the run catalog")
     args = ap.parse_args()
 
-    try:
-        import matplotlib  # noqa: F401
-    except ModuleNotFoundError:
+    if importlib.util.find_spec("matplotlib") is None:
         print("ERROR: matplotlib is not installed for this Python.")
         print("Install it with: python3 -m pip install --user matplotlib")
         return 2
 
     losses_seeded = BASE / "losses_seeded.csv"
 
-    # Data required by plot scripts (filenames are hardcoded in those scripts).
+    # Data required by the plot_sweeps.SWEEPS specs (filenames are hardcoded there).
     data_jobs: list[tuple[Path, Path, Path, Path]] = []
 
     # backpressure plot (seed)
@@ -96,39 +125,37 @@ def main() -> int:
                 )
             )
 
-    if args.build or args.regen_data:
-        run(["make"], cwd=BASE)
+    if args.regen_data and not args.no_build:
+        run(["make", "-s"], cwd=BASE)  # a no-op when the binary is newer than its source
 
     if args.regen_data:
+        cache = None if args.no_cache else RunCache(max_bytes=args.cache_max_mb << 20)
         for cfg, losses, summary, trace in data_jobs:
             if not cfg.exists():
                 raise FileNotFoundError(f"Missing scenario cfg: {cfg}")
             if not losses.exists():
                 raise FileNotFoundError(f"Missing losses file: {losses}")
-            if (not args.force) and summary.exists() and trace.exists():
-                continue
-            regen_one(cfg, losses, summary, trace)
-
-    # Generate PNGs
-    run([sys.executable, str(BASE / "plot_backpressure.py"), "--summary-suffix", "seed", "--auto-stride"])
-    run([sys.executable, str(BASE / "plot_hold_sweep.py")])
-    run([sys.executable, str(BASE / "plot_wback_sweep.py")])
-    run([sys.executable, str(BASE / "plot_wsym_hold500.py")])
-
+        # the plot scripts only read spare insertion steps from the traces
+        overrides = () if args.full_traces else EVENT_TRACE_OVERRIDES
+        jobs = [
+            BatchJob(cfg, losses, summary=summary, trace=trace, overrides=overrides)
+            for cfg, losses, summary, trace in data_jobs
+        ]
+        hits = regen_all(jobs, cache=cache, force=args.force, threads=args.jobs)
+        print(f"Simulations: {len(data_jobs) - hits} run, {hits} served from cache")
+        if not args.no_catalog:
+            with RunCatalog() as catalog:
+                names = [summary.stem.removeprefix("summary_") for _, _, summary, _ in data_jobs]
+                catalog.record_jobs("generate_pngs", names, jobs, simulator=BASE / "baseline_simulator", cwd=BASE)
+
+    rendered = render_jobs([sweep_job(spec) for spec in SWEEPS.values()], cache=RenderCache(), workers=args.jobs, force=args.force_render)
+
+    if not rendered:
+        print("PNG plots in Code/ are up to date.")
+        return 0
     print("PNG plots generated in Code/:")
-    for name in [
-        "plot_speed_backpressure.png",
-        "plot_gap_backpressure.png",
-        "plot_gap_backpressure_std.png",
-        "plot_speed_hold_sweep.png",
-        "plot_gap_hold_sweep.png",
-        "plot_speed_wback_sweep.png",
-        "plot_gap_wback_sweep.png",
-        "plot_speed_k_sym_hold500.png",
-        "plot_gap_k_sym_hold500.png",
-    ]:
-        p = BASE / name
-        if p.exists():
+    for job in rendered:
+        for p in job.outputs:
             print(f"  - {p.name}")
 
     return 0
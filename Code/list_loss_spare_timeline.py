@@ -3,11 +3,14 @@
 
 Reads:
 - losses CSV: step,idx (comma or semicolon)
-- trace CSV from baseline_simulator: step;idx;alive;...
+- trace CSV from baseline_simulator: step;idx;alive;... (spare events come
+  from its <trace>.events.json sidecar once it has been built, see sim_io.py)
 
 Outputs:
 1) merged chronological event list (LOSS / SPARE) with delta to previous event
 2) for each LOSS, the next SPARE after it and the delay
+3) with --around W: the trace rows of each event's drone, W steps either side
+   (read through the trace's step index, so only those rows are parsed)
 
 Example:
   python3 Code/list_loss_spare_timeline.py \
@@ -22,34 +25,21 @@ import argparse
 from dataclasses import dataclass
 from pathlib import Path
 
+from sim_io import load_losses, load_trace, trace_events
+
 
 @dataclass(frozen=True)
 class Event:
     step: int
     kind: str  # "LOSS" or "SPARE"
     detail: str
+    idx: int
 
 
 def read_loss_events(path: Path) -> list[Event]:
     if not path.exists():
         raise FileNotFoundError(path)
-    events: list[Event] = []
-    with path.open() as f:
-        header = f.readline()
-        delim = ";" if ";" in header else ","
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            parts = line.replace(";", ",").split(",")
-            if len(parts) < 2:
-                continue
-            try:
-                step = int(parts[0])
-                idx = int(parts[1])
-            except ValueError:
-                continue
-            events.append(Event(step=step, kind="LOSS", detail=f"idx={idx}"))
+    events = [Event(step=step, kind="LOSS", detail=f"idx={idx}", idx=idx) for step, idx in load_losses(path).tolist()]
     events.sort(key=lambda e: e.step)
     return events
 
@@ -57,26 +47,8 @@ def read_loss_events(path: Path) -> list[Event]:
 def read_spare_events_from_trace(path: Path) -> list[Event]:
     if not path.exists():
         raise FileNotFoundError(path)
-    prev_alive: dict[int, int] = {}
-    events: list[Event] = []
-    with path.open() as f:
-        f.readline()  # header
-        for line in f:
-            parts = line.strip().split(";")
-            if len(parts) < 3:
-                continue
-            try:
-                step = int(parts[0])
-                idx = int(parts[1])
-                alive = int(parts[2])
-            except ValueError:
-                continue
-            prev = prev_alive.get(idx)
-            if prev is not None and prev == 0 and alive == 1:
-                events.append(Event(step=step, kind="SPARE", detail=f"idx={idx}"))
-            prev_alive[idx] = alive
-    events.sort(key=lambda e: e.step)
-    return events
+    spares = trace_events(path).spares
+    return [Event(step=step, kind="SPARE", detail=f"idx={idx}", idx=idx) for step, idx, _ in spares.tolist()]
 
 
 def fmt_time(step: int, dt: float | None) -> str:
@@ -90,6 +62,7 @@ def main() -> int:
     ap.add_argument("--losses", type=Path, required=True)
     ap.add_argument("--trace", type=Path, required=True)
     ap.add_argument("--dt", type=float, default=None, help="seconds per step (optional)")
+    ap.add_argument("--around", type=int, default=None, metavar="W", help="print each event drone's trace rows for steps [t-W, t+W]")
     args = ap.parse_args()
 
     losses = read_loss_events(args.losses)
@@ -132,6 +105,16 @@ def main() -> int:
                 f"LOSS {loss.step:5d}{fmt_time(loss.step, args.dt)} -> SPARE {next_spare:5d}{fmt_time(next_spare, args.dt)}  delay {delay}{delay_s}"
             )
 
+    if args.around is not None:
+        print()
+        print(f"# 3) Event drone trace rows, +-{args.around} steps")
+        cols = ["step", "alive", "s", "v", "gap_f", "gap_b"]
+        for e in merged:
+            rows = load_trace(args.trace, cols, idx=[e.idx], start=e.step - args.around, stop=e.step + args.around + 1)
+            print(f"{e.kind} {e.step}{fmt_time(e.step, args.dt)} idx={e.idx}")
+            for step, alive, pos, v, gap_f, gap_b in rows.tolist():
+                print(f"  {step:5d}  alive={alive}  s={pos:.3f}  v={v:.3f}  gap_f={gap_f:.3f}  gap_b={gap_b:.3f}")
+
     return 0
 
 
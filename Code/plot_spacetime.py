@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Space-time diagram of a trace: ring position over steps, colored by speed or gap.
+
+Each drone's trajectory s(t) is a line in the (step, position) plane, so the
+slowdown and bunching that follow a loss show up as bands travelling
+backwards through the fleet. Instead of one scatter point per trace row, the
+rows are binned into a (position bins, step bins) grid: every chunk of the
+trace (sim_io.step_chunks(), about 1M rows) is added with one np.bincount
+of the value and one of the row count, and each cell shows the mean value of
+the rows in it. Memory is the grid plus one chunk, whatever the trace length
+or fleet size; the grid is drawn with a single imshow().
+
+Positions wrap at the ring perimeter, taken from --perimeter, the header of a
+binary/compressed trace, or --scenario. Dead drones (alive=0) and missing
+values are left out; empty cells are drawn white.
+
+Usage:
+  python3 Code/plot_spacetime.py trace_w05_unbounded.csv --scenario sample_scenario_w05_unbounded.cfg
+  python3 Code/plot_spacetime.py trace.bin --color gap_f --start 1000 --stop 2000 --losses losses_seeded.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from run_cache import normalize_scenario
+from sim_io import OUTPUT_MAGIC, file_format, last_step, load_loss_steps, read_header, step_chunks
+
+FIG_SIZE = (10, 5)
+DPI = 150
+STEP_BINS = 1200  # about the axes width in pixels
+POSITION_BINS = 400
+
+# colored column -> (colorbar label, colormap)
+COLORS = {
+    "v": ("speed (m/s)", "viridis"),
+    "gap_f": ("front gap (m)", "magma"),
+    "gap_b": ("back gap (m)", "magma"),
+}
+
+
+def trace_perimeter(trace: Path, scenario: Path | None = None) -> float | None:
+    """Ring perimeter from a binary/compressed trace's header, else from a scenario file."""
+
+    fmt = file_format(trace)
+    if fmt != "csv":
+        value = read_header(trace, OUTPUT_MAGIC[fmt])[0].get("scenario", {}).get("perimeter")
+        if value is not None:
+            return float(value)
+    if scenario is not None:
+        for line in normalize_scenario(scenario.read_text(encoding="utf-8")).splitlines():
+            key, _, value = line.partition("=")
+            if key == "perimeter":
+                return float(value)
+    return None
+
+
+def spacetime_grid(
+    trace: Path,
+    column: str,
+    perimeter: float,
+    *,
+    start: int = 0,
+    stop: int | None = None,
+    step_bins: int = STEP_BINS,
+    position_bins: int = POSITION_BINS,
+) -> tuple[np.ndarray, int]:
+    """(position_bins, step_bins) mean of `column` per cell over steps [start, stop), and the stop used."""
+
+    stop = last_step(trace) + 1 if stop is None else stop
+    if stop <= start:
+        raise ValueError(f"empty step range [{start}, {stop})")
+    step_bins = max(1, min(step_bins, stop - start))
+    cells = position_bins * step_bins
+    sums = np.zeros(cells)
+    counts = np.zeros(cells)
+    for rows in step_chunks(trace, ["step", "alive", "s", column], start=start, stop=stop):
+        ok = (rows["alive"] == 1) & np.isfinite(rows[column]) & np.isfinite(rows["s"])
+        steps, s, value = rows["step"][ok], rows["s"][ok], rows[column][ok]
+        x = (steps - start).astype(np.int64) * step_bins // (stop - start)
+        y = np.minimum((np.mod(s, perimeter) * (position_bins / perimeter)).astype(np.int64), position_bins - 1)
+        cell = y * step_bins + x
+        sums += np.bincount(cell, weights=value, minlength=cells)
+        counts += np.bincount(cell, minlength=cells)
+    with np.errstate(invalid="ignore"):
+        grid = sums / counts
+    return grid.reshape(position_bins, step_bins), stop
+
+
+def render(
+    trace: Path,
+    out: Path,
+    *,
+    column: str = "v",
+    perimeter: float,
+    start: int = 0,
+    stop: int | None = None,
+    step_bins: int = STEP_BINS,
+    position_bins: int = POSITION_BINS,
+    losses: Path | None = None,
+) -> Path:
+    grid, stop = spacetime_grid(
+        trace,
+        column,
+        perimeter,
+        start=start,
+        stop=stop,
+        step_bins=step_bins,
+        position_bins=position_bins,
+    )
+    label, cmap = COLORS[column]
+    fig = Figure(figsize=FIG_SIZE)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    image = ax.imshow(
+        np.ma.masked_invalid(grid),
+        origin="lower",
+        aspect="auto",
+        interpolation="nearest",
+        extent=(start, stop, 0.0, perimeter),
+        cmap=cmap,
+    )
+    fig.colorbar(image, ax=ax, label=label)
+    if losses is not None:
+        for s in load_loss_steps(losses):
+            if start <= s < stop:
+                ax.axvline(s, color="red", linestyle="--", linewidth=1.0, alpha=0.8)
+    ax.set_xlabel("step")
+    ax.set_ylabel("ring position s (m)")
+    ax.set_title(f"{trace.name}: {label} over ring position")
+    fig.tight_layout()
+    fig.set_layout_engine(None)  # else savefig() draws everything twice
+    fig.savefig(out, dpi=DPI)
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Space-time diagram (step x ring position) of a trace")
+    ap.add_argument("trace", type=Path)
+    ap.add_argument("--color", choices=sorted(COLORS), default="v", help="column the cells are colored by (default: v)")
+    ap.add_argument("--perimeter", type=float, default=None, help="ring perimeter (default: from the trace header or --scenario)")
+    ap.add_argument("--scenario", type=Path, default=None, help="scenario file to read the perimeter from")
+    ap.add_argument("--start", type=int, default=0, help="first step to plot (default: 0)")
+    ap.add_argument("--stop", type=int, default=None, help="plot steps before this one (default: all)")
+    ap.add_argument("--step-bins", type=int, default=STEP_BINS, help=f"grid columns (default: {STEP_BINS})")
+    ap.add_argument("--position-bins", type=int, default=POSITION_BINS, help=f"grid rows (default: {POSITION_BINS})")
+    ap.add_argument("--losses", type=Path, default=None, help="loss schedule to mark (red dashed lines)")
+    ap.add_argument("--out", type=Path, default=None, help="output PNG (default: spacetime_<trace>_<color>.png next to the trace)")
+    args = ap.parse_args()
+    stop = args.stop if args.stop is not None else last_step(args.trace) + 1
+    if stop <= args.start:
+        if args.stop is None:
+            ap.error(f"--start ({args.start}) is past the last step of the trace ({stop - 1})")
+        ap.error(f"--stop ({stop}) must be greater than --start ({args.start})")
+    if args.step_bins < 1 or args.position_bins < 1:
+        ap.error("--step-bins and --position-bins must be at least 1")
+
+    perimeter = args.perimeter if args.perimeter is not None else trace_perimeter(args.trace, args.scenario)
+    if perimeter is None:
+        ap.error("no perimeter in the trace header: pass --perimeter or --scenario")
+    out = args.out or args.trace.with_name(f"spacetime_{args.trace.stem}_{args.color}.png")
+    render(
+        args.trace,
+        out,
+        column=args.color,
+        perimeter=perimeter,
+        start=args.start,
+        stop=stop,
+        step_bins=args.step_bins,
+        position_bins=args.position_bins,
+        losses=args.losses,
+    )
+    print(out)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
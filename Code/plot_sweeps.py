@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""Plot the sweep figures in Code/ (mean line, ±1σ band per variant) in one process.
+
+A sweep is declared as a SweepSpec: its variants (label, summary, trace,
+color) and its metrics, one figure each. render() plans all requested
+figures first, then loads every summary (each once, with the union of the
+columns the figures need), the spare steps of every trace and every loss
+schedule into a PlotData cache shared by all sweeps, and draws the figures
+on Agg canvases in the same interpreter. Each series is reduced to the
+figure's pixel width with sim_downsample (lines: min/max per pixel column
+by default, or LTTB; bands: their per-column envelope), so loss spikes and
+gap minima are drawn at any run length; a spec can ask for a fixed stride
+instead. A spec may restrict the figures to a step range; ranges with many
+steps per pixel column are drawn from the summaries' min/max pyramids
+(sim_pyramid.py) instead of their rows.
+
+Usage:
+  python3 Code/plot_sweeps.py                    # every sweep in SWEEPS
+  python3 Code/plot_sweeps.py hold_sweep wback_sweep
+  python3 Code/plot_sweeps.py --downsample lttb
+  python3 Code/plot_sweeps.py hold_sweep --start 1000 --stop 1600
+  python3 Code/plot_sweeps.py --list
+
+plot_backpressure.py builds the back-pressure spec from its command line
+(file suffixes, stride or downsampling, output tag); generate_pngs.py
+renders SWEEPS through the render cache (render_cache.py, one sweep_job()
+per sweep), which skips sweeps whose inputs and spec are unchanged.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Sequence
+
+import numpy as np
+
+from render_cache import RenderJob
+from sim_downsample import METHODS, band_envelope, downsample
+from sim_io import load_loss_steps, load_summary, spare_steps
+from sim_pyramid import minmax_band, minmax_line, view
+
+BASE = Path(__file__).resolve().parent
+FIG_SIZE = (8, 4)
+DPI = 150
+WIDTH_PX = FIG_SIZE[0] * DPI
+LOSS_FILE = BASE / "losses_seeded.csv"
+
+
+@dataclass(frozen=True)
+class Variant:
+    label: str
+    summary: Path
+    trace: Path
+    color: str
+
+
+@dataclass(frozen=True)
+class Metric:
+    """One figure: `mean` per variant, with a ±`std` band unless std is None."""
+
+    output: str  # PNG name
+    mean: str
+    std: str | None
+    ylabel: str
+    title: str  # followed by the sampling, e.g. "(min/max per pixel)"
+    label: str = "{label}"  # legend entry, formatted with label=
+
+
+@dataclass(frozen=True)
+class SweepSpec:
+    name: str
+    variants: tuple[Variant, ...]
+    metrics: tuple[Metric, ...]
+    losses: Path = LOSS_FILE
+    stride: int | None = None  # fixed stride instead of downsampling
+    downsample: str = "minmax"  # sim_downsample method
+    start: int | None = None  # step range [start, stop) to plot (default: the whole run)
+    stop: int | None = None
+    detect_losses: bool = False  # fall back to alive drops in the first summary
+
+
+def variants(labels: Sequence[str], summary_stems: Sequence[str], colors: Sequence[str], trace_stems: Sequence[str] | None = None) -> tuple[Variant, ...]:
+    """Variants reading Code/summary_<stem>.csv and Code/trace_<stem>.csv."""
+
+    trace_stems = summary_stems if trace_stems is None else trace_stems
+    return tuple(
+        Variant(label, BASE / f"summary_{stem}.csv", BASE / f"trace_{tstem}.csv", color)
+        for label, stem, tstem, color in zip(labels, summary_stems, trace_stems, colors)
+    )
+
+
+def speed_gap(suffix: str, speed_title: str, gap_title: str) -> tuple[Metric, ...]:
+    return (
+        Metric(f"plot_speed_{suffix}.png", "mean_v", "std_v", "speed (m/s)", f"{speed_title}: mean line, ±1σ band"),
+        Metric(f"plot_gap_{suffix}.png", "mean_gap", "std_gap", "gap (m)", f"{gap_title}: mean line, ±1σ band"),
+    )
+
+
+def backpressure_spec(
+    summary_suffix: str = "seed",
+    trace_suffix: str | None = None,
+    *,
+    output_tag: str = "",
+    stride: int | None = None,
+    downsample: str = "minmax",
+    losses: Path = LOSS_FILE,
+) -> SweepSpec:
+    """Back-pressure weights w0.0..w0.6 on summary_wXX_<summary_suffix>.csv."""
+
+    stems = ["w0", "w04", "w05", "w06"]
+    tag = f"_{output_tag}" if output_tag else ""
+    return SweepSpec(
+        "backpressure",
+        variants(
+            ["w0.0", "w0.4", "w0.5", "w0.6"],
+            [f"{s}_{summary_suffix}" for s in stems],
+            ["tab:purple", "tab:blue", "tab:green", "tab:orange"],
+            [f"{s}_{trace_suffix or summary_suffix}" for s in stems],
+        ),
+        (
+            Metric(f"plot_speed_backpressure{tag}.png", "mean_v", "std_v", "speed (m/s)", "Speed: mean line, ±1σ band", "{label} avg v"),
+            Metric(f"plot_gap_backpressure{tag}.png", "mean_gap", "std_gap", "gap (m)", "Gap: mean line, ±1σ band", "{label} mean gap"),
+            Metric(
+                f"plot_gap_backpressure_std{tag}.png",
+                "std_gap",
+                None,
+                "std gap (m)",
+                "Backpressure: std(gap) only",
+                "{label} std(gap)",
+            ),
+        ),
+        losses=losses,
+        stride=stride,
+        downsample=downsample,
+        detect_losses=True,
+    )
+
+
+KSYM_COLORS = ["tab:red", "tab:blue", "tab:green", "tab:orange", "tab:purple"]
+KSYM_STEMS = ["w02", "w04", "w05", "w06", "w08"]
+
+SWEEPS = {
+    spec.name: spec
+    for spec in [
+        backpressure_spec(),
+        # incoming_hold_steps at k_sym=0.5
+        SweepSpec(
+            "hold_sweep",
+            variants(
+                [f"hold{h}" for h in (50, 100, 200, 500, 1000)],
+                [f"w05_hold{h}" for h in (50, 100, 200, 500, 1000)],
+                ["tab:green", "tab:blue", "tab:orange", "tab:red", "tab:purple"],
+            ),
+            speed_gap("hold_sweep", "Speed vs hold time", "Gap vs hold time"),
+        ),
+        # k_sym at incoming_hold_steps=1000
+        SweepSpec(
+            "wback_sweep",
+            variants([f"w0.{s[-1]}" for s in KSYM_STEMS], [f"{s}_hold1000" for s in KSYM_STEMS], KSYM_COLORS),
+            speed_gap("wback_sweep", "Speed vs k_sym (hold=1000)", "Gap vs k_sym (hold=1000)"),
+        ),
+        # k_sym at incoming_hold_steps=500
+        SweepSpec(
+            "wsym_hold500",
+            variants([f"k0.{s[-1]}" for s in KSYM_STEMS], [f"{s}_hold500" for s in KSYM_STEMS], KSYM_COLORS),
+            speed_gap("k_sym_hold500", "Speed vs k_sym (hold=500)", "Gap vs k_sym (hold=500)"),
+        ),
+    ]
+}
+
+
+Window = tuple[int | None, int | None]
+
+
+class PlotData:
+    """Inputs of a render() call; every file is read once.
+
+    Summaries are keyed by (path, stride, steps kept by a stride, step range).
+    need() registers the columns a figure reads before the first summary() call
+    loads them. pyramid() serves long ranges from the summary's pyramid level.
+    """
+
+    def __init__(self) -> None:
+        self._columns: dict[tuple[Path, int, tuple[int, ...], Window], list[str]] = {}
+        self._summaries: dict[tuple[Path, int, tuple[int, ...], Window], np.ndarray] = {}
+        self._views: dict[tuple[Path, Window], tuple[np.ndarray, int] | None] = {}
+        self._spares: dict[Path, np.ndarray] = {}
+        self._losses: dict[Path, list[int]] = {}
+
+    def need(self, path: Path, stride: int, keep: Sequence[int], window: Window, columns: Sequence[str]) -> None:
+        wanted = self._columns.setdefault((path, stride, tuple(keep), window), ["step"])
+        for column in columns:
+            if column not in wanted:
+                wanted.append(column)
+
+    def summary(self, path: Path, stride: int, keep: Sequence[int], window: Window) -> np.ndarray:
+        key = (path, stride, tuple(keep), window)
+        if key not in self._summaries:
+            start, stop = window
+            self._summaries[key] = load_summary(path, self._columns.get(key), stride=stride, keep_steps=list(keep), start=start, stop=stop)
+        return self._summaries[key]
+
+    def pyramid(self, path: Path, window: Window) -> tuple[np.ndarray, int] | None:
+        """(records, block) of the pyramid level for `window` at WIDTH_PX, or None to draw from rows."""
+
+        key = (path, window)
+        if key not in self._views:
+            start, stop = window
+            self._views[key] = view(path, WIDTH_PX, start=start, stop=stop, source="summary")
+        return self._views[key]
+
+    def spares(self, traces: Sequence[Path]) -> list[int]:
+        """Union of the spare insertion steps of `traces`."""
+
+        for trace in traces:
+            if trace not in self._spares:
+                self._spares[trace] = spare_steps(trace)
+        return sorted(set(np.concatenate([self._spares[t] for t in traces]).tolist())) if traces else []
+
+    def losses(self, path: Path) -> list[int]:
+        if path not in self._losses:
+            self._losses[path] = load_loss_steps(path).tolist()
+        return self._losses[path]
+
+
+def detect_losses_from_summary(path: Path, stride: int) -> list[int]:
+    rows = load_summary(path, ["step", "alive"], stride=stride)
+    drops = np.flatnonzero(np.diff(rows["alive"]) < 0) + 1
+    return rows["step"][drops].tolist()
+
+
+def sampling(spec: SweepSpec) -> tuple[int, str]:
+    """(stride the summaries are read with, how the figure title describes the sampling)."""
+
+    if spec.stride is not None:
+        stride = max(1, spec.stride)
+        return stride, f"stride {stride}"
+    return 1, "min/max per pixel" if spec.downsample == "minmax" else "LTTB"
+
+
+def draw(spec: SweepSpec, metric: Metric, data: PlotData, loss_steps: list[int], spares: list[int], out: Path) -> None:
+    # imported here: SWEEPS and sweep_job() must not pay for matplotlib
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    stride, note = sampling(spec)
+    keep = loss_steps if stride > 1 else []
+    fig = Figure(figsize=FIG_SIZE)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    window = (spec.start, spec.stop)
+    for idx, variant in enumerate(spec.variants):
+        label = metric.label.format(label=variant.label)
+        width = 1.8 if metric.std is None else 1.6
+        pyramid = data.pyramid(variant.summary, window) if spec.stride is None and spec.downsample == "minmax" else None
+        if pyramid is not None:
+            records, block = pyramid
+            ax.plot(*minmax_line(records, metric.mean, block, WIDTH_PX), color=variant.color, linewidth=width, label=label)
+            if metric.std is not None:
+                band = minmax_band(records, metric.mean, metric.std, block, WIDTH_PX)
+                ax.fill_between(*band, color=variant.color, alpha=0.20, linewidth=0, label="±1σ" if idx == 0 else None)
+            continue
+        rows = data.summary(variant.summary, stride, keep, window)
+        line = rows
+        if spec.stride is None:
+            line = downsample(rows, [rows[metric.mean]], WIDTH_PX, method=spec.downsample, keep_steps=loss_steps)
+        ax.plot(line["step"], line[metric.mean], color=variant.color, linewidth=width, label=label)
+        if metric.std is None:
+            continue
+        x, y, ystd = rows["step"], rows[metric.mean], rows[metric.std]
+        x, lower, upper = (x, y - ystd, y + ystd) if spec.stride else band_envelope(x, y - ystd, y + ystd, WIDTH_PX)
+        band_label = "±1σ" if idx == 0 else None
+        ax.fill_between(x, lower, upper, color=variant.color, alpha=0.20, linewidth=0, label=band_label)
+    for s in loss_steps:
+        ax.axvline(s, color="red", linestyle="--", linewidth=2.0, alpha=0.9, zorder=5)
+    if loss_steps:
+        ax.axvline(loss_steps[0], color="red", linestyle="--", linewidth=2.0, alpha=0.9, zorder=5, label="loss")
+    for s in spares:
+        ax.axvline(s, color="darkgreen", linestyle="-", linewidth=2.0, alpha=0.9, zorder=4)
+    if spares:
+        ax.axvline(spares[0], color="darkgreen", linestyle="-", linewidth=2.0, alpha=0.9, zorder=4, label="spare")
+    if spec.start is not None or spec.stop is not None:
+        ax.set_xlim(spec.start, spec.stop)
+    ax.set_xlabel("step")
+    ax.set_ylabel(metric.ylabel)
+    ax.set_title(f"{metric.title} ({note})")
+    ax.legend()
+    fig.tight_layout()
+    fig.set_layout_engine(None)  # else savefig() draws everything twice
+    fig.savefig(out, dpi=DPI)
+
+
+def render(specs: Sequence[SweepSpec], *, out_dir: Path = BASE) -> list[Path]:
+    """Draw every metric of every spec into out_dir; returns the written PNG paths."""
+
+    data = PlotData()
+    plans = []
+    for spec in specs:
+        stride, _ = sampling(spec)
+        loss_steps = data.losses(spec.losses)
+        if not loss_steps and spec.detect_losses:
+            loss_steps = detect_losses_from_summary(spec.variants[0].summary, stride)
+        for variant in spec.variants:
+            columns = [c for m in spec.metrics for c in (m.mean, m.std) if c is not None]
+            data.need(variant.summary, stride, loss_steps if stride > 1 else [], (spec.start, spec.stop), columns)
+        plans.append((spec, loss_steps))
+
+    written: list[Path] = []
+    for spec, loss_steps in plans:
+        spares = data.spares([v.trace for v in spec.variants])
+        for metric in spec.metrics:
+            out = out_dir / metric.output
+            draw(spec, metric, data, loss_steps, spares, out)
+            written.append(out)
+    return written
+
+
+def sweep_job(spec: SweepSpec) -> RenderJob:
+    """A render_cache job drawing the figures of `spec` into Code/."""
+
+    return RenderJob(
+        "plot_sweeps:render",
+        ((spec,),),
+        inputs=(*(v.summary for v in spec.variants), *(v.trace for v in spec.variants), spec.losses),
+        outputs=tuple(BASE / m.output for m in spec.metrics),
+    )
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Plot the sweep figures in Code/")
+    ap.add_argument("sweeps", nargs="*", metavar="SWEEP", help=f"sweeps to plot (default: all of {', '.join(SWEEPS)})")
+    ap.add_argument("--downsample", choices=METHODS, default=None, help="downsampling method for every sweep (default: each spec's, min/max)")
+    ap.add_argument("--start", type=int, default=None, help="first step to plot (default: the first)")
+    ap.add_argument("--stop", type=int, default=None, help="plot steps before this one (default: all)")
+    ap.add_argument("--list", action="store_true", help="list the sweeps and their figures")
+    args = ap.parse_args()
+    unknown = [name for name in args.sweeps if name not in SWEEPS]
+    if unknown:
+        ap.error(f"unknown sweep(s): {', '.join(unknown)}")
+
+    if args.list:
+        for spec in SWEEPS.values():
+            print(f"{spec.name}: {', '.join(m.output for m in spec.metrics)}")
+        return 0
+    specs = [SWEEPS[name] for name in args.sweeps or SWEEPS]
+    if args.downsample is not None:
+        specs = [replace(spec, downsample=args.downsample) for spec in specs]
+    if args.start is not None or args.stop is not None:
+        specs = [replace(spec, start=args.start, stop=args.stop) for spec in specs]
+    for out in render(specs):
+        print(out.name)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
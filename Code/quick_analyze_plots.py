@@ -5,62 +5,32 @@ Prints pre-loss vs post-loss vs end-of-run averages for mean/std of:
 - speed (mean_v/std_v)
 - gap (mean_gap/std_gap)
 
-This is intentionally simple and dependency-free.
+This is intentionally simple: summaries are read with sim_io.load_summary() and
+windowed with sim_windows.WindowSums.
 """
 
 from __future__ import annotations
 
-import csv
-import math
 from pathlib import Path
 
+from sim_io import load_loss_steps, load_summary
+from sim_windows import WindowSums
+
 BASE = Path(__file__).parent
+COLUMNS = ["step", "mean_v", "std_v", "mean_gap", "std_gap"]
+
+
+def window_stats(sums: WindowSums, start: int, end: int) -> dict[str, float]:
+    out = {k: float(sums.mean(k, start, end)) for k in COLUMNS[1:]}
+    out["n"] = float(sums.count(start, end))
+    return out
+
 
+def load_sums(path: Path) -> tuple[WindowSums, int]:
+    """Window sums of a summary and its last step + 1."""
 
-def fmean(values: list[float]) -> float:
-    return sum(values) / len(values) if values else math.nan
-
-
-def load_loss_steps(path: Path) -> list[int]:
-    steps: list[int] = []
-    if not path.exists():
-        return steps
-    with path.open() as f:
-        next(f, None)  # header
-        for line in f:
-            parts = line.strip().replace(";", ",").split(",")
-            if parts and parts[0].isdigit():
-                steps.append(int(parts[0]))
-    return sorted(steps)
-
-
-def load_summary(path: Path) -> list[dict[str, float | int]]:
-    rows: list[dict[str, float | int]] = []
-    with path.open() as f:
-        reader = csv.DictReader(f, delimiter=";")
-        for row in reader:
-            rows.append(
-                {
-                    "step": int(row["step"]),
-                    "alive": int(row["alive"]),
-                    "mean_v": float(row["mean_v"]),
-                    "std_v": float(row["std_v"]),
-                    "mean_gap": float(row["mean_gap"]),
-                    "std_gap": float(row["std_gap"]),
-                }
-            )
-    return rows
-
-
-def window_stats(rows: list[dict[str, float | int]], start: int, end: int) -> dict[str, float]:
-    sel = [r for r in rows if start <= int(r["step"]) < end]
-    return {
-        "mean_v": fmean([float(r["mean_v"]) for r in sel]),
-        "mean_gap": fmean([float(r["mean_gap"]) for r in sel]),
-        "std_v": fmean([float(r["std_v"]) for r in sel]),
-        "std_gap": fmean([float(r["std_gap"]) for r in sel]),
-        "n": float(len(sel)),
-    }
+    rows = load_summary(path, COLUMNS)
+    return WindowSums(rows, COLUMNS[1:]), int(rows["step"][-1]) + 1
 
 
 def fmt(stats: dict[str, float]) -> str:
@@ -71,7 +41,7 @@ def fmt(stats: dict[str, float]) -> str:
 
 
 def main() -> None:
-    loss_steps = load_loss_steps(BASE / "losses_seeded.csv")
+    loss_steps = load_loss_steps(BASE / "losses_seeded.csv").tolist()
     first_loss = loss_steps[0] if loss_steps else 0
 
     print("losses_seeded.csv")
@@ -80,34 +50,30 @@ def main() -> None:
 
     print("\nBACKPRESSURE (seed)")
     for label, stem in [("w0.0", "w0"), ("w0.4", "w04"), ("w0.5", "w05"), ("w0.6", "w06")]:
-        rows = load_summary(BASE / f"summary_{stem}_seed.csv")
-        last_step = int(rows[-1]["step"]) + 1
-        pre = window_stats(rows, 0, first_loss)
-        post = window_stats(rows, first_loss + 1, last_step)
-        end = window_stats(rows, int(last_step * 0.8), last_step)
+        sums, last_step = load_sums(BASE / f"summary_{stem}_seed.csv")
+        pre = window_stats(sums, 0, first_loss)
+        post = window_stats(sums, first_loss + 1, last_step)
+        end = window_stats(sums, int(last_step * 0.8), last_step)
         print(f"  {label} pre:  {fmt(pre)}")
         print(f"       post: {fmt(post)}")
         print(f"       end:  {fmt(end)}")
 
     print("\nHOLD SWEEP (w0.5) end-of-run (last 20%)")
     for hold in [50, 100, 200, 500, 1000]:
-        rows = load_summary(BASE / f"summary_w05_hold{hold}.csv")
-        last_step = int(rows[-1]["step"]) + 1
-        end = window_stats(rows, int(last_step * 0.8), last_step)
+        sums, last_step = load_sums(BASE / f"summary_w05_hold{hold}.csv")
+        end = window_stats(sums, int(last_step * 0.8), last_step)
         print(f"  hold{hold:4d}: {fmt(end)}")
 
     print("\nK_SYM SWEEP (hold=1000) end-of-run (last 20%)")
     for w, stem in [(0.2, "w02"), (0.4, "w04"), (0.5, "w05"), (0.6, "w06"), (0.8, "w08")]:
-        rows = load_summary(BASE / f"summary_{stem}_hold1000.csv")
-        last_step = int(rows[-1]["step"]) + 1
-        end = window_stats(rows, int(last_step * 0.8), last_step)
+        sums, last_step = load_sums(BASE / f"summary_{stem}_hold1000.csv")
+        end = window_stats(sums, int(last_step * 0.8), last_step)
         print(f"  k={w:0.1f}: {fmt(end)}")
 
     print("\nK_SYM SWEEP (hold=500) end-of-run (last 20%)")
     for w, stem in [(0.2, "w02"), (0.4, "w04"), (0.5, "w05"), (0.6, "w06"), (0.8, "w08")]:
-        rows = load_summary(BASE / f"summary_{stem}_hold500.csv")
-        last_step = int(rows[-1]["step"]) + 1
-        end = window_stats(rows, int(last_step * 0.8), last_step)
+        sums, last_step = load_sums(BASE / f"summary_{stem}_hold500.csv")
+        end = window_stats(sums, int(last_step * 0.8), last_step)
         print(f"  k={w:0.1f}: {fmt(end)}")
 
 
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""Skip-if-unchanged scheduler for figure renders.
+
+A RenderJob names a render function ("module:function"), its arguments (the
+plot parameters), the data files it reads and the PNGs it writes. A job is
+identified by a hash of:
+- the render function and the repr of its arguments
+- the source of its module and of the shared plotting helpers (HELPERS)
+- the installed matplotlib version
+- the content of every input (a missing input hashes as missing)
+
+The hash of the last successful render of each job is kept in a manifest
+(Code/.render_cache.json by default), with the size/mtime of its outputs.
+render_jobs() skips every job whose hash matches and whose outputs are
+still the ones it wrote, so an unchanged tree renders nothing and never
+imports matplotlib. Inputs are re-hashed only when their size or mtime
+changed since the manifest last saw them.
+
+The remaining jobs are fanned out over a process pool; each worker selects
+the Agg backend and imports pyplot once, then renders any number of jobs.
+The manifest is saved even when a render fails or the run is interrupted,
+so the jobs that finished are not rendered again.
+
+Usage (from the orchestrators):
+  jobs = [RenderJob("plot_timeseries:render", (name, summary, trace, losses, outdir),
+                    inputs=(summary, trace, losses), outputs=(...))]
+  rendered = render_jobs(jobs, cache=RenderCache(), workers=4)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import importlib
+import importlib.util
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any, Sequence
+
+BASE = Path(__file__).resolve().parent
+DEFAULT_MANIFEST = BASE / ".render_cache.json"
+
+# Modules every render function plots through.
+HELPERS = (BASE / "sim_io.py", BASE / "sim_downsample.py", BASE / "sim_pyramid.py")
+
+
+@dataclass(frozen=True)
+class RenderJob:
+    target: str  # "module:function", called as function(*args)
+    args: tuple[Any, ...] = ()
+    inputs: tuple[Path, ...] = ()
+    outputs: tuple[Path, ...] = ()
+
+    @property
+    def key(self) -> str:
+        return "\n".join(sorted(str(p) for p in self.outputs))
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat(path: Path) -> list[int] | None:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _matplotlib_version() -> str:
+    try:
+        return version("matplotlib")
+    except PackageNotFoundError:
+        return "missing"
+
+
+class RenderCache:
+    def __init__(self, path: Path = DEFAULT_MANIFEST):
+        self.path = path
+        self.files: dict[str, dict[str, Any]] = {}
+        self.figures: dict[str, dict[str, Any]] = {}
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            self.files, self.figures = data["files"], data["figures"]
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            pass  # no (usable) manifest: everything renders
+        self._matplotlib = _matplotlib_version()
+        self._rehashed = False
+
+    def file_hash(self, path: Path) -> str:
+        """Content hash of `path` ("missing" if absent), memoized on its size and mtime."""
+
+        stat = _stat(path)
+        if stat is None:
+            return "missing"
+        known = self.files.get(str(path))
+        if known is None or known["stat"] != stat:
+            known = self.files[str(path)] = {"stat": stat, "sha256": _sha256(path)}
+            self._rehashed = True
+        return known["sha256"]
+
+    def digest(self, job: RenderJob) -> str:
+        module, _, function = job.target.partition(":")
+        spec = importlib.util.find_spec(module)
+        if spec is None or spec.origin is None:
+            raise ModuleNotFoundError(f"render module {module!r} not found")
+        h = hashlib.sha256()
+        h.update(b"target\0" + f"{module}:{function}".encode())
+        h.update(b"args\0" + repr(job.args).encode())
+        h.update(b"matplotlib\0" + self._matplotlib.encode())
+        for source in (Path(spec.origin), *HELPERS):
+            h.update(b"source\0" + self.file_hash(source).encode())
+        for path in job.inputs:
+            h.update(b"input\0" + str(path).encode() + b"\0" + self.file_hash(path).encode())
+        return h.hexdigest()
+
+    def fresh(self, job: RenderJob, digest: str) -> bool:
+        """Whether the outputs of `job` are the ones its last render with `digest` wrote."""
+
+        entry = self.figures.get(job.key)
+        if entry is None or entry["digest"] != digest:
+            return False
+        return all(_stat(path) == entry["outputs"].get(str(path)) for path in job.outputs)
+
+    def record(self, job: RenderJob, digest: str) -> None:
+        self.figures[job.key] = {"digest": digest, "outputs": {str(p): _stat(p) for p in job.outputs}}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"files": self.files, "figures": self.figures}, f, indent=1, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp, self.path)
+
+
+def _init_worker() -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+
+
+def _render(job: RenderJob) -> None:
+    module, _, function = job.target.partition(":")
+    getattr(importlib.import_module(module), function)(*job.args)
+
+
+def render_jobs(
+    jobs: Sequence[RenderJob],
+    *,
+    cache: RenderCache | None = None,
+    workers: int | None = None,
+    force: bool = False,
+) -> list[RenderJob]:
+    """Render every job whose inputs, parameters or outputs changed; return the rendered jobs.
+
+    Without a cache every job renders (and nothing is recorded); `force`
+    renders every job and records it.
+    """
+
+    digests = [cache.digest(job) if cache is not None else "" for job in jobs]
+    stale = [(job, d) for job, d in zip(jobs, digests) if cache is None or force or not cache.fresh(job, d)]
+    if not stale:
+        if cache is not None and cache._rehashed:
+            cache.save()  # e.g. touched inputs: remember their (unchanged) hashes
+        return []
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(stale)))
+    try:
+        if workers == 1:
+            _init_worker()
+            for job, digest in stale:
+                _render(job)
+                if cache is not None:
+                    cache.record(job, digest)
+        else:
+            with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+                futures = {pool.submit(_render, job): (job, digest) for job, digest in stale}
+                for future in as_completed(futures):
+                    future.result()
+                    if cache is not None:
+                        cache.record(*futures[future])
+    finally:
+        if cache is not None:
+            cache.save()
+    return [job for job, _ in stale]
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Content-addressed cache of baseline_simulator runs.
+
+A run is identified by a hash of:
+- the normalized scenario (comments/blank lines dropped, `key=value` spacing
+  and number formatting canonicalized, line order kept)
+- the normalized loss schedule
+- the simulator build (hash of the baseline_simulator binary)
+
+Scenario overrides passed through batch mode (see sim_batch.py) are part of
+the key, appended after the scenario lines in the order they are applied.
+So is a non-default output format (binary or compressed records, see sim_io.py).
+
+Each cache entry is a directory under Code/.run_cache/<key>/ holding the
+simulator outputs. A hit copies them to the requested destination (or does
+nothing if the destination is already a copy of the entry), so editing a .cfg,
+losses_seeded.csv or rebuilding the simulator is always picked up, and nothing
+else is re-simulated.
+
+The cache is size-bounded: after each store, least-recently-used entries are
+evicted until the total size fits in `max_bytes`.
+
+Usage (from the orchestrators):
+  cache = RunCache()
+  run_cached(cache, SIM, scenario, losses, {"summary": summary, "trace": trace}, cwd=CODE)
+  run_cached_batch(cache, SIM, [BatchJob(...), ...], threads=8, cwd=CODE)
+
+Maintenance:
+  python3 Code/run_cache.py --stats
+  python3 Code/run_cache.py --evict --max-mb 512
+  python3 Code/run_cache.py --clear
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, Sequence
+
+from sim_batch import DEFAULT_LOCKSTEP, BatchJob, BatchResult, run_batch
+
+BASE = Path(__file__).resolve().parent
+DEFAULT_ROOT = BASE / ".run_cache"
+DEFAULT_MAX_MB = 2048
+
+# Order of positional output arguments on the simulator command line.
+OUTPUT_ORDER = ("summary", "trace")
+
+_build_hashes: dict[tuple[str, int, int], str] = {}
+
+
+def _canonical_value(value: str) -> str:
+    try:
+        return repr(float(value))
+    except ValueError:
+        return value
+
+
+def normalize_scenario(text: str) -> str:
+    """Canonical form of a scenario file, mirroring how read_scenario() parses it."""
+
+    lines: list[str] = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].split("//", 1)[0].strip()
+        if "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        lines.append(f"{key.strip()}={_canonical_value(value.strip())}")
+    return "\n".join(lines) + "\n"
+
+
+def normalize_losses(text: str) -> str:
+    """Canonical form of a loss schedule (the simulator always skips the first line)."""
+
+    rows: list[str] = []
+    for line in text.splitlines()[1:]:
+        parts = line.strip().replace(";", ",").split(",")
+        if len(parts) < 2:
+            continue
+        try:
+            rows.append(f"{int(parts[0])},{int(parts[1])}")
+        except ValueError:
+            continue
+    return "\n".join(rows) + "\n"
+
+
+def build_hash(simulator: Path) -> str:
+    st = simulator.stat()
+    memo_key = (str(simulator), st.st_size, st.st_mtime_ns)
+    if memo_key not in _build_hashes:
+        h = hashlib.sha256()
+        with simulator.open("rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        _build_hashes[memo_key] = h.hexdigest()
+    return _build_hashes[memo_key]
+
+
+def run_key(
+    scenario: Path,
+    losses: Path,
+    simulator: Path,
+    *,
+    outputs: tuple[str, ...] = OUTPUT_ORDER,
+    overrides: tuple[tuple[str, str], ...] = (),
+    fmt: str = "csv",
+) -> str:
+    text = scenario.read_text(encoding="utf-8") + "".join(f"\n{k}={v}" for k, v in overrides)
+    h = hashlib.sha256()
+    h.update(b"scenario\0" + normalize_scenario(text).encode())
+    h.update(b"losses\0" + normalize_losses(losses.read_text(encoding="utf-8")).encode())
+    h.update(b"build\0" + build_hash(simulator).encode())
+    h.update(b"outputs\0" + ",".join(outputs).encode())
+    if fmt != "csv":
+        h.update(b"format\0" + fmt.encode())
+    return h.hexdigest()
+
+
+def _same_file(src: Path, dst: Path) -> bool:
+    if not dst.exists():
+        return False
+    a, b = src.stat(), dst.stat()
+    return a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.iterdir() if p.is_file())
+
+
+class RunCache:
+    def __init__(self, root: Path = DEFAULT_ROOT, max_bytes: int = DEFAULT_MAX_MB << 20):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def entry(self, key: str) -> Path:
+        return self.root / key
+
+    def fetch(self, key: str, outputs: dict[str, Path]) -> bool:
+        """Serve `outputs` from the cache; return False on a miss."""
+
+        entry = self.entry(key)
+        meta = entry / "meta.json"
+        if not meta.exists() or not all((entry / name).exists() for name in outputs):
+            return False
+        for name, dst in outputs.items():
+            src = entry / name
+            if not _same_file(src, dst):
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dst)
+        os.utime(meta)  # LRU bookkeeping
+        return True
+
+    def store(self, key: str, produced: Path, outputs: dict[str, Path], info: dict[str, str]) -> None:
+        """Move a freshly simulated `produced` directory into the cache and publish `outputs`."""
+
+        meta = {"created": time.time(), **info}
+        (produced / "meta.json").write_text(json.dumps(meta, indent=2) + "\n", encoding="utf-8")
+        entry = self.entry(key)
+        if entry.exists():
+            shutil.rmtree(entry)
+        produced.rename(entry)
+        for name, dst in outputs.items():
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(entry / name, dst)
+        self.evict(keep=key)
+
+    def entries(self) -> list[tuple[float, int, Path]]:
+        """(last_used, size_bytes, path) for every complete entry, oldest first."""
+
+        if not self.root.exists():
+            return []
+        out: list[tuple[float, int, Path]] = []
+        for entry in self.root.iterdir():
+            meta = entry / "meta.json"
+            if entry.is_dir() and meta.exists():
+                out.append((meta.stat().st_mtime, _dir_size(entry), entry))
+        return sorted(out)
+
+    def evict(self, *, keep: str | None = None) -> int:
+        """Drop least-recently-used entries until the cache fits; return bytes freed."""
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            freed += size
+        return freed
+
+
+def run_cached_batch(
+    cache: RunCache | None,
+    simulator: Path,
+    jobs: Sequence[BatchJob],
+    *,
+    force: bool = False,
+    cwd: Path | None = None,
+    threads: int = 1,
+    lockstep: int = DEFAULT_LOCKSTEP,
+    runner: Callable[..., list[BatchResult]] = run_batch,
+) -> list[bool]:
+    """Serve every job from the cache or simulate it; return a hit flag per job.
+
+    All misses are submitted in one call to `runner`: a single simulator
+    process in batch mode, or sim_fork.run_forked to share common prefixes.
+    With force=True every job is re-simulated and its cache entry refreshed.
+    Raises RuntimeError if any simulation failed (after storing the others).
+    """
+
+    hits = [False] * len(jobs)
+    if cache is None:
+        results = runner(jobs, simulator=simulator, threads=threads, lockstep=lockstep, cwd=cwd)
+        failed = [r for r in results if not r.ok]
+        if failed:
+            raise RuntimeError("; ".join(f"{jobs[r.job].scenario}: {r.message}" for r in failed))
+        return hits
+
+    cache.root.mkdir(parents=True, exist_ok=True)
+    pending: list[tuple[int, str, Path]] = []
+    scheduled: dict[str, int] = {}
+    duplicates: list[tuple[int, str]] = []
+    for i, job in enumerate(jobs):
+        names = tuple(n for n in OUTPUT_ORDER if n in job.outputs())
+        key = run_key(job.scenario, job.losses, simulator, outputs=names, overrides=job.overrides, fmt=job.format)
+        if key in scheduled:
+            duplicates.append((i, key))
+        elif not force and cache.fetch(key, job.outputs()):
+            hits[i] = True
+        else:
+            scheduled[key] = i
+            pending.append((i, key, Path(tempfile.mkdtemp(prefix=".tmp-", dir=cache.root))))
+
+    errors: list[str] = []
+    try:
+        to_run = [
+            replace(
+                jobs[i],
+                summary=produced / "summary" if jobs[i].summary is not None else None,
+                trace=produced / "trace" if jobs[i].trace is not None else None,
+            )
+            for i, _, produced in pending
+        ]
+        results = runner(to_run, simulator=simulator, threads=threads, lockstep=lockstep, cwd=cwd)
+        for (i, key, produced), res in zip(pending, results):
+            if res.ok:
+                info = {"scenario": str(jobs[i].scenario), "losses": str(jobs[i].losses)}
+                info.update({k: v for k, v in jobs[i].overrides})
+                cache.store(key, produced, jobs[i].outputs(), info)
+            else:
+                errors.append(f"{jobs[i].scenario}: {res.message}")
+        for i, key in duplicates:
+            hits[i] = cache.fetch(key, jobs[i].outputs())
+    finally:
+        for _, _, produced in pending:
+            if produced.exists():
+                shutil.rmtree(produced, ignore_errors=True)
+    if errors:
+        raise RuntimeError("; ".join(errors))
+    return hits
+
+
+def run_cached(
+    cache: RunCache | None,
+    simulator: Path,
+    scenario: Path,
+    losses: Path,
+    outputs: dict[str, Path],
+    *,
+    force: bool = False,
+    cwd: Path | None = None,
+) -> bool:
+    """Run the simulator unless an identical run is cached; return True on a cache hit.
+
+    `outputs` maps "summary"/"trace" to destination paths. With force=True the
+    simulation is re-run and the cache entry is refreshed.
+    """
+
+    job = BatchJob(scenario, losses, summary=outputs.get("summary"), trace=outputs.get("trace"))
+    return run_cached_batch(cache, simulator, [job], force=force, cwd=cwd)[0]
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Inspect or trim the simulator run cache")
+    ap.add_argument("--root", type=Path, default=DEFAULT_ROOT)
+    ap.add_argument("--max-mb", type=int, default=DEFAULT_MAX_MB)
+    ap.add_argument("--stats", action="store_true", help="print entry count and total size")
+    ap.add_argument("--evict", action="store_true", help="evict LRU entries down to --max-mb")
+    ap.add_argument("--clear", action="store_true", help="remove the whole cache")
+    args = ap.parse_args()
+
+    cache = RunCache(args.root, args.max_mb << 20)
+    if args.clear:
+        shutil.rmtree(cache.root, ignore_errors=True)
+        print(f"Cleared {cache.root}")
+    if args.evict:
+        print(f"Evicted {cache.evict() / (1 << 20):.1f} MiB")
+    if args.stats or not (args.clear or args.evict):
+        entries = cache.entries()
+        total = sum(size for _, size, _ in entries)
+        print(f"{cache.root}: {len(entries)} entries, {total / (1 << 20):.1f} MiB (limit {args.max_mb} MiB)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""SQLite catalog of simulator runs, for queries across experiments.
+
+The orchestrators (fresh_start/run_all.py, fresh_start/sweep_seeds.py,
+generate_pngs.py --regen-data) record every run they produce, simulated or
+served from the run cache, as one row of the `runs` table:
+- experiment / name: which orchestrator or sweep produced it, and the run label
+- the finalized scenario, one column per parameter (k_sym, incoming_hold_steps,
+  seed, ...), as the simulator sees it: defaults, aliases such as w_back and
+  clamping applied (`baseline_simulator --print-scenario`)
+- scenario_path, losses_path, losses_sha256 (of the normalized schedule, as in
+  run_cache.py) and run_key (the run cache key)
+- summary_path, trace_path, format and recorded_at
+- the summarize_metrics window metrics: first_loss_step and the mean of
+  mean_v/std_v/mean_gap/std_gap over steps [0, first_loss) (pre_*),
+  (first_loss, end] (post_*) and the last 20% (end_*)
+
+A run is identified by its summary path; recording it again replaces the row.
+The common sweep axes are indexed, so comparisons are plain SQL:
+
+  python3 Code/run_catalog.py query \\
+      "SELECT name, k_sym, end_mean_gap FROM runs WHERE incoming_hold_steps = 500 ORDER BY k_sym"
+  python3 Code/run_catalog.py add --experiment manual --scenario sample_scenario_w05.cfg \\
+      --losses losses_seeded.csv --summary summary_w05.csv
+  python3 Code/run_catalog.py --stats
+
+From Python:
+  with RunCatalog() as catalog:
+      catalog.record_jobs("seed_sweep", names, jobs, simulator=SIM, cwd=CODE)
+      rows = catalog.query("SELECT seed, end_std_gap FROM runs WHERE experiment = ?", ("seed_sweep",))
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import sqlite3
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Sequence
+
+import numpy as np
+
+from run_cache import OUTPUT_ORDER, normalize_losses, normalize_scenario, run_key
+from sim_batch import SIM, BatchJob
+from sim_io import load_loss_steps, load_summary
+from sim_windows import phase_windows, window_means
+
+BASE = Path(__file__).resolve().parent
+DEFAULT_DB = BASE / "run_catalog.sqlite"
+
+WINDOW_COLUMNS = ("mean_v", "std_v", "mean_gap", "std_gap")
+METRIC_COLUMNS = ("first_loss_step",) + tuple(
+    f"{window}_{col}" for window in ("pre", "post", "end") for col in WINDOW_COLUMNS
+)
+
+# Sweep axes indexed for lookups; each tuple is one index.
+INDEXED_AXES = (
+    ("experiment",),
+    ("k_sym",),
+    ("incoming_hold_steps", "k_sym"),
+    ("seed",),
+    ("controller_mode",),
+    ("losses_sha256",),
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    experiment TEXT NOT NULL,
+    name TEXT NOT NULL,
+    summary_path TEXT NOT NULL UNIQUE,
+    trace_path TEXT,
+    format TEXT NOT NULL,
+    scenario_path TEXT NOT NULL,
+    losses_path TEXT NOT NULL,
+    losses_sha256 TEXT NOT NULL,
+    run_key TEXT,
+    recorded_at TEXT NOT NULL,
+    first_loss_step INTEGER,
+    {metrics}
+)
+""".format(metrics=",\n    ".join(f"{col} REAL" for col in METRIC_COLUMNS[1:]))
+
+
+def window_metrics(rows: np.ndarray, first_loss: int) -> dict[str, float]:
+    """The summarize_metrics windows of summary rows (step + WINDOW_COLUMNS); NaN for empty windows."""
+
+    out: dict[str, float] = {"first_loss_step": first_loss}
+    out.update(window_means(rows, WINDOW_COLUMNS, [phase_windows], np.array([first_loss])))
+    return out
+
+
+def summary_metrics(summary: Path, first_loss: int) -> dict[str, float] | None:
+    """window_metrics() of a summary file; None when it has no rows."""
+
+    rows = load_summary(summary, ["step", *WINDOW_COLUMNS])
+    return window_metrics(rows, first_loss) if len(rows) else None
+
+
+def losses_sha256(losses: Path) -> str:
+    text = losses.read_text(encoding="utf-8") if losses.exists() else ""
+    return hashlib.sha256(normalize_losses(text).encode()).hexdigest()
+
+
+def finalized_scenario(simulator: Path, scenario: Path, overrides: Sequence[tuple[str, str]] = ()) -> dict[str, Any]:
+    """The scenario as the simulator runs it (defaults, aliases and clamping applied)."""
+
+    cmd = [str(simulator), "--print-scenario", str(scenario)]
+    for key, value in overrides:
+        cmd += ["--set", f"{key}={value}"]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class RunCatalog:
+    def __init__(self, path: Path = DEFAULT_DB):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute(_SCHEMA)
+        self._columns = {row["name"] for row in self.db.execute("PRAGMA table_info(runs)")}
+        self._scenarios: dict[str, dict[str, Any]] = {}
+        self._first_loss: dict[Path, int] = {}
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> RunCatalog:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _ensure_columns(self, values: dict[str, Any]) -> None:
+        for key, value in values.items():
+            if key in self._columns:
+                continue
+            kind = "TEXT" if isinstance(value, str) else "NUMERIC"  # the JSON writes 100.0 as 100
+            self.db.execute(f"ALTER TABLE runs ADD COLUMN {_quote(key)} {kind}")
+            self._columns.add(key)
+        for axes in INDEXED_AXES:
+            if all(a in self._columns for a in axes):
+                name = "runs_by_" + "_".join(axes)
+                self.db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON runs ({', '.join(map(_quote, axes))})")
+
+    def _scenario(self, simulator: Path, scenario: Path, overrides: Sequence[tuple[str, str]]) -> dict[str, Any]:
+        text = normalize_scenario(scenario.read_text(encoding="utf-8") + "".join(f"\n{k}={v}" for k, v in overrides))
+        if text not in self._scenarios:
+            self._scenarios[text] = finalized_scenario(simulator, scenario, overrides)
+        return self._scenarios[text]
+
+    def _first_loss_step(self, losses: Path) -> int:
+        if losses not in self._first_loss:
+            steps = load_loss_steps(losses) if losses.exists() else np.empty(0)
+            self._first_loss[losses] = int(steps[0]) if len(steps) else 0
+        return self._first_loss[losses]
+
+    def record(
+        self,
+        experiment: str,
+        name: str,
+        job: BatchJob,
+        *,
+        simulator: Path = SIM,
+        cwd: Path | None = None,
+        commit: bool = True,
+    ) -> None:
+        """Add or replace the row of a finished run (identified by its summary path).
+
+        Relative job paths are taken relative to `cwd`, as in sim_batch.run_batch().
+        """
+
+        base = cwd or Path.cwd()
+        if job.summary is None:
+            raise ValueError(f"{job.scenario}: only runs with a summary are catalogued")
+        summary, scenario, losses = ((base / p).resolve() for p in (job.summary, job.scenario, job.losses))
+        trace = (base / job.trace).resolve() if job.trace is not None else None
+        params = self._scenario(simulator, scenario, job.overrides)
+        outputs = tuple(n for n in OUTPUT_ORDER if n in job.outputs())
+        row: dict[str, Any] = {
+            "experiment": experiment,
+            "name": name,
+            "summary_path": str(summary),
+            "trace_path": str(trace) if trace is not None else None,
+            "format": job.format,
+            "scenario_path": str(scenario),
+            "losses_path": str(losses),
+            "losses_sha256": losses_sha256(losses),
+            "run_key": run_key(scenario, losses, simulator, outputs=outputs, overrides=job.overrides, fmt=job.format)
+            if losses.exists()
+            else None,
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        metrics = summary_metrics(summary, self._first_loss_step(losses)) or {}
+        row.update({k: None if isinstance(v, float) and math.isnan(v) else v for k, v in metrics.items()})
+        row.update({k: v for k, v in params.items() if k not in row})
+        self._ensure_columns(row)
+        cols = ", ".join(map(_quote, row))
+        marks = ", ".join("?" for _ in row)
+        self.db.execute(f"INSERT OR REPLACE INTO runs ({cols}) VALUES ({marks})", list(row.values()))
+        if commit:
+            self.db.commit()
+
+    def record_jobs(
+        self,
+        experiment: str,
+        names: Sequence[str],
+        jobs: Sequence[BatchJob],
+        *,
+        simulator: Path = SIM,
+        cwd: Path | None = None,
+    ) -> None:
+        """record() every job (in one transaction)."""
+
+        for name, job in zip(names, jobs):
+            self.record(experiment, name, job, simulator=simulator, cwd=cwd, commit=False)
+        self.db.commit()
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> list[sqlite3.Row]:
+        return self.db.execute(sql, params).fetchall()
+
+
+def _format(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Query or extend the SQLite run catalog")
+    ap.add_argument("--db", type=Path, default=DEFAULT_DB)
+    ap.add_argument("--stats", action="store_true", help="print the run count per experiment")
+    sub = ap.add_subparsers(dest="cmd")
+    query = sub.add_parser("query", help="run an SQL query and print the rows ';'-separated")
+    query.add_argument("sql")
+    add = sub.add_parser("add", help="record an existing run")
+    add.add_argument("--experiment", required=True)
+    add.add_argument("--name", help="run label (default: the summary file stem)")
+    add.add_argument("--scenario", type=Path, required=True)
+    add.add_argument("--losses", type=Path, required=True)
+    add.add_argument("--summary", type=Path, required=True)
+    add.add_argument("--trace", type=Path)
+    add.add_argument("--format", default="csv", choices=("csv", "bin", "z"))
+    add.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="scenario override of the run")
+    add.add_argument("--simulator", type=Path, default=SIM)
+    args = ap.parse_args()
+
+    with RunCatalog(args.db) as catalog:
+        if args.cmd == "query":
+            cursor = catalog.db.execute(args.sql)
+            if cursor.description:
+                print(";".join(d[0] for d in cursor.description))
+                for row in cursor:
+                    print(";".join(_format(v) for v in row))
+            catalog.db.commit()
+        elif args.cmd == "add":
+            overrides = tuple(tuple(kv.split("=", 1)) for kv in args.set)
+            job = BatchJob(
+                args.scenario, args.losses, summary=args.summary, trace=args.trace, format=args.format, overrides=overrides
+            )
+            catalog.record(args.experiment, args.name or args.summary.stem, job, simulator=args.simulator)
+        if args.stats or args.cmd is None:
+            rows = catalog.query("SELECT experiment, COUNT(*) AS runs FROM runs GROUP BY experiment ORDER BY experiment")
+            for row in rows:
+                print(f"{row['experiment']}: {row['runs']} runs")
+            print(f"{catalog.path}: {sum(row['runs'] for row in rows)} runs")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""Submit many simulations to one baseline_simulator process (--batch mode).
+
+Each BatchJob becomes one manifest line:
+  scenario=<cfg> losses=<csv> [summary=<csv>] [trace=<csv>] [key=value ...]
+with whitespace, '%' and non-printable characters in values %XX-escaped, so
+paths may contain spaces.
+
+`overrides` are applied on top of the scenario file inside the simulator, so
+seed sweeps and parameter sweeps need no temporary .cfg files. Scenario and
+loss files are parsed once per distinct path, and jobs run on `threads`
+worker threads inside the simulator. Up to `lockstep` jobs with the same
+n_total, steps and controller_mode are advanced together as one lockstep
+ensemble (same outputs as separate runs, better single-core throughput).
+
+`format="bin"` writes binary records instead of CSV, `format="z"` compressed
+records (read either with sim_io.py).
+Output decimation (summary_every, trace_every, trace_alive_only, trace_idx,
+event_window) is set the same way, as overrides.
+
+`resume`/`snapshot`/`snapshot_at` fork a job from / at a saved simulator
+state; sim_fork.run_forked() uses them to simulate shared prefixes once.
+
+`summary=STREAM` (with format="bin") writes no file: the summary is streamed
+through a pipe (baseline_simulator --stream) into `stream`, a
+sim_io.StreamDemux whose callbacks receive each job's records as they are
+simulated, e.g. for running window metrics (sim_windows.RunningWindows).
+
+Example:
+  jobs = [BatchJob(cfg, LOSSES, summary=out / f"summary_seed_{s}.csv", overrides=(("seed", str(s)),))
+          for s in range(1, 101)]
+  results = run_batch(jobs, threads=8)
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Sequence
+
+from sim_io import StreamDemux
+
+BASE = Path(__file__).resolve().parent
+SIM = BASE / "baseline_simulator"
+DEFAULT_LOCKSTEP = 16
+# Traces that are only scanned for spare insertions (alive 0 -> 1): every
+# 1000th step plus the steps around each loss/spare, instead of all of them.
+EVENT_TRACE_OVERRIDES = (("trace_every", "1000"), ("event_window", "1"))
+# BatchJob.summary of jobs whose summary goes to run_batch(stream=...).
+STREAM = Path("@stream")
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    scenario: Path
+    losses: Path
+    summary: Path | None = None
+    trace: Path | None = None
+    overrides: tuple[tuple[str, str], ...] = ()
+    format: str = "csv"
+    resume: Path | None = None
+    snapshot: Path | None = None
+    snapshot_at: str | None = None
+
+    def outputs(self) -> dict[str, Path]:
+        out: dict[str, Path] = {}
+        if self.summary is not None:
+            out["summary"] = self.summary
+        if self.trace is not None:
+            out["trace"] = self.trace
+        return out
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    job: int
+    ok: bool
+    metrics: dict[str, float]
+    message: str = ""
+
+
+def _escape(value: str) -> str:
+    """%XX-escape whitespace, '%' and non-printable characters (decoded by the simulator)."""
+
+    return "".join(
+        "".join(f"%{b:02X}" for b in c.encode()) if c.isspace() or c == "%" or not c.isprintable() else c
+        for c in value
+    )
+
+
+def _token(key: str, value: object) -> str:
+    if not key or any(c.isspace() or c in "=%" for c in key):
+        raise ValueError(f"invalid batch manifest key: {key!r}")
+    return f"{key}={_escape(str(value))}"
+
+
+def manifest_line(job: BatchJob) -> str:
+    tokens = [_token("scenario", job.scenario), _token("losses", job.losses)]
+    for name, path in job.outputs().items():
+        tokens.append(_token(name, path))
+    tokens += [_token(k, v) for k, v in job.overrides]
+    if job.format != "csv":
+        tokens.append(_token("format", job.format))
+    if job.resume is not None:
+        tokens.append(_token("resume", job.resume))
+    if job.snapshot is not None:
+        tokens.append(_token("snapshot", job.snapshot))
+        if job.snapshot_at is not None:
+            tokens.append(_token("snapshot_at", job.snapshot_at))
+    return " ".join(tokens)
+
+
+def parse_result(line: str) -> BatchResult | None:
+    fields: dict[str, str] = {}
+    head, _, message = line.partition(" message=")
+    for tok in head.split():
+        key, sep, value = tok.partition("=")
+        if sep:
+            fields[key] = value
+    if "job" not in fields or "status" not in fields:
+        return None
+    metrics = {k: float(v) for k, v in fields.items() if k not in ("job", "status")}
+    return BatchResult(int(fields["job"]), fields["status"] == "ok", metrics, message.strip())
+
+
+def run_batch(
+    jobs: Sequence[BatchJob],
+    *,
+    simulator: Path = SIM,
+    threads: int = 1,
+    lockstep: int = DEFAULT_LOCKSTEP,
+    cwd: Path | None = None,
+    on_result: Callable[[BatchResult], None] | None = None,
+    stream: StreamDemux | None = None,
+) -> list[BatchResult]:
+    """Run all jobs in one simulator process; results are returned in job order.
+
+    `on_result` is called as each job completes (completion order), e.g. for
+    progress reporting. A failing job does not stop the others. Summaries of
+    jobs with summary=STREAM are fed to `stream` (required for them) from a
+    reader thread, concurrently with `on_result`; all of them have been fed
+    when run_batch() returns. Only jobs with an ok result have complete rows.
+    """
+
+    if not jobs:
+        return []
+    manifest = "".join(manifest_line(j) + "\n" for j in jobs)
+    cmd = [str(simulator), "--batch", "-", "--jobs", str(max(1, threads)), "--lockstep", str(max(1, lockstep))]
+    read_fd = write_fd = -1
+    if stream is not None:
+        read_fd, write_fd = os.pipe()
+        cmd += ["--stream", f"/dev/fd/{write_fd}"]
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            cwd=str(cwd) if cwd else None,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            pass_fds=(write_fd,) if stream is not None else (),
+        )
+    finally:
+        if stream is not None:
+            os.close(write_fd)
+    assert proc.stdin is not None and proc.stdout is not None and proc.stderr is not None
+
+    stream_errors: list[BaseException] = []
+
+    def read_stream() -> None:
+        assert stream is not None
+        with os.fdopen(read_fd, "rb", buffering=0) as pipe:
+            while data := pipe.read(1 << 16):
+                if stream_errors:
+                    continue  # keep draining so the simulator does not block
+                try:
+                    stream.feed(data)
+                except BaseException as exc:  # re-raised once the simulator is done
+                    stream_errors.append(exc)
+
+    reader = threading.Thread(target=read_stream, daemon=True) if stream is not None else None
+    if reader is not None:
+        reader.start()
+    proc.stdin.write(manifest)
+    proc.stdin.close()
+
+    results: dict[int, BatchResult] = {}
+    for line in proc.stdout:
+        res = parse_result(line)
+        if res is None:
+            continue
+        results[res.job] = res
+        if on_result is not None:
+            on_result(res)
+    stderr = proc.stderr.read().strip()
+    proc.wait()
+    if reader is not None:
+        reader.join()
+        if stream_errors:
+            raise stream_errors[0]
+
+    out: list[BatchResult] = []
+    for i in range(len(jobs)):
+        if i not in results:
+            reason = f"simulator exited with {proc.returncode}" + (f": {stderr.splitlines()[-1]}" if stderr else "")
+            results[i] = BatchResult(i, False, {}, reason)
+            if on_result is not None:
+                on_result(results[i])
+        out.append(results[i])
+    return out
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""Downsample summary series to a figure's pixel width without losing extremes.
+
+A stride keeps every k-th step and drops whatever lies between, including
+the post-loss speed spikes and gap minima the figures are about. Instead,
+the rows are reduced to what a `width_px` wide plot can show:
+
+- "minmax" (M4): per pixel column, the first, last, minimum and maximum row
+  of each series. A line through these points rasterizes like the full
+  series, so peaks and troughs are always drawn. Computed with reduceat
+  over the whole series, no per-bucket Python loop.
+- "lttb": Largest-Triangle-Three-Buckets, one row per pixel column chosen
+  to keep the visual shape of a single series (fewer points, smoother).
+
+Series shorter than what the method would emit are returned unchanged, so
+a 3,000-step run on a 1,200 px figure is drawn in full (minmax) and a
+60,000-step run is reduced to at most 4 rows per pixel column per series.
+`keep_steps` (e.g. the loss steps) are always kept.
+
+Bands (mean ± std) are filled areas, so band_envelope() reduces them to
+the lowest lower and highest upper bound of each pixel column: a polygon
+with two vertices per column that reaches every extreme of the full band.
+
+  rows = load_summary(path, ["step", "mean_v", "std_v"])
+  line = downsample(rows, [rows["mean_v"]], width_px=1200)
+  x, lower, upper = band_envelope(rows["step"], rows["mean_v"] - rows["std_v"], rows["mean_v"] + rows["std_v"], 1200)
+"""
+
+from __future__ import annotations
+
+from typing import Sequence
+
+import numpy as np
+
+METHODS = ("minmax", "lttb")
+
+
+def pixel_columns(x: np.ndarray, buckets: int) -> np.ndarray:
+    """Start index of each non-empty pixel column of sorted x."""
+
+    span = float(x[-1] - x[0])
+    col = np.minimum(((x - x[0]) * (buckets / span)).astype(np.int64), buckets - 1) if span > 0 else np.zeros(len(x), np.int64)
+    return np.flatnonzero(np.diff(col, prepend=-1))
+
+
+def minmax_indices(x: np.ndarray, series: Sequence[np.ndarray], buckets: int) -> np.ndarray:
+    """Sorted row indices of the first/last/min/max row of every series in every pixel column (M4).
+
+    NaNs are ignored for the extremes; an all-NaN column keeps its first and
+    last row, so gaps in a series stay gaps.
+    """
+
+    n = len(x)
+    if n <= 4 * buckets:
+        return np.arange(n)
+    starts = pixel_columns(np.asarray(x, dtype=np.float64), buckets)
+    counts = np.diff(np.append(starts, n))
+    column = np.repeat(np.arange(len(starts)), counts)
+    picks = [starts, starts + counts - 1]
+    for y in series:
+        y = np.asarray(y, dtype=np.float64)
+        for reduce in (np.fmin, np.fmax):
+            extreme = reduce.reduceat(y, starts)
+            hit = np.flatnonzero(y == extreme[column])
+            _, first = np.unique(column[hit], return_index=True)
+            picks.append(hit[first])
+    return np.unique(np.concatenate(picks))
+
+
+def band_envelope(x: np.ndarray, lower: np.ndarray, upper: np.ndarray, buckets: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(first x, min of lower, max of upper) of every pixel column; unchanged if not longer than 2 * buckets.
+
+    NaNs are ignored; an all-NaN column stays NaN (a gap in the band).
+    """
+
+    if len(x) <= 2 * buckets:
+        return x, lower, upper
+    starts = pixel_columns(np.asarray(x, dtype=np.float64), buckets)
+    return x[starts], np.fmin.reduceat(np.asarray(lower, dtype=np.float64), starts), np.fmax.reduceat(np.asarray(upper, dtype=np.float64), starts)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Row indices chosen by Largest-Triangle-Three-Buckets (first and last row always included).
+
+    The bucket bounds and the per-bucket means that each step looks ahead to
+    are computed for the whole series at once; selecting a row depends on the
+    previous selection, so the selection walks the buckets.
+    """
+
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out - 2 buckets of rows 1..n-2
+    finite = np.isfinite(y)
+    sums_x = np.add.reduceat(x[:-1], edges[:-1])
+    sums_y = np.add.reduceat(np.where(finite, y, 0.0)[:-1], edges[:-1])
+    finite_n = np.add.reduceat(finite[:-1].astype(np.int64), edges[:-1])
+    mean_x = sums_x / np.diff(edges)
+    mean_y = np.divide(sums_y, finite_n, out=np.full(len(sums_y), np.nan), where=finite_n > 0)
+    # look-ahead point of bucket i: the mean of bucket i + 1, or the last row
+    ahead_x = np.append(mean_x[1:], x[-1])
+    ahead_y = np.append(mean_y[1:], y[-1])
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - ahead_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (ahead_y[i] - y[a]))
+        a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        out[i + 1] = a
+    return out
+
+
+def downsample(
+    rows: np.ndarray,
+    series: Sequence[np.ndarray],
+    width_px: int,
+    *,
+    method: str = "minmax",
+    keep_steps: Sequence[int] | np.ndarray | None = None,
+) -> np.ndarray:
+    """The rows (with a "step" column) needed to draw `series` over `width_px` pixels.
+
+    "minmax" keeps the extremes of every series; "lttb" follows the first one.
+    """
+
+    if method not in METHODS:
+        raise ValueError(f"unknown downsampling method {method!r} (expected one of {', '.join(METHODS)})")
+    x = rows["step"]
+    if method == "minmax":
+        idx = minmax_indices(x, series, max(1, width_px))
+    else:
+        idx = lttb_indices(x, series[0], max(3, width_px))
+    if len(idx) == len(rows):
+        return rows
+    if keep_steps is not None and len(keep_steps):
+        idx = np.union1d(idx, np.flatnonzero(np.isin(x, keep_steps)))
+    return rows[idx]
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""Prefix-shared sweeps: simulate the common start of many variants once.
+
+Variants of a scenario often differ only in settings that the simulator does
+not read before the first loss (seed, spare delays, intervals and caps) or
+before the first spare insertion (incoming_hold_steps, incoming_v). Their
+runs are identical up to that step, so run_forked() arranges the jobs in a
+prefix tree:
+
+  core settings + loss schedule  -> trunk, stopped at the first loss
+    + spare settings             -> branch, resumed there, stopped at the first spare insertion
+      + incoming settings        -> leaf, resumed there, runs to the end
+
+Every shared prefix is simulated once (baseline_simulator snapshot=/resume=,
+see SIMULATOR_README.md) and each job's summary/trace is stitched together
+from the parts, so outputs and metrics are byte-identical to separate runs.
+Nodes with a single child are not split. With preventive spares (inserted
+before any loss) the spare settings count as core settings, and a missing or
+empty loss schedule (generated from the seed) disables sharing.
+
+run_forked() takes and returns the same things as sim_batch.run_batch():
+  results = run_forked(jobs, threads=8, cwd=CODE)
+
+Streamed summaries (summary=STREAM) are forked too: the records of a shared
+prefix are kept in memory and replayed into `stream` ahead of each job's own
+records, under the job's header. Either all or none of the jobs stream.
+"""
+
+from __future__ import annotations
+
+import shutil
+import tempfile
+from dataclasses import dataclass, field, replace
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from run_cache import normalize_losses, normalize_scenario
+from sim_batch import DEFAULT_LOCKSTEP, SIM, STREAM, BatchJob, BatchResult, run_batch
+from sim_io import OUTPUT_MAGIC, StreamDemux, read_header
+
+# Read from the first loss on (the loss-to-spare delay is drawn at the loss).
+SPARE_KEYS = frozenset(
+    {
+        "seed",
+        "resilience",
+        "num_losses",
+        "min_spare_delay_steps",
+        "min_spare_interval_steps",
+        "spare_interval_min_steps",
+        "spare_interval_max_steps",
+        "extra_spares",
+        "max_spares",
+        "loss_to_spare_delay_min_steps",
+        "loss_to_spare_delay_max_steps",
+    }
+)
+# Read from the first spare insertion on.
+INCOMING_KEYS = frozenset({"incoming_hold_steps", "incoming_v"})
+
+
+@dataclass
+class _Part:
+    """Outputs of one simulated segment, in tree order."""
+
+    summary: Path | None = None
+    trace: Path | None = None
+    rows: list[np.ndarray] = field(default_factory=list)  # of a streamed summary
+    header: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Leaf:
+    job: int
+    resume: Path | None = None
+    parts: list[_Part] = field(default_factory=list)
+
+
+def _resolve(path: Path, cwd: Path | None) -> Path:
+    return cwd / path if cwd is not None and not path.is_absolute() else path
+
+
+def prefix_keys(job: BatchJob, cwd: Path | None = None) -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """(trunk key, branch key) of a job; equal keys mean equal runs up to the fork point.
+
+    Settings keep their order (later lines win and some keys alias others),
+    so only the order-independent spare and incoming keys are split off.
+    """
+
+    text = _resolve(job.scenario, cwd).read_text(encoding="utf-8") + "".join(f"\n{k}={v}" for k, v in job.overrides)
+    lines = normalize_scenario(text).splitlines()
+    keys = [line.split("=", 1)[0] for line in lines]
+    preventive = any(k == "preventive_spares_frac" and float(line.split("=", 1)[1]) > 0 for k, line in zip(keys, lines))
+    late = INCOMING_KEYS if preventive else SPARE_KEYS | INCOMING_KEYS
+    losses_path = _resolve(job.losses, cwd)
+    losses = normalize_losses(losses_path.read_text(encoding="utf-8")) if losses_path.exists() else "\n"
+    if losses == "\n":
+        late = frozenset()  # the schedule is generated from the seed
+    trunk = tuple(line for k, line in zip(keys, lines) if k not in late) + (losses, f"format={job.format}")
+    branch = tuple(line for k, line in zip(keys, lines) if k in SPARE_KEYS and k in late)
+    return trunk, branch
+
+
+def _stitch(parts: list[Path], dst: Path, fmt: str = "csv") -> None:
+    """Concatenate output parts under a single header.
+
+    CSV keeps the first part's header line. Binary and compressed files take
+    the JSON header of the last part, which holds the job's own scenario
+    (compressed chunks are self-contained and concatenate like records; the
+    chunk boundaries differ from a single run's, the decoded rows do not).
+    """
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    with dst.open("wb") as out:
+        if fmt != "csv":
+            offsets = [read_header(part, OUTPUT_MAGIC[fmt])[1] for part in parts]
+            with parts[-1].open("rb") as f:
+                out.write(f.read(offsets[-1]))
+        for k, part in enumerate(parts):
+            with part.open("rb") as f:
+                if fmt != "csv":
+                    f.seek(offsets[k])
+                elif k > 0:
+                    f.readline()
+                shutil.copyfileobj(f, out)
+
+
+def _keep_rows(parts: list[_Part], k: int, header: dict[str, Any], rows: np.ndarray) -> None:
+    parts[k].header = header
+    parts[k].rows.append(rows)
+
+
+def run_forked(
+    jobs: Sequence[BatchJob],
+    *,
+    simulator: Path = SIM,
+    threads: int = 1,
+    lockstep: int = DEFAULT_LOCKSTEP,
+    cwd: Path | None = None,
+    on_result: Callable[[BatchResult], None] | None = None,
+    stream: StreamDemux | None = None,
+) -> list[BatchResult]:
+    """Run all jobs, simulating every shared prefix once; results are returned in job order."""
+
+    if not jobs:
+        return []
+    streamed = {i for i, job in enumerate(jobs) if job.summary == STREAM}
+    if streamed and len(streamed) != sum(job.summary is not None for job in jobs):
+        raise ValueError("run_forked: either all or none of the summaries can be streamed")
+    tree: dict[tuple[str, ...], dict[tuple[str, ...], list[int]]] = {}
+    for i, job in enumerate(jobs):
+        trunk, branch = prefix_keys(job, cwd)
+        tree.setdefault(trunk, {}).setdefault(branch, []).append(i)
+
+    results: dict[int, BatchResult] = {}
+
+    def finish(res: BatchResult) -> None:
+        results[res.job] = res
+        if on_result is not None:
+            on_result(res)
+
+    with tempfile.TemporaryDirectory(prefix="sim_fork-") as tmp_dir:
+        tmp = Path(tmp_dir)
+        leaves = {i: _Leaf(i) for i in range(len(jobs))}
+        # stage 1 runs from step 0, stage 2 resumes from stage 1 snapshots
+        stages: list[list[tuple[BatchJob, list[int], _Part]]] = [[], []]
+
+        def prefix_job(members: list[int], stage: int, snapshot_at: str, resume: Path | None) -> Path:
+            node = len(stages[0]) + len(stages[1])
+            wants = [jobs[i].outputs() for i in members]
+            part = _Part(
+                (STREAM if streamed else tmp / f"summary_{node}.csv") if any("summary" in w for w in wants) else None,
+                tmp / f"trace_{node}.csv" if any("trace" in w for w in wants) else None,
+            )
+            snapshot = tmp / f"state_{node}.bin"
+            job = replace(
+                jobs[members[0]],
+                summary=part.summary,
+                trace=part.trace,
+                resume=resume,
+                snapshot=snapshot,
+                snapshot_at=snapshot_at,
+            )
+            stages[stage].append((job, members, part))
+            for i in members:
+                leaves[i].parts.append(part)
+                leaves[i].resume = snapshot
+            return snapshot
+
+        for branches in tree.values():
+            members = [i for group in branches.values() for i in group]
+            if len(members) < 2:
+                continue
+            trunk = prefix_job(members, 0, "first_loss", None) if len(branches) > 1 else None
+            for group in branches.values():
+                if len(group) > 1:
+                    prefix_job(group, 1 if trunk else 0, "first_spare", trunk)
+
+        for stage in stages:
+            if not stage:
+                continue
+            parts = [part for _, _, part in stage]
+            stage_results = run_batch(
+                [job for job, _, _ in stage],
+                simulator=simulator,
+                threads=threads,
+                lockstep=lockstep,
+                cwd=cwd,
+                stream=StreamDemux(partial(_keep_rows, parts), lambda k: None) if streamed else None,
+            )
+            for (_, members, _), res in zip(stage, stage_results):
+                if res.ok:
+                    continue
+                for i in members:
+                    if i not in results:
+                        finish(BatchResult(i, False, {}, f"shared prefix failed: {res.message}"))
+
+        pending = [leaf for i, leaf in leaves.items() if i not in results]
+        leaf_jobs = [
+            replace(
+                jobs[leaf.job],
+                summary=tmp / f"summary_leaf_{leaf.job}.csv" if jobs[leaf.job].summary not in (None, STREAM) else jobs[leaf.job].summary,
+                trace=tmp / f"trace_leaf_{leaf.job}.csv" if jobs[leaf.job].trace is not None else None,
+                resume=leaf.resume,
+            )
+            if leaf.parts
+            else jobs[leaf.job]
+            for leaf in pending
+        ]
+
+        def on_leaf(res: BatchResult) -> None:
+            leaf = pending[res.job]
+            if res.ok and leaf.parts:
+                own = leaf_jobs[res.job]
+                for name, dst in jobs[leaf.job].outputs().items():
+                    if dst == STREAM:
+                        continue
+                    chain = [getattr(part, name) for part in leaf.parts] + [getattr(own, name)]
+                    _stitch(chain, _resolve(dst, cwd), jobs[leaf.job].format)
+            finish(replace(res, job=leaf.job))
+
+        replayed: set[int] = set()
+
+        def replay(k: int, header: dict[str, Any]) -> None:
+            """Feed the shared-prefix rows of leaf job k (once, before its own)."""
+
+            if k not in replayed:
+                replayed.add(k)
+                for part in pending[k].parts:
+                    for rows in part.rows:
+                        stream.on_rows(pending[k].job, header, rows)
+
+        def leaf_rows(k: int, header: dict[str, Any], rows: np.ndarray) -> None:
+            replay(k, header)
+            stream.on_rows(pending[k].job, header, rows)
+
+        def leaf_end(k: int) -> None:
+            if pending[k].parts:
+                replay(k, pending[k].parts[-1].header)  # a leaf without rows of its own
+            stream.on_end(pending[k].job)
+
+        run_batch(
+            leaf_jobs,
+            simulator=simulator,
+            threads=threads,
+            lockstep=lockstep,
+            cwd=cwd,
+            on_result=on_leaf,
+            stream=StreamDemux(leaf_rows, leaf_end) if stream is not None else None,
+        )
+
+    return [results[i] for i in range(len(jobs))]
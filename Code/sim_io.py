@@ -0,0 +1,1081 @@
+#!/usr/bin/env python3
+"""Read baseline_simulator binary outputs (--format bin) as NumPy arrays.
+
+A binary summary/trace file is "BSIMREC1", a little-endian uint32 header
+length, a JSON header and fixed-width records (the simulator's SummaryRow /
+TraceRow structs, see baseline_simulator.c). load() memory-maps the records
+as a structured array, so nothing is parsed and only the pages actually used
+are read:
+
+  from sim_io import load, trace_grid
+  summary = load(Path("summary_w05_seed.bin"))
+  summary["mean_v"]                      # one record per written step
+  summary.header["scenario"]["k_sym"]    # finalized scenario of the run
+  grid = trace_grid(load(Path("trace_w05_seed.bin")))
+  grid["gap_f"][:, 3]                    # (steps, n_total); NaN for dead drones
+
+CSV remains available as an export, with the simulator's exact formatting:
+  python3 Code/sim_io.py export summary_w05_seed.bin summary_w05_seed.csv
+  python3 Code/sim_io.py info trace_w05_seed.bin
+
+Compressed outputs (--format z, "BSIMZRC1", e.g. trace.trace.z) hold the
+same records to the CSV's 1e-6 precision, delta-coded per drone across steps
+and deflated in independent chunks; they are decoded chunk by chunk. Convert
+existing files with `python3 Code/sim_io.py compress trace.csv trace.trace.z`.
+
+load_summary()/load_trace() read any of these formats into the same structured
+arrays, which is what the plot and analysis scripts use. CSV files are parsed
+in blocks by NumPy (no per-row Python objects); column selection, a stride
+and a step range are applied to each block as it is parsed:
+
+  summary = load_summary(Path("summary_w05_seed.csv"), ["step", "mean_v"], stride=8, keep_steps=loss_steps)
+  trace = load_trace(Path("trace_w05_seed.csv"), ["step", "idx", "alive"], start=1400, stop=1500)
+  spare_steps(trace)                     # steps with an alive 0 -> 1 transition
+
+step_chunks() reads a file in consecutive step windows of about CHUNK_ROWS
+rows, for consumers that must not hold a whole trace in memory.
+
+trace_events() returns the loss and spare events of a trace file. They are
+computed once and kept in a small <trace>.events.json sidecar, which is
+checked against the trace's size/mtime and, if those changed, its hash:
+
+  events = trace_events(Path("trace_w05_seed.csv"), dt=0.1)
+  events.spares["step"], events.losses["idx"], events.spares["time"]
+  python3 Code/sim_io.py events trace_w05_seed.csv
+
+A step range (start/stop) on a CSV file is served through a step-offset
+index, <file>.steps.idx, built on first use (or ahead of time with
+`python3 Code/sim_io.py index trace.csv [--every K]`): only the bytes of the
+requested steps are read, so a window of a 10^7-row trace costs O(rows
+returned). Binary files need no index; their records are bisected.
+
+StreamDemux splits a summary stream (baseline_simulator --batch --stream) into
+per-job record arrays as they arrive, for consumers that never touch a file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterator, Sequence, TextIO
+
+import numpy as np
+from numpy.lib import recfunctions
+
+try:
+    import zstandard
+except ImportError:  # optional: compressed outputs fall back to zlib
+    zstandard = None
+
+MAGIC = b"BSIMREC1"
+ZMAGIC = b"BSIMZRC1"
+PREFIX_SIZE = len(MAGIC) + 4
+OUTPUT_MAGIC = {"bin": MAGIC, "z": ZMAGIC}
+
+CSV_HEADERS = {
+    "summary": "step;alive;mean_v;min_v;max_v;std_v;min_gap;max_gap;mean_gap;std_gap\n",
+    "trace": "step;idx;alive;s;v;gap_f;gap_b\n",
+}
+INT_COLUMNS = frozenset({"step", "idx", "alive"})
+CSV_BLOCK_BYTES = 1 << 18
+CHUNK_ROWS = 1 << 20
+
+# byte constants of _fold_digits; _FIXED_PAD separators keep word reads in bounds
+_ASCII_ZEROS = np.uint64(0x3030303030303030)
+_ASCII_SIX = np.uint64(0x7676767676767676)
+_HIGH_BITS = np.uint64(0x8080808080808080)
+_LOW_BYTES = np.array([(1 << 8 * (8 - n)) - 1 for n in range(9)], dtype=np.uint64)
+_FIXED_PAD = 16
+
+
+class Records(np.memmap):
+    """Structured memmap of a binary output file; `header` is its JSON header."""
+
+    header: dict[str, Any]
+
+
+def is_binary(path: Path) -> bool:
+    with path.open("rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def file_format(path: Path) -> str:
+    """"bin", "z" (compressed records) or "csv", from the first bytes of an output file."""
+
+    with path.open("rb") as f:
+        magic = f.read(len(MAGIC))
+    return {m: fmt for fmt, m in OUTPUT_MAGIC.items()}.get(magic, "csv")
+
+
+def read_header(path: Path, magic: bytes = MAGIC) -> tuple[dict[str, Any], int]:
+    """JSON header of a binary/compressed output (or step index) file and the byte offset of its first record."""
+
+    with path.open("rb") as f:
+        prefix = f.read(PREFIX_SIZE)
+        if len(prefix) != PREFIX_SIZE or prefix[: len(magic)] != magic:
+            what = {MAGIC: "binary output", ZMAGIC: "compressed output"}.get(magic, "step index")
+            raise ValueError(f"{path}: not a baseline_simulator {what}")
+        (length,) = struct.unpack("<I", prefix[len(magic) :])
+        header = json.loads(f.read(length).decode("utf-8"))
+    return header, PREFIX_SIZE + length
+
+
+def record_dtype(header: dict[str, Any]) -> np.dtype:
+    cols = header["columns"]
+    return np.dtype(
+        {
+            "names": [c["name"] for c in cols],
+            "formats": [c["dtype"] for c in cols],
+            "offsets": [c["offset"] for c in cols],
+            "itemsize": header["record_size"],
+        }
+    )
+
+
+def load(path: Path, *, mode: str = "r") -> Records:
+    """Memory-map all records of a binary summary or trace file."""
+
+    header, offset = read_header(path)
+    dtype = record_dtype(header)
+    count = (path.stat().st_size - offset) // dtype.itemsize
+    if count == 0:
+        records = np.empty(0, dtype=dtype).view(Records)
+    else:
+        records = Records(path, dtype=dtype, mode=mode, offset=offset, shape=(count,))
+    records.header = header
+    return records
+
+
+def trace_grid(trace: np.ndarray) -> np.ndarray:
+    """(steps, drones) view of trace records with the same drones at every step.
+
+    Holds for full traces and for traces filtered with trace_idx/trace_every,
+    not for trace_alive_only (the drone count varies); raises ValueError then.
+    """
+
+    if len(trace) == 0:
+        return trace.reshape(0, 0)
+    per_step = int(np.searchsorted(trace["step"], trace["step"][0], side="right"))
+    if len(trace) % per_step != 0:
+        raise ValueError("trace rows per step vary; use the flat records")
+    grid = trace.reshape(-1, per_step)
+    if not (grid["idx"] == grid["idx"][0]).all():
+        raise ValueError("traced drones vary between steps; use the flat records")
+    return grid
+
+
+def _write_summary_csv(records: np.ndarray, out: TextIO) -> None:
+    names = CSV_HEADERS["summary"].strip().split(";")
+    cols = [records[n].tolist() for n in names]
+    out.writelines("%d;%d;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f;%.6f\n" % row for row in zip(*cols))
+
+
+def _write_trace_csv(records: np.ndarray, out: TextIO) -> None:
+    names = CSV_HEADERS["trace"].strip().split(";")
+    for row in zip(*(records[n].tolist() for n in names)):
+        if row[2]:
+            out.write("%d;%d;%d;%.6f;%.6f;%.6f;%.6f\n" % row)
+        else:
+            out.write("%d;%d;%d;%.6f;%.6f;;\n" % row[:5])
+
+
+def export_csv(path: Path, dst: Path) -> None:
+    """Write a binary or compressed output file as the CSV the simulator would have written."""
+
+    fmt = file_format(path)
+    kind = read_header(path, OUTPUT_MAGIC.get(fmt, MAGIC))[0]["kind"]
+    blocks = read_chunks(path) if fmt == "z" else [load(path)]
+    with dst.open("w", encoding="utf-8", newline="") as out:
+        out.write(CSV_HEADERS[kind])
+        for records in blocks:
+            (_write_summary_csv if kind == "summary" else _write_trace_csv)(records, out)
+
+
+# ---- Compressed records (--format z, .trace.z) --------------------------------
+# Chunks of whole steps. Doubles are rounded to 1e-6 (the CSV precision),
+# every column is delta-coded twice against the row `lag` rows earlier (the
+# same drone one step before), zigzag-coded, byte-transposed and deflated;
+# see the "Compressed output" comment in baseline_simulator.c for the layout.
+
+ZCHUNK_HEAD = struct.Struct("<iiIII")  # first_step, last_step, rows, lag, size
+ZCHUNK_ROWS = 65536
+ZCODECS = ("zlib", "zstd")
+ZDECIMALS = 6
+ZNAN = np.iinfo(np.int64).min
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return zlib.compress(data, 1)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("reading zstd-compressed outputs needs the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _quantize(x: np.ndarray) -> np.ndarray:
+    """x * 10**ZDECIMALS rounded as "%.6f" rounds x (the CSV writer); NaN -> ZNAN.
+
+    The product is off by up to half an ulp, which only matters next to a
+    half-way point: there the digits are taken from the formatted value.
+    """
+
+    x = np.nan_to_num(x, nan=0.0)
+    r = x * 10.0**ZDECIMALS
+    q = np.rint(r)
+    near = np.abs(np.abs(r - np.trunc(r)) - 0.5) <= 4 * np.finfo(np.float64).eps * np.abs(r)
+    for i in np.flatnonzero(near):
+        q[i] = int(f"{x[i]:.{ZDECIMALS}f}".replace(".", ""))
+    return q.astype(np.int64)
+
+
+def _encode_chunk(records: np.ndarray, codec: str) -> bytes:
+    steps = records["step"]
+    rows = len(records)
+    lag = int(np.argmax(steps != steps[0])) or rows
+    planes = []
+    for name in records.dtype.names:
+        x = np.asarray(records[name])
+        if x.dtype.kind == "f":
+            q = np.where(np.isnan(x), ZNAN, _quantize(x))
+        else:
+            q = x.astype(np.int64)
+        for _ in range(2):
+            q[lag:] = q[lag:] - q[:-lag]
+        width = x.dtype.itemsize
+        bits = 8 * width
+        d = q.astype(f"=i{width}")
+        z = ((d << 1) ^ (d >> (bits - 1))).view(f"=u{width}")
+        planes.append(z.astype(f"<u{width}").view(np.uint8).reshape(rows, width).T.tobytes())
+    data = _compress(codec, b"".join(planes))
+    return ZCHUNK_HEAD.pack(int(steps[0]), int(steps[-1]), rows, lag, len(data)) + data
+
+
+def _decode_chunk(data: bytes, rows: int, lag: int, dtype: np.dtype, decimals: int) -> np.ndarray:
+    records = np.zeros(rows, dtype=dtype)
+    blocks = -(-rows // lag)
+    pos = 0
+    for name in dtype.names:
+        field = dtype.fields[name][0]
+        width = field.itemsize
+        planes = np.frombuffer(data, dtype=np.uint8, count=rows * width, offset=pos).reshape(width, rows)
+        pos += rows * width
+        z = np.ascontiguousarray(planes.T).view(f"<u{width}")[:, 0].astype(f"=u{width}", copy=False)
+        d = (z >> 1) ^ (0 - (z & 1))
+        if blocks * lag != rows:
+            d = np.concatenate((d, np.zeros(blocks * lag - rows, dtype=d.dtype)))
+        # undo x[i] - x[i - lag] twice: running sums down each column of the (blocks, lag) grid
+        grid = d.reshape(blocks, lag)
+        for _ in range(2):
+            grid = np.cumsum(grid, axis=0, dtype=d.dtype)
+        q = grid.reshape(-1)[:rows].view(f"=i{width}")
+        if field.kind == "f":
+            values = q / 10.0**decimals
+            values[q == ZNAN] = np.nan
+            records[name] = values
+        else:
+            records[name] = q
+    return records
+
+
+def chunk_table(path: Path) -> list[tuple[int, int, int, int, int, int]]:
+    """(first_step, last_step, rows, lag, size, data offset) of each chunk of a compressed file.
+
+    Only the chunk heads are read; the data is skipped.
+    """
+
+    _, offset = read_header(path, ZMAGIC)
+    heads = []
+    with path.open("rb") as f:
+        f.seek(offset)
+        while len(head := f.read(ZCHUNK_HEAD.size)) == ZCHUNK_HEAD.size:
+            entry = ZCHUNK_HEAD.unpack(head)
+            heads.append((*entry, f.tell()))
+            f.seek(entry[4], 1)
+    return heads
+
+
+def read_chunks(path: Path, *, start: int | None = None, stop: int | None = None) -> Iterator[np.ndarray]:
+    """Records of a compressed summary/trace, one decoded chunk at a time.
+
+    Chunks entirely outside [start, stop) are skipped without decompressing;
+    the rows of the chunks returned are not filtered.
+    """
+
+    header, _ = read_header(path, ZMAGIC)
+    dtype = record_dtype(header)
+    codec, decimals = header.get("codec", "zlib"), header.get("decimals", ZDECIMALS)
+    with path.open("rb") as f:
+        for first, last, rows, lag, size, offset in chunk_table(path):
+            if (start is not None and last < start) or (stop is not None and first >= stop):
+                continue
+            f.seek(offset)
+            yield _decode_chunk(_decompress(codec, f.read(size)), rows, lag, dtype, decimals)
+
+
+class ZWriter:
+    """Streaming writer of a compressed summary/trace (the simulator's --format z).
+
+    Doubles are kept to 1e-6, as in the CSV outputs, and must be below 9.2e12
+    in magnitude. Records (in step order, with the `header`'s record layout) are buffered
+    and written as a chunk once `chunk_rows` rows of whole steps are pending;
+    close() writes the rest. `codec` is "zstd" (needs zstandard) or "zlib",
+    the default when zstandard is missing; the simulator always writes zlib.
+    """
+
+    def __init__(
+        self, path: Path, header: dict[str, Any], *, codec: str | None = None, chunk_rows: int = ZCHUNK_ROWS
+    ) -> None:
+        codec = codec or ("zstd" if zstandard is not None else "zlib")
+        if codec not in ZCODECS or (codec == "zstd" and zstandard is None):
+            raise ValueError(f"unsupported codec {codec!r}")
+        self.codec = codec
+        self.chunk_rows = chunk_rows
+        self.dtype = record_dtype(header)
+        self._pending: list[np.ndarray] = []
+        self._count = 0
+        text = json.dumps({**header, "codec": codec, "decimals": ZDECIMALS, "chunk_rows": chunk_rows}).encode("utf-8")
+        padded = -(-(PREFIX_SIZE + len(text) + 1) // 64) * 64 - PREFIX_SIZE
+        self._file = path.open("wb")
+        self._file.write(ZMAGIC + struct.pack("<I", padded) + text.ljust(padded - 1) + b"\n")
+
+    def write(self, records: np.ndarray) -> None:
+        if len(records) == 0:
+            return
+        self._pending.append(np.asarray(records, dtype=self.dtype))
+        self._count += len(records)
+        if self._count > self.chunk_rows:
+            rows = np.concatenate(self._pending)
+            # cut at the start of the step after the first chunk_rows rows
+            cut = int(np.searchsorted(rows["step"], rows["step"][self.chunk_rows - 1], "right"))
+            while cut < len(rows):
+                self._file.write(_encode_chunk(rows[:cut], self.codec))
+                rows = rows[cut:]
+                if len(rows) <= self.chunk_rows:
+                    break
+                cut = int(np.searchsorted(rows["step"], rows["step"][self.chunk_rows - 1], "right"))
+            self._pending, self._count = [rows], len(rows)
+
+    def close(self) -> None:
+        if self._count:
+            self._file.write(_encode_chunk(np.concatenate(self._pending), self.codec))
+        self._pending, self._count = [], 0
+        self._file.close()
+
+    def __enter__(self) -> ZWriter:
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def _csv_record_header(path: Path) -> dict[str, Any]:
+    """A binary-style header for a CSV summary/trace (simulator record layout, no scenario)."""
+
+    names = csv_columns(path)
+    kind = next((k for k, line in CSV_HEADERS.items() if line.strip().split(";") == names), None)
+    if kind is None:
+        raise ValueError(f"{path}: not a baseline_simulator summary or trace CSV")
+    columns, offset = [], 0
+    for name in names:
+        width = 4 if name in INT_COLUMNS else 8
+        offset = -(-offset // width) * width
+        columns.append({"name": name, "dtype": f"<{'i' if width == 4 else 'f'}{width}", "offset": offset})
+        offset += width
+    return {"kind": kind, "version": 1, "byteorder": "little", "record_size": -(-offset // 8) * 8,
+            "columns": columns, "scenario": {}}
+
+
+def compress_table(src: Path, dst: Path, *, codec: str | None = None) -> None:
+    """Write a CSV, binary or compressed summary/trace as a compressed file, streaming."""
+
+    fmt = file_format(src)
+    if fmt == "csv":
+        header = _csv_record_header(src)
+        dtype = record_dtype(header)
+        _, _, csv_dtype, usecols = _csv_layout(src, None)
+        blocks = (_parse_rows(block, csv_dtype, usecols).astype(dtype) for _, block in _raw_blocks(src))
+    elif fmt == "bin":
+        records = load(src)
+        header = records.header
+        blocks = (records[k : k + ZCHUNK_ROWS] for k in range(0, len(records), ZCHUNK_ROWS))
+    else:
+        header = read_header(src, ZMAGIC)[0]
+        blocks = read_chunks(src)
+    with ZWriter(dst, header, codec=codec) as out:
+        for block in blocks:
+            out.write(block)
+
+
+# ---- Streamed summaries (baseline_simulator --batch --stream) ----------------
+# STREAM_MAGIC, then frames <int32 job><uint32 length><bytes>; the bytes of a
+# job, concatenated, are its --format bin summary file and a zero-length frame
+# ends it. See the "Streaming" comment in baseline_simulator.c.
+
+STREAM_MAGIC = b"BSIMSTR1"
+STREAM_FRAME = struct.Struct("<iI")
+
+
+class StreamDemux:
+    """Split a summary stream into per-job records as the bytes arrive.
+
+    feed() takes the stream in pieces of any size. `on_rows(job, header,
+    records)` receives each job's records (a structured array, in step order)
+    as soon as whole records are in; `on_end(job)` is called at the end of the
+    job's summary. Streamed summaries must be binary (format=bin).
+    """
+
+    def __init__(
+        self,
+        on_rows: Callable[[int, dict[str, Any], np.ndarray], None],
+        on_end: Callable[[int], None],
+    ) -> None:
+        self.on_rows = on_rows
+        self.on_end = on_end
+        self._buf = bytearray()
+        self._magic = False
+        self._pending: dict[int, bytearray] = {}
+        self._headers: dict[int, tuple[dict[str, Any], np.dtype]] = {}
+
+    def feed(self, data: bytes) -> None:
+        self._buf += data
+        pos = 0
+        if not self._magic:
+            if len(self._buf) < len(STREAM_MAGIC):
+                return
+            if self._buf[: len(STREAM_MAGIC)] != STREAM_MAGIC:
+                raise ValueError("not a baseline_simulator summary stream")
+            self._magic = True
+            pos = len(STREAM_MAGIC)
+        while len(self._buf) - pos >= STREAM_FRAME.size:
+            job, length = STREAM_FRAME.unpack_from(self._buf, pos)
+            if len(self._buf) - pos - STREAM_FRAME.size < length:
+                break
+            start = pos + STREAM_FRAME.size
+            self._job_bytes(job, self._buf[start : start + length])
+            pos = start + length
+        del self._buf[:pos]
+
+    def _job_bytes(self, job: int, data: bytes) -> None:
+        pending = self._pending.setdefault(job, bytearray())
+        if not data:
+            if pending:
+                raise ValueError(f"job {job}: summary stream ends inside a record")
+            del self._pending[job]
+            self._headers.pop(job, None)
+            self.on_end(job)
+            return
+        pending += data
+        if job not in self._headers:
+            if len(pending) < PREFIX_SIZE:
+                return
+            if pending[: len(MAGIC)] != MAGIC:
+                raise ValueError(f"job {job}: streamed summaries must be binary records (format=bin)")
+            (length,) = struct.unpack_from("<I", pending, len(MAGIC))
+            if len(pending) < PREFIX_SIZE + length:
+                return
+            header = json.loads(pending[PREFIX_SIZE : PREFIX_SIZE + length].decode("utf-8"))
+            self._headers[job] = (header, record_dtype(header))
+            del pending[: PREFIX_SIZE + length]
+        header, dtype = self._headers[job]
+        whole = len(pending) // dtype.itemsize * dtype.itemsize
+        if whole:
+            self.on_rows(job, header, np.frombuffer(bytes(pending[:whole]), dtype=dtype))
+            del pending[:whole]
+
+
+def csv_columns(path: Path) -> list[str]:
+    with path.open("rb") as f:
+        return f.readline().decode("utf-8").strip().split(";")
+
+
+def _raw_blocks(
+    path: Path, start: int | None = None, end: int | None = None, block_bytes: int = CSV_BLOCK_BYTES
+) -> Iterator[tuple[int, bytes]]:
+    """(file offset, bytes) of successive chunks of a CSV's rows, ending on line boundaries.
+
+    Covers [start, end) (default: everything after the header line); `start`
+    must be the beginning of a line.
+    """
+
+    with path.open("rb") as f:
+        if start is None:
+            f.readline()
+            start = f.tell()
+        f.seek(start)
+        pos, tail = start, b""
+        while True:
+            want = block_bytes if end is None else min(block_bytes, end - pos - len(tail))
+            chunk = f.read(want) if want > 0 else b""
+            data = tail + chunk
+            if chunk:
+                cut = data.rfind(b"\n") + 1
+                data, tail = data[:cut], data[cut:]
+            if data:
+                yield pos, data
+                pos += len(data)
+            if not chunk:
+                return
+
+
+def _csv_layout(path: Path, columns: Sequence[str] | None) -> tuple[list[str], list[str], np.dtype, list[int]]:
+    """(wanted, parsed, dtype, usecols): loadtxt parses `parsed` (wanted + step) into `dtype`."""
+
+    header = csv_columns(path)
+    wanted = list(columns) if columns is not None else header
+    missing = [c for c in wanted if c not in header]
+    if missing:
+        raise KeyError(f"{path}: no column(s) {', '.join(missing)}")
+    parsed = sorted({*wanted, "step"}, key=header.index)
+    dtype = np.dtype([(c, "<i4" if c in INT_COLUMNS else "<f8") for c in parsed])
+    return wanted, parsed, dtype, [header.index(c) for c in parsed]
+
+
+def _fold_digits(words: np.ndarray, width: np.ndarray | None = None) -> np.ndarray | None:
+    """Value of the last `width` (default 8) ASCII digits of each little-endian
+    8-byte word, folded pairwise in-register; None if one of them is no digit."""
+
+    if width is not None:
+        low = _LOW_BYTES.take(width)
+        words = (words & ~low) | (_ASCII_ZEROS & low)
+    x = words - _ASCII_ZEROS
+    if (((x + _ASCII_SIX) | x) & _HIGH_BITS).any():
+        return None
+    x = (x * np.uint64(10) + (x >> np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    x = (x * np.uint64(100) + (x >> np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    return (x * np.uint64(10000) + (x >> np.uint64(32))) & np.uint64(0xFFFFFFFF)
+
+
+def _parse_fixed(data: bytes, dtype: np.dtype, usecols: list[int]) -> np.ndarray | None:
+    """Vectorized parse of the simulator's own "%d" / "%.6f" rows; None for anything else.
+
+    Every field is read as the 8-byte word(s) ending at its separator: a
+    "%.6f" field is the integer of its digits over 10**6, which rounds exactly
+    like strtod as long as that integer is below 2**53. Empty float fields
+    (dead drones' gaps) are NaN.
+    """
+
+    if not data.endswith(b"\n"):
+        data += b"\n"
+    buf = b";" * _FIXED_PAD + data
+    b = np.frombuffer(buf, np.uint8)
+    words = np.ndarray((len(buf) - 7,), "<u8", buffer=buf, strides=(1,))
+    newline = b == 10
+    seps = np.flatnonzero(newline | (b == 59))[_FIXED_PAD - 1 :]
+    rows = int(np.count_nonzero(newline))
+    ncols = (len(seps) - 1) // rows
+    if len(seps) - 1 != rows * ncols or max(usecols) >= ncols or not newline[seps[ncols::ncols]].all():
+        return None
+    out = np.empty(rows, dtype=dtype)
+    signed = b"-" in data
+    for floats in (True, False):
+        names = [n for n in dtype.names if (dtype[n].kind == "f") == floats]
+        if not names:
+            continue
+        cols = [usecols[dtype.names.index(n)] for n in names]
+        hi = seps[1:].reshape(rows, ncols)[:, cols].ravel()
+        lo = seps[:-1].reshape(rows, ncols)[:, cols].ravel() + 1
+        width = hi - lo
+        neg = b.take(lo) == 45 if signed else None
+        if neg is not None:
+            width -= neg
+        if floats:
+            # last eight bytes: one integer digit, '.', six decimals
+            empty = width == 0
+            tail = words[hi - 8]
+            dot = (tail >> np.uint64(8)) & np.uint64(0xFF) == 46
+            if not (dot | empty).all() or (width[~empty] < 8).any():
+                return None
+            tail = ((tail & np.uint64(0xFF)) << np.uint64(8)) | (tail & ~np.uint64(0xFFFF)) | np.uint64(0x30)
+            tail[empty] = _ASCII_ZEROS
+            width = np.where(empty, 0, width - 8)
+            if width.max() > 8:
+                return None
+            # integer digits before the last one, if any field has them
+            head = _fold_digits(words[hi - 16], width) if width.any() else np.uint64(0)
+            tail = _fold_digits(tail)
+            if head is None or tail is None:
+                return None
+            values = (head * np.uint64(10**7) + tail).astype(np.float64) / 1e6
+            values[empty] = np.nan
+        else:
+            if width.min() < 1 or width.max() > 8:
+                return None
+            digits = _fold_digits(words[hi - 8], width)
+            if digits is None:
+                return None
+            values = digits.astype(np.int64)
+        if neg is not None:
+            np.negative(values, out=values, where=neg)
+        values = values.reshape(rows, len(names))
+        for j, name in enumerate(names):
+            out[name] = values[:, j]
+    return out
+
+
+def _parse_rows(data: bytes, dtype: np.dtype, usecols: list[int]) -> np.ndarray:
+    rows = _parse_fixed(data, dtype, usecols)
+    if rows is not None:
+        return rows
+    # dead drones' empty gap fields become NaN
+    if b";;" in data:
+        data = data.replace(b";;\n", b";nan;nan\n")
+    return np.loadtxt(io.BytesIO(data), delimiter=";", usecols=usecols, dtype=dtype, ndmin=1)
+
+
+def _step_mask(
+    steps: np.ndarray, stride: int, keep_steps: np.ndarray | None, start: int | None, stop: int | None
+) -> np.ndarray | None:
+    mask = None
+    if stride > 1:
+        mask = steps % stride == 0
+        if keep_steps is not None and len(keep_steps):
+            mask |= np.isin(steps, keep_steps)
+    if start is not None:
+        mask = steps >= start if mask is None else mask & (steps >= start)
+    if stop is not None:
+        mask = steps < stop if mask is None else mask & (steps < stop)
+    return mask
+
+
+def load_table(
+    path: Path,
+    columns: Sequence[str] | None = None,
+    *,
+    stride: int = 1,
+    keep_steps: Sequence[int] | np.ndarray | None = None,
+    start: int | None = None,
+    stop: int | None = None,
+) -> np.ndarray:
+    """Rows of a summary or trace file (CSV, binary or compressed) as a structured array.
+
+    Only `columns` (default: all) are returned. A row is kept when its step is
+    in [start, stop) and, with stride > 1, when step % stride == 0 or the step
+    is in `keep_steps`. step/idx/alive are int32, the other columns float64.
+    With a step range, only the rows of those steps are read: binary records
+    are bisected, compressed files skip the chunks outside the range, CSV
+    files are seeked through their step index.
+    """
+
+    keep = None if keep_steps is None else np.asarray(keep_steps, dtype=np.int64)
+    fmt = file_format(path)
+    if fmt == "z":
+        dtype = record_dtype(read_header(path, ZMAGIC)[0])
+        names = list(columns) if columns is not None else list(dtype.names)
+        parts = [np.zeros(0, dtype=dtype)]
+        for records in read_chunks(path, start=start, stop=stop):
+            mask = _step_mask(records["step"], stride, keep, start, stop)
+            parts.append(records if mask is None else records[mask])
+        return np.concatenate([np.asarray(recfunctions.repack_fields(p[names])) for p in parts])
+    if fmt == "bin":
+        records = load(path)
+        names = list(columns) if columns is not None else list(records.dtype.names)
+        if start is not None or stop is not None:
+            lo = np.searchsorted(records["step"], start, "left") if start is not None else 0
+            hi = np.searchsorted(records["step"], stop, "left") if stop is not None else len(records)
+            records = records[lo:hi]
+        mask = _step_mask(records["step"], stride, keep, None, None)
+        picked = records[names] if mask is None else records[names][mask]
+        return np.asarray(recfunctions.repack_fields(picked))
+
+    wanted, parsed, dtype, usecols = _csv_layout(path, columns)
+    lo = hi = None
+    if start is not None or stop is not None:
+        lo, hi = index_range(step_index(path), start, stop)
+    parts: list[np.ndarray] = []
+    for _, block in _raw_blocks(path, lo, hi):
+        rows = _parse_rows(block, dtype, usecols)
+        mask = _step_mask(rows["step"], stride, keep, start, stop)
+        parts.append(rows if mask is None else rows[mask])
+    rows = np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+    if parsed == wanted:
+        return rows
+    return np.asarray(recfunctions.repack_fields(rows[wanted]))
+
+
+def load_summary(path: Path, columns: Sequence[str] | None = None, **filters: Any) -> np.ndarray:
+    """Summary rows (see load_table for `columns` and the step filters)."""
+
+    return load_table(path, columns, **filters)
+
+
+def load_trace(
+    path: Path,
+    columns: Sequence[str] | None = None,
+    *,
+    idx: Sequence[int] | None = None,
+    **filters: Any,
+) -> np.ndarray:
+    """Trace rows (see load_table), optionally restricted to the drones in `idx`."""
+
+    if idx is not None and columns is not None and "idx" not in columns:
+        rows = load_table(path, ["idx", *columns], **filters)
+        return np.asarray(recfunctions.repack_fields(rows[np.isin(rows["idx"], idx)][list(columns)]))
+    rows = load_table(path, columns, **filters)
+    return rows if idx is None else rows[np.isin(rows["idx"], idx)]
+
+
+def last_step(path: Path) -> int:
+    """Step of the last row of a summary or trace file, without reading the rest."""
+
+    fmt = file_format(path)
+    if fmt == "bin":
+        records = load(path)
+        return int(records["step"][-1]) if len(records) else 0
+    if fmt == "z":
+        chunks = chunk_table(path)
+        return chunks[-1][1] if chunks else 0
+    with path.open("rb") as f:
+        size = f.seek(0, 2)
+        f.seek(max(0, size - 4096))
+        lines = f.read().strip().splitlines()
+    last = lines[-1].split(b";", 1)[0] if lines else b""
+    return int(last) if last.isdigit() else 0
+
+
+def step_chunks(
+    path: Path,
+    columns: Sequence[str] | None = None,
+    *,
+    rows: int = CHUNK_ROWS,
+    align: int = 1,
+    start: int | None = None,
+    stop: int | None = None,
+) -> Iterator[np.ndarray]:
+    """Rows of steps [start, stop) in consecutive windowed reads of about `rows` rows each.
+
+    Windows are a multiple of `align` steps long and aligned to step 0, so
+    blocks of `align` steps never straddle two chunks. The rows per step are
+    taken from step 0, so memory stays bounded for any file length.
+    """
+
+    per_step = max(1, len(load_table(path, ["step"], start=0, stop=1)))
+    span = max(align, rows // per_step // align * align)
+    lo = 0 if start is None else start
+    end = last_step(path) + 1 if stop is None else min(stop, last_step(path) + 1)
+    while lo < end:
+        hi = min((lo // span + 1) * span, end)
+        yield load_table(path, columns, start=lo, stop=hi)
+        lo = hi
+
+
+LOSS_DTYPE = np.dtype([("step", "<i4"), ("idx", "<i4")])
+
+
+def load_losses(path: Path) -> np.ndarray:
+    """(step, idx) records of a loss schedule, in file order; empty if the file is missing.
+
+    Like the simulator, the first line is skipped and `;` or `,` separate fields.
+    """
+
+    rows: list[tuple[int, int]] = []
+    if path.exists():
+        with path.open() as f:
+            next(f, None)
+            for line in f:
+                parts = line.strip().replace(";", ",").split(",")
+                if len(parts) >= 2 and parts[0].isdigit():
+                    try:
+                        rows.append((int(parts[0]), int(parts[1])))
+                    except ValueError:
+                        continue
+    return np.array(rows, dtype=LOSS_DTYPE)
+
+
+def load_loss_steps(path: Path) -> np.ndarray:
+    """Sorted loss steps of a loss schedule (one per loss, so steps may repeat)."""
+
+    return np.sort(load_losses(path)["step"])
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def check_identity(path: Path, recorded: dict[str, Any] | None) -> tuple[bool, dict[str, Any]]:
+    """Whether a sidecar's recorded size/mtime_ns/sha256 still describe `path`, and its current identity.
+
+    Only stats the file when size and mtime match; hashes it otherwise.
+    """
+
+    st = path.stat()
+    stamp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if recorded is not None and {k: recorded.get(k) for k in stamp} == stamp:
+        return True, recorded
+    digest = _file_sha256(path)
+    return recorded is not None and recorded.get("sha256") == digest, {**stamp, "sha256": digest}
+
+
+INDEX_MAGIC = b"BSIMIDX1"
+INDEX_SUFFIX = ".steps.idx"
+INDEX_DTYPE = np.dtype([("step", "<i8"), ("offset", "<i8")])
+
+
+def index_path(table: Path) -> Path:
+    return table.with_name(table.name + INDEX_SUFFIX)
+
+
+def build_step_index(table: Path, *, every: int = 1) -> np.ndarray:
+    """Write <table>.steps.idx: the byte offset of the first row of every `every`-th step.
+
+    Steps are counted as they appear in the file (so decimated files work),
+    and a final (last step + 1, file size) entry closes the last range. The
+    index file is "BSIMIDX1", a uint32 header length, a JSON header (the
+    table's identity and `every`) and little-endian (step, offset) int64 pairs.
+    """
+
+    _, identity = check_identity(table, None)
+    starts: list[np.ndarray] = []
+    steps: list[np.ndarray] = []
+    prev = None
+    last = -1
+    end = 0
+    for pos, block in _raw_blocks(table):
+        ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+        lines = len(ends) + (not block.endswith(b"\n"))
+        line_starts = np.concatenate(([0], ends + 1))[:lines] + pos
+        row_steps = np.loadtxt(io.BytesIO(block), delimiter=";", usecols=[0], dtype=np.int64, ndmin=1)
+        if len(row_steps) != lines:
+            raise ValueError(f"{table}: blank or malformed lines, cannot index")
+        first = np.flatnonzero(np.diff(row_steps, prepend=prev if prev is not None else row_steps[0] - 1))
+        starts.append(line_starts[first])
+        steps.append(row_steps[first])
+        prev = last = int(row_steps[-1])
+        end = pos + len(block)
+    index = np.zeros(0, dtype=INDEX_DTYPE)
+    if steps:
+        all_steps, all_starts = np.concatenate(steps), np.concatenate(starts)
+        index = np.empty(len(all_steps[::every]) + 1, dtype=INDEX_DTYPE)
+        index["step"][:-1], index["offset"][:-1] = all_steps[::every], all_starts[::every]
+        index[-1] = (last + 1, end)
+    _write_index(table, index, {"kind": "step_index", "table": identity, "every": every})
+    return index
+
+
+def _write_index(table: Path, index: np.ndarray, header: dict[str, Any]) -> None:
+    out = index_path(table)
+    text = json.dumps(header).encode("utf-8")
+    try:
+        tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            f.write(INDEX_MAGIC + struct.pack("<I", len(text)) + text)
+            f.write(index.tobytes())
+        os.replace(tmp, out)
+    except OSError:
+        pass  # read-only directory: the index is only kept in memory
+
+
+def step_index(table: Path) -> np.ndarray:
+    """(step, offset) entries of a CSV table's step index, building it if missing or stale.
+
+    The entries are memory-mapped, so a lookup only reads the pages it bisects.
+    """
+
+    path = index_path(table)
+    try:
+        header, offset = read_header(path, INDEX_MAGIC)
+    except (OSError, ValueError):
+        return build_step_index(table)
+    current, identity = check_identity(table, header["table"])
+    if not current:
+        return build_step_index(table, every=header.get("every", 1))
+    count = (path.stat().st_size - offset) // INDEX_DTYPE.itemsize
+    if identity is not header["table"]:
+        # same content under a new mtime (e.g. a copy): refresh the recorded identity
+        index = np.fromfile(path, dtype=INDEX_DTYPE, count=count, offset=offset)
+        _write_index(table, index, {**header, "table": identity})
+        return index
+    if count == 0:
+        return np.zeros(0, dtype=INDEX_DTYPE)
+    return np.memmap(path, dtype=INDEX_DTYPE, mode="r", offset=offset, shape=(count,))
+
+
+def index_range(index: np.ndarray, start: int | None, stop: int | None) -> tuple[int | None, int | None]:
+    """Byte range [lo, hi) of a table holding every row with start <= step < stop."""
+
+    if len(index) == 0:
+        return None, None
+    lo = hi = None
+    if start is not None:
+        lo = int(index["offset"][max(0, np.searchsorted(index["step"], start, "right") - 1)])
+    if stop is not None:
+        hi = int(index["offset"][min(len(index) - 1, np.searchsorted(index["step"], stop, "left"))])
+    return lo, hi
+
+
+EVENT_DTYPE = np.dtype([("step", "<i4"), ("idx", "<i4"), ("time", "<f8")])
+EVENTS_SUFFIX = ".events.json"
+
+
+def _alive_transitions(trace: np.ndarray, before: int, after: int, dt: float | None) -> np.ndarray:
+    order = np.lexsort((trace["step"], trace["idx"]))
+    idx = trace["idx"][order]
+    alive = trace["alive"][order]
+    hit = (idx[1:] == idx[:-1]) & (alive[:-1] == before) & (alive[1:] == after)
+    rows = order[1:][hit]
+    events = np.empty(len(rows), dtype=EVENT_DTYPE)
+    events["step"] = trace["step"][rows]
+    events["idx"] = trace["idx"][rows]
+    events["time"] = events["step"] * dt if dt is not None else np.nan
+    return events[np.argsort(events["step"], kind="stable")]
+
+
+def spare_events(trace: np.ndarray, dt: float | None = None) -> np.ndarray:
+    """(step, idx, time) of every alive 0 -> 1 transition in trace rows, sorted by step.
+
+    Transitions are taken between consecutive rows of the same drone, so
+    decimated traces are fine as long as they keep the steps around events
+    (event_window >= 1). `time` is step * dt, NaN without dt.
+    """
+
+    return _alive_transitions(trace, 0, 1, dt)
+
+
+def loss_events(trace: np.ndarray, dt: float | None = None) -> np.ndarray:
+    """Like spare_events(), for alive 1 -> 0 transitions."""
+
+    return _alive_transitions(trace, 1, 0, dt)
+
+
+@dataclass(frozen=True)
+class TraceEvents:
+    losses: np.ndarray
+    spares: np.ndarray
+
+
+def events_path(trace: Path) -> Path:
+    return trace.with_name(trace.name + EVENTS_SUFFIX)
+
+
+def _event_array(pairs: list[list[int]], dt: float | None) -> np.ndarray:
+    events = np.zeros(len(pairs), dtype=EVENT_DTYPE)
+    if pairs:
+        steps, idx = zip(*pairs)
+        events["step"], events["idx"] = steps, idx
+    events["time"] = events["step"] * dt if dt is not None else np.nan
+    return events
+
+
+def _write_sidecar(path: Path, meta: dict[str, Any]) -> None:
+    """Atomic write; a read-only trace directory just means no sidecar."""
+
+    try:
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(meta, separators=(",", ":")) + "\n", encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def trace_events(trace: Path, *, dt: float | None = None) -> TraceEvents:
+    """Loss and spare events of a trace file, from its sidecar when it is current.
+
+    The first call scans the trace and writes <trace>.events.json next to it,
+    holding the (step, idx) pairs and the trace's size, mtime and SHA-256.
+    Later calls only stat the trace; if size or mtime changed, the sidecar is
+    still used when the content hash matches, and rebuilt otherwise. `dt`
+    defaults to the scenario dt of a binary or compressed trace (times are NaN
+    for CSV).
+    """
+
+    side = events_path(trace)
+    try:
+        meta = json.loads(side.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        meta = None
+    current, identity = check_identity(trace, meta["trace"] if meta is not None else None)
+    if current and identity is not meta["trace"]:
+        meta["trace"] = identity
+        _write_sidecar(side, meta)
+    if not current:
+        rows = load_trace(trace, ["step", "idx", "alive"])
+        fmt = file_format(trace)
+        meta = {
+            "trace": identity,
+            "dt": read_header(trace, OUTPUT_MAGIC[fmt])[0]["scenario"].get("dt") if fmt != "csv" else None,
+            "losses": loss_events(rows)[["step", "idx"]].tolist(),
+            "spares": spare_events(rows)[["step", "idx"]].tolist(),
+        }
+        _write_sidecar(side, meta)
+    dt = dt if dt is not None else meta.get("dt")
+    return TraceEvents(_event_array(meta["losses"], dt), _event_array(meta["spares"], dt))
+
+
+def spare_steps(trace: np.ndarray | Path) -> np.ndarray:
+    """Distinct spare insertion steps of a trace (array or path; a missing path gives none).
+
+    Paths go through the trace_events() sidecar.
+    """
+
+    if isinstance(trace, Path):
+        if not trace.exists():
+            return np.empty(0, dtype=np.int32)
+        return np.unique(trace_events(trace).spares["step"])
+    return np.unique(spare_events(trace)["step"])
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Inspect or export baseline_simulator outputs")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    info = sub.add_parser("info", help="print the header and record count")
+    info.add_argument("path", type=Path)
+    export = sub.add_parser("export", help="convert to the simulator's CSV format")
+    export.add_argument("path", type=Path)
+    export.add_argument("dst", type=Path)
+    compress = sub.add_parser("compress", help="convert a summary/trace to compressed records (e.g. trace.trace.z)")
+    compress.add_argument("path", type=Path)
+    compress.add_argument("dst", type=Path)
+    compress.add_argument("--codec", choices=ZCODECS, help="default: zstd if installed, else zlib")
+    events = sub.add_parser("events", help="build (if needed) and print the loss/spare event sidecar of a trace")
+    events.add_argument("path", type=Path)
+    index = sub.add_parser("index", help="build the step-offset index of a CSV summary or trace")
+    index.add_argument("path", type=Path)
+    index.add_argument("--every", type=int, default=1, help="index every N-th step (default: all)")
+    args = ap.parse_args()
+
+    if args.cmd == "export":
+        export_csv(args.path, args.dst)
+        return 0
+    if args.cmd == "compress":
+        compress_table(args.path, args.dst, codec=args.codec)
+        before, after = args.path.stat().st_size, args.dst.stat().st_size
+        print(f"{args.dst}: {before} -> {after} bytes ({before / max(after, 1):.1f}x)")
+        return 0
+    if args.cmd == "index":
+        entries = build_step_index(args.path, every=max(1, args.every))
+        print(f"{index_path(args.path)}: {max(0, len(entries) - 1)} entries")
+        return 0
+    if args.cmd == "events":
+        ev = trace_events(args.path)
+        for kind, arr in (("LOSS", ev.losses), ("SPARE", ev.spares)):
+            for step, idx, _ in arr.tolist():
+                print(f"{kind};{step};{idx}")
+        return 0
+    if file_format(args.path) == "z":
+        chunks = chunk_table(args.path)
+        header = dict(read_header(args.path, ZMAGIC)[0], records=sum(c[2] for c in chunks), chunks=len(chunks))
+    else:
+        records = load(args.path)
+        header = dict(records.header, records=len(records))
+    print(json.dumps(header, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
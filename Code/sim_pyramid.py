@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""Multi-resolution min/max/mean/std pyramid of a summary or trace, for zoomable plots.
+
+Level k of the pyramid aggregates the rows of a table into blocks of
+`base * FACTOR**k` steps, aligned to step 0: for every block and every value
+column, the number of finite values and their min, max, mean and std. A
+summary has one aggregate per block; a trace has one per block and drone
+(fields of shape (drones,), NaN for drones without rows in the block). Summary
+levels also hold the band columns "<mean>-<std>" and "<mean>+<std>" (BANDS),
+whose min and max are the exact envelope of a ±1σ band.
+
+The pyramid is kept in a <table>.pyramid sidecar next to the table: "BSIMPYR1",
+a uint32 header length, a JSON header (the table's identity, as for the step
+index, and the block size, record count and offset of every level) and the
+levels' records, memory-mapped on load. It is built on first use (or with
+`python3 Code/sim_pyramid.py build FILE...`) by reading the table in step
+windows of about 1M rows (sim_io.step_chunks()), so memory stays bounded by
+the base level, and rebuilt when the table changed.
+
+view() returns the level whose blocks are closest to, but not wider than, one
+pixel column for a step range and pixel width, restricted to that range, so
+an overview and a zoom on one loss event both read O(width_px) records:
+
+  records, block = view(Path("summary_w05_unbounded.csv"), 1200, start=4000, stop=9000)
+  x, y = minmax_line(records, "mean_v", block, 1200)    # vertical min-max segment per pixel column
+  x, lower, upper = minmax_band(records, "mean_v", "std_v", block, 1200)
+
+When the range has fewer than `base` steps per pixel column, view() returns
+None (without building the pyramid): the raw rows are as cheap to read.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from sim_downsample import pixel_columns
+from sim_io import OUTPUT_MAGIC, check_identity, csv_columns, file_format, last_step, read_header, record_dtype, step_chunks
+
+PYRAMID_MAGIC = b"BSIMPYR1"
+PYRAMID_SUFFIX = ".pyramid"
+FACTOR = 4
+BASE_BLOCK = {"summary": 16, "trace": 16}
+RECORD_FLOAT = {"summary": "<f8", "trace": "<f4"}
+MIN_BLOCKS = 256  # the coarsest level has at most this many blocks
+STATS = ("min", "max", "mean", "std")
+BANDS = (("mean_v", "std_v"), ("mean_gap", "std_gap"))
+KEY_COLUMNS = ("step", "idx")
+
+
+def pyramid_path(table: Path) -> Path:
+    return table.with_name(table.name + PYRAMID_SUFFIX)
+
+
+def band_columns(mean: str, std: str) -> tuple[str, str]:
+    return f"{mean}-{std}", f"{mean}+{std}"
+
+
+def table_columns(table: Path) -> list[str]:
+    fmt = file_format(table)
+    if fmt == "csv":
+        return csv_columns(table)
+    return list(record_dtype(read_header(table, OUTPUT_MAGIC[fmt])[0]).names)
+
+
+def level_dtype(columns: list[str], drones: int | None, float_type: str) -> np.dtype:
+    shape = () if drones is None else (drones,)
+    fields: list[tuple[Any, ...]] = [("step", "<i8")]
+    for column in columns:
+        fields.append((f"{column}_n", "<i4", shape))
+        fields += [(f"{column}_{stat}", float_type, shape) for stat in STATS]
+    return np.dtype(fields)
+
+
+class Pyramid:
+    """The levels of a table's pyramid, coarsest last; see view() for picking one."""
+
+    def __init__(self, header: dict[str, Any], levels: dict[int, np.ndarray]):
+        self.header = header
+        self.levels = levels
+
+    @property
+    def blocks(self) -> list[int]:
+        return sorted(self.levels)
+
+    def choose(self, start: int, stop: int, width_px: int) -> int | None:
+        """Widest block size with at least `width_px` blocks in [start, stop); None if even the base level is too coarse."""
+
+        fits = [block for block in self.blocks if (stop - start) // block >= width_px]
+        return fits[-1] if fits else None
+
+    def window(self, block: int, start: int, stop: int) -> np.ndarray:
+        """Records of the `block` level overlapping steps [start, stop)."""
+
+        records = self.levels[block]
+        lo = np.searchsorted(records["step"], start - block + 1, "left")
+        hi = np.searchsorted(records["step"], stop, "left")
+        return records[lo:hi]
+
+
+def _base_level(rows: np.ndarray, values: list[str], base: int, drones: int | None) -> dict[str, np.ndarray]:
+    """Exact per-block (and per-drone) n/min/max/mean/std of `rows`, as (blocks, width) arrays."""
+
+    blocks, inv = np.unique(rows["step"] // base, return_inverse=True)
+    width = 1 if drones is None else drones
+    key = inv * width + (rows["idx"] if drones is not None else 0)
+    size = len(blocks) * width
+    level: dict[str, np.ndarray] = {"step": blocks * base}
+    for column in values:
+        x = rows[column].astype(np.float64) if column in rows.dtype.names else _band(rows, column)
+        ok = np.isfinite(x)
+        k, x = key[ok], x[ok]
+        n = np.bincount(k, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.bincount(k, x, minlength=size) / n
+            std = np.sqrt(np.bincount(k, (x - mean[k]) ** 2, minlength=size) / n)
+        lo = np.full(size, np.inf)
+        hi = np.full(size, -np.inf)
+        np.fmin.at(lo, k, x)
+        np.fmax.at(hi, k, x)
+        lo[n == 0] = hi[n == 0] = np.nan
+        for stat, arr in (("n", n), ("min", lo), ("max", hi), ("mean", mean), ("std", std)):
+            level[f"{column}_{stat}"] = arr.reshape(len(blocks), width)
+    return level
+
+
+def _band(rows: np.ndarray, column: str) -> np.ndarray:
+    for mean, std in BANDS:
+        lower, upper = band_columns(mean, std)
+        if column == lower:
+            return rows[mean] - rows[std]
+        if column == upper:
+            return rows[mean] + rows[std]
+    raise KeyError(column)
+
+
+def _coarsen(level: dict[str, np.ndarray], values: list[str], block: int) -> dict[str, np.ndarray]:
+    """The next level (blocks FACTOR times wider), merging counts, extremes, means and M2."""
+
+    parent = level["step"] // (block * FACTOR)
+    starts = np.flatnonzero(np.diff(parent, prepend=-1))
+    out: dict[str, np.ndarray] = {"step": parent[starts] * block * FACTOR}
+    for column in values:
+        n = level[f"{column}_n"]
+        mean = np.nan_to_num(level[f"{column}_mean"])
+        std = np.nan_to_num(level[f"{column}_std"])
+        total = np.add.reduceat(n, starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            merged = np.add.reduceat(n * mean, starts) / total
+            spread = n * (std**2 + (mean - np.repeat(merged, np.diff(np.append(starts, len(n))), axis=0)) ** 2)
+            merged_std = np.sqrt(np.add.reduceat(spread, starts) / total)
+        out[f"{column}_n"] = total
+        out[f"{column}_min"] = np.fmin.reduceat(level[f"{column}_min"], starts)
+        out[f"{column}_max"] = np.fmax.reduceat(level[f"{column}_max"], starts)
+        out[f"{column}_mean"] = merged
+        out[f"{column}_std"] = merged_std
+    return out
+
+
+def _pad(level: dict[str, np.ndarray], width: int) -> dict[str, np.ndarray]:
+    """Widen the per-drone arrays of a chunk to `width` drones (no rows: n=0, NaN)."""
+
+    out = {"step": level["step"]}
+    for name, arr in level.items():
+        if name != "step":
+            fill = 0 if name.endswith("_n") else np.nan
+            out[name] = np.pad(arr, ((0, 0), (0, width - arr.shape[1])), constant_values=fill)
+    return out
+
+
+def _records(level: dict[str, np.ndarray], values: list[str], drones: int | None, float_type: str) -> np.ndarray:
+    records = np.zeros(len(level["step"]), dtype=level_dtype(values, drones, float_type))
+    for name in records.dtype.names:
+        arr = level[name]
+        records[name] = arr if drones is not None or name == "step" else arr[:, 0]
+    return records
+
+
+def build_pyramid(table: Path) -> Pyramid:
+    """Aggregate `table` into every level and write <table>.pyramid (kept in memory if that fails)."""
+
+    _, identity = check_identity(table, None)
+    columns = table_columns(table)
+    kind = "trace" if "idx" in columns else "summary"
+    base = BASE_BLOCK[kind]
+    values = [c for c in columns if c not in KEY_COLUMNS]
+    if kind == "summary":
+        values += [band for mean, std in BANDS if mean in values and std in values for band in band_columns(mean, std)]
+
+    parts: list[dict[str, np.ndarray]] = []
+    drones = 0
+    for rows in step_chunks(table, [c for c in columns if c in KEY_COLUMNS or c in values], align=base):
+        if len(rows):
+            if kind == "trace":
+                drones = max(drones, int(rows["idx"].max()) + 1)
+            parts.append(_base_level(rows, values, base, drones if kind == "trace" else None))
+    if kind == "trace":
+        parts = [_pad(part, drones) for part in parts]
+    level = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]} if parts else None
+
+    levels: dict[int, dict[str, np.ndarray]] = {}
+    block = base
+    while level is not None:
+        levels[block] = level
+        if len(level["step"]) <= MIN_BLOCKS:
+            break
+        level = _coarsen(level, values, block)
+        block *= FACTOR
+
+    width = drones if kind == "trace" else None
+    float_type = RECORD_FLOAT[kind]
+    records = {block: _records(level, values, width, float_type) for block, level in levels.items()}
+    header = {
+        "kind": "pyramid",
+        "table": identity,
+        "source": kind,
+        "columns": values,
+        "drones": width,
+        "float": float_type,
+        "factor": FACTOR,
+        "levels": [],
+    }
+    offset = 0
+    for block, arr in records.items():
+        header["levels"].append({"block": block, "count": len(arr), "offset": offset})
+        offset += arr.nbytes
+    _write_pyramid(table, header, records)
+    return Pyramid(header, records)
+
+
+def _write_pyramid(table: Path, header: dict[str, Any], records: dict[int, np.ndarray]) -> None:
+    out = pyramid_path(table)
+    text = json.dumps(header).encode("utf-8")
+    try:
+        tmp = out.with_name(f".{out.name}.{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            f.write(PYRAMID_MAGIC + struct.pack("<I", len(text)) + text)
+            for arr in records.values():
+                f.write(arr.tobytes())
+        os.replace(tmp, out)
+    except OSError:
+        pass  # read-only directory: the pyramid is only kept in memory
+
+
+def _map_levels(path: Path, header: dict[str, Any], offset: int) -> dict[int, np.ndarray]:
+    dtype = level_dtype(header["columns"], header["drones"], header["float"])
+    levels: dict[int, np.ndarray] = {}
+    for level in header["levels"]:
+        if level["count"] == 0:
+            levels[level["block"]] = np.zeros(0, dtype=dtype)
+        else:
+            levels[level["block"]] = np.memmap(path, dtype=dtype, mode="r", offset=offset + level["offset"], shape=(level["count"],))
+    return levels
+
+
+_pyramids: dict[tuple[str, int, int], Pyramid] = {}
+
+
+def pyramid(table: Path) -> Pyramid:
+    """The pyramid of `table`, from its sidecar when current, else (re)built."""
+
+    st = table.stat()
+    memo_key = (str(table), st.st_size, st.st_mtime_ns)
+    if memo_key in _pyramids:
+        return _pyramids[memo_key]
+    path = pyramid_path(table)
+    try:
+        header, offset = read_header(path, PYRAMID_MAGIC)
+        current, identity = check_identity(table, header["table"])
+    except (OSError, ValueError, KeyError):
+        current = False
+    if current:
+        if identity is not header["table"]:
+            # same content under a new mtime (e.g. a copy): refresh the recorded identity
+            levels = {block: np.array(arr) for block, arr in _map_levels(path, header, offset).items()}
+            header = {**header, "table": identity}
+            _write_pyramid(table, header, levels)
+        result = Pyramid(header, _map_levels(path, header, offset))
+    else:
+        result = build_pyramid(table)
+    _pyramids[memo_key] = result
+    return result
+
+
+def view(
+    table: Path,
+    width_px: int,
+    *,
+    start: int | None = None,
+    stop: int | None = None,
+    source: str | None = None,
+) -> tuple[np.ndarray, int] | None:
+    """(records, block size) of the level matching [start, stop) at `width_px`, or None to read raw rows.
+
+    None is decided from the step range alone, so short runs never build a
+    pyramid. `source` ("summary" or "trace") skips reading the table's columns.
+    """
+
+    start = 0 if start is None else start
+    stop = last_step(table) + 1 if stop is None else stop
+    kind = source or ("trace" if "idx" in table_columns(table) else "summary")
+    if (stop - start) // BASE_BLOCK[kind] < width_px:
+        return None
+    pyr = pyramid(table)
+    block = pyr.choose(start, stop, width_px)
+    if block is None:
+        return None
+    return pyr.window(block, start, stop), block
+
+
+def _per_pixel(records: np.ndarray, lower: str, upper: str, block: int, width_px: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Block centres, min of `lower` and max of `upper`, merged down to one entry per pixel column."""
+
+    x = records["step"] + (block - 1) / 2
+    if len(x) == 0:
+        return x, records[lower].astype(np.float64), records[upper].astype(np.float64)
+    starts = pixel_columns(x, width_px)
+    return x[starts], np.fmin.reduceat(records[lower], starts), np.fmax.reduceat(records[upper], starts)
+
+
+def minmax_line(records: np.ndarray, column: str, block: int, width_px: int) -> tuple[np.ndarray, np.ndarray]:
+    """x, y of a line through the min and max of `column` in every pixel column (drawn as a vertical segment)."""
+
+    x, lo, hi = _per_pixel(records, f"{column}_min", f"{column}_max", block, width_px)
+    return np.repeat(x, 2), np.column_stack((lo, hi)).ravel()
+
+
+def minmax_band(records: np.ndarray, mean: str, std: str, block: int, width_px: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """x, lowest mean - std and highest mean + std of every pixel column: the envelope of the ±1σ band."""
+
+    lower, upper = band_columns(mean, std)
+    return _per_pixel(records, f"{lower}_min", f"{upper}_max", block, width_px)
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Build or inspect the min/max/mean/std pyramid of a summary or trace")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    build = sub.add_parser("build", help="(re)build <file>.pyramid")
+    build.add_argument("paths", nargs="+", type=Path)
+    info = sub.add_parser("info", help="print the levels of a file's pyramid (building it if needed)")
+    info.add_argument("path", type=Path)
+    args = ap.parse_args()
+
+    if args.cmd == "build":
+        for path in args.paths:
+            pyr = build_pyramid(path)
+            print(f"{pyramid_path(path)}: blocks {', '.join(map(str, pyr.blocks))}")
+        return 0
+    pyr = pyramid(args.path)
+    for block in pyr.blocks:
+        print(f"block {block}: {len(pyr.levels[block])} records")
+    print(f"columns: {', '.join(pyr.header['columns'])}" + (f" ({pyr.header['drones']} drones)" if pyr.header["drones"] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""Window statistics of summary columns from prefix sums.
+
+WindowSums builds the cumulative sums and sums of squares of some summary
+columns once; the mean / std / row count over any step window [start, end)
+is then two bisections and a subtraction, for any number of windows at once:
+
+  sums = WindowSums(load_summary(path, ["step", "mean_v", "std_gap"]), ["mean_v", "std_gap"])
+  sums.mean("mean_v", [0, 500], [500, 1000])       # -> array of 2 means
+  sums.std("std_gap", 0, 3000)                     # -> population std over the window
+
+A window holding a NaN value gives NaN (as np.mean would); an empty window
+gives NaN and a count of 0.
+
+Window sets are functions of the run (first loss, loss steps, end step)
+returning labelled windows; `parse_windows()` reads them from the command line:
+  phases             pre [0, first_loss), post [first_loss + 1, end), end (last 20%)
+  loss:B:A           loss1, loss2, ...: [t - B, t + A) around every loss step t
+  sliding:W[:S]      w0, w1, ...: [k*S, k*S + W) over the run (S defaults to W)
+summarize_files() applies a window set to many summaries in one call,
+reading them on several processes, which is what the sweep scripts use.
+
+RunningWindows computes the same means from summary rows as they are
+simulated, without keeping them: running Welford-style count / mean / M2
+accumulators per window, merged chunk by chunk. StreamWindows runs one per
+job of a streamed batch (sim_batch.STREAM), so a sweep gets its per-seed
+metrics without writing any summary file:
+
+  windows = StreamWindows(WINDOW_COLUMNS, [phase_windows], loss_steps)
+  run_batch(jobs, stream=windows.demux)      # jobs with summary=STREAM, format="bin"
+  windows.results[k]                         # window_means() of job k
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+import numpy as np
+
+from sim_io import StreamDemux, load_summary
+
+Window = tuple[str, int, int]
+
+
+@dataclass(frozen=True)
+class RunInfo:
+    """What window sets are defined from: the loss steps (sorted) and one past the last step."""
+
+    loss_steps: np.ndarray
+    end: int
+
+    @property
+    def first_loss(self) -> int:
+        return int(self.loss_steps[0]) if len(self.loss_steps) else 0
+
+
+WindowSet = Callable[[RunInfo], list[Window]]
+
+
+class WindowSums:
+    def __init__(self, rows: np.ndarray, columns: Sequence[str]):
+        self.steps = np.asarray(rows["step"])
+        self._sum: dict[str, np.ndarray] = {}
+        self._sq: dict[str, np.ndarray] = {}
+        self._nan: dict[str, np.ndarray] = {}
+        self._shift: dict[str, float] = {}
+        for col in columns:
+            x = np.asarray(rows[col], dtype=np.float64)
+            nan = np.isnan(x)
+            # Sums of x - x[0] keep the sums of squares from cancelling out in std().
+            self._shift[col] = float(x[~nan][0]) if not nan.all() else 0.0
+            x = np.where(nan, 0.0, x - self._shift[col])
+            self._sum[col] = np.concatenate(([0.0], np.cumsum(x)))
+            self._sq[col] = np.concatenate(([0.0], np.cumsum(x * x)))
+            self._nan[col] = np.concatenate(([0], np.cumsum(nan)))
+
+    def _bounds(self, start: int | np.ndarray, end: int | np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        lo = np.searchsorted(self.steps, np.maximum(start, 0) if np.ndim(start) else max(start, 0), "left")
+        hi = np.searchsorted(self.steps, end, "left")
+        return lo, np.maximum(hi, lo)
+
+    def count(self, start: int | np.ndarray, end: int | np.ndarray) -> np.ndarray:
+        lo, hi = self._bounds(start, end)
+        return hi - lo
+
+    def _moments(self, col: str, start: int | np.ndarray, end: int | np.ndarray) -> tuple[np.ndarray, ...]:
+        lo, hi = self._bounds(start, end)
+        n = (hi - lo).astype(np.float64)
+        bad = (n == 0) | (self._nan[col][hi] != self._nan[col][lo])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = (self._sum[col][hi] - self._sum[col][lo]) / n
+            meansq = (self._sq[col][hi] - self._sq[col][lo]) / n
+        return np.where(bad, np.nan, mean), np.where(bad, np.nan, meansq)
+
+    def mean(self, col: str, start: int | np.ndarray, end: int | np.ndarray) -> np.ndarray:
+        return self._moments(col, start, end)[0] + self._shift[col]
+
+    def std(self, col: str, start: int | np.ndarray, end: int | np.ndarray) -> np.ndarray:
+        mean, meansq = self._moments(col, start, end)
+        return np.sqrt(np.maximum(meansq - mean * mean, 0.0))
+
+
+def phase_windows(run: RunInfo) -> list[Window]:
+    """Pre-loss, post-loss and last-20% windows (the summarize_metrics columns)."""
+
+    first = run.first_loss
+    return [("pre", 0, first), ("post", first + 1, run.end), ("end", int(run.end * 0.8), run.end)]
+
+
+@dataclass(frozen=True)
+class LossWindows:
+    """[t - before, t + after) around every loss step t, labelled loss1, loss2, ..."""
+
+    before: int
+    after: int
+
+    def __call__(self, run: RunInfo) -> list[Window]:
+        return [(f"loss{k}", int(t) - self.before, int(t) + self.after) for k, t in enumerate(run.loss_steps, 1)]
+
+
+@dataclass(frozen=True)
+class SlidingWindows:
+    """[k * stride, k * stride + width) over the run, labelled w0, w1, ... (stride 0: width)."""
+
+    width: int
+    stride: int = 0
+
+    def __call__(self, run: RunInfo) -> list[Window]:
+        stride = self.stride or self.width
+        return [(f"w{k}", start, start + self.width) for k, start in enumerate(range(0, max(run.end, 1), stride))]
+
+
+def parse_windows(spec: str) -> WindowSet:
+    """phases | loss:BEFORE:AFTER | sliding:WIDTH[:STRIDE] (see the module docstring)."""
+
+    kind, *args = spec.split(":")
+    try:
+        values = [int(a) for a in args]
+    except ValueError:
+        values = None
+    if kind == "phases" and not args:
+        return phase_windows
+    if kind == "loss" and values is not None and len(values) == 2:
+        return LossWindows(*values)
+    if kind == "sliding" and values and len(values) <= 2 and min(values) > 0:
+        return SlidingWindows(*values)
+    raise ValueError(f"bad window set {spec!r}: use phases, loss:BEFORE:AFTER or sliding:WIDTH[:STRIDE]")
+
+
+def window_means(
+    rows: np.ndarray, columns: Sequence[str], window_sets: Sequence[WindowSet], loss_steps: np.ndarray
+) -> dict[str, float]:
+    """`<label>_<column>` means of summary rows over the windows of every set (NaN when empty)."""
+
+    run = RunInfo(np.asarray(loss_steps), int(rows["step"][-1]) + 1 if len(rows) else 0)
+    windows = [w for window_set in window_sets for w in window_set(run)]
+    sums = WindowSums(rows, columns)
+    starts = np.array([w[1] for w in windows], dtype=np.int64)
+    ends = np.array([w[2] for w in windows], dtype=np.int64)
+    out: dict[str, float] = {}
+    means = {col: sums.mean(col, starts, ends).tolist() for col in columns}
+    for k, (label, _, _) in enumerate(windows):
+        for col in columns:
+            out[f"{label}_{col}"] = means[col][k]
+    return out
+
+
+def summary_end(header: dict[str, Any]) -> int:
+    """One past the last summary step of a run, from its binary header (every
+    summary_every-th step is written; event windows can add later steps)."""
+
+    steps, every = int(header["steps"]), max(1, int(header["scenario"].get("summary_every", 1)))
+    return (steps - 1) // every * every + 1
+
+
+class RunningWindows:
+    """Means / stds of summary columns over a run's windows, fed rows in step order.
+
+    update() merges the count, mean and sum of squared deviations of a
+    chunk's rows in each window into running totals (Welford's update in
+    the pairwise form of Chan et al.), so no rows are kept. `run.end` must be
+    one past the run's last step, as for window_means(); means() checks it.
+    """
+
+    def __init__(self, columns: Sequence[str], window_sets: Sequence[WindowSet], run: RunInfo):
+        self.columns = list(columns)
+        self.run = run
+        self.windows = [w for window_set in window_sets for w in window_set(run)]
+        self._start = np.array([w[1] for w in self.windows], dtype=np.int64)
+        self._end = np.array([w[2] for w in self.windows], dtype=np.int64)
+        self.count = np.zeros(len(self.windows), dtype=np.int64)
+        self.mean = np.zeros((len(self.columns), len(self.windows)))
+        self.m2 = np.zeros((len(self.columns), len(self.windows)))
+        self.last_step = -1
+
+    def update(self, rows: np.ndarray) -> None:
+        if not len(rows):
+            return
+        steps = rows["step"]
+        lo = np.searchsorted(steps, self._start, "left")
+        hi = np.maximum(np.searchsorted(steps, self._end, "left"), lo)
+        for w in np.flatnonzero(hi > lo).tolist():
+            na, nb = int(self.count[w]), int(hi[w] - lo[w])
+            for c, col in enumerate(self.columns):
+                x = np.asarray(rows[col][lo[w] : hi[w]], dtype=np.float64)
+                mb = x.mean()
+                m2b = float(np.square(x - mb).sum())
+                if na == 0:
+                    self.mean[c, w], self.m2[c, w] = mb, m2b
+                else:
+                    delta = mb - self.mean[c, w]
+                    self.mean[c, w] += delta * nb / (na + nb)
+                    self.m2[c, w] += m2b + delta * delta * na * nb / (na + nb)
+            self.count[w] = na + nb
+        self.last_step = int(steps[-1])
+
+    def _check_end(self) -> None:
+        if self.last_step + 1 != self.run.end:
+            raise ValueError(f"summary ends at step {self.last_step}, windows were set up for end {self.run.end}")
+
+    def means(self) -> dict[str, float]:
+        """`<label>_<column>` means, as window_means() (NaN for empty windows)."""
+
+        self._check_end()
+        mean = np.where(self.count > 0, self.mean, np.nan).tolist()
+        return {f"{w[0]}_{col}": mean[c][k] for k, w in enumerate(self.windows) for c, col in enumerate(self.columns)}
+
+    def stds(self) -> dict[str, float]:
+        """`<label>_<column>` population standard deviations over the windows."""
+
+        self._check_end()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.where(self.count > 0, np.sqrt(self.m2 / self.count), np.nan).tolist()
+        return {f"{w[0]}_{col}": std[c][k] for k, w in enumerate(self.windows) for c, col in enumerate(self.columns)}
+
+
+class StreamWindows:
+    """RunningWindows of every job of a summary stream (`demux`, for sim_batch.run_batch).
+
+    `results[job]` is set when a job's summary ends: its window means, or
+    None when it had no rows. The windows of a job are set up from its
+    header (summary_end()) and the loss steps.
+    """
+
+    def __init__(self, columns: Sequence[str], window_sets: Sequence[WindowSet], loss_steps: np.ndarray):
+        self.columns = list(columns)
+        self.window_sets = list(window_sets)
+        self.loss_steps = np.asarray(loss_steps)
+        self.running: dict[int, RunningWindows] = {}
+        self.results: dict[int, dict[str, float] | None] = {}
+        self.demux = StreamDemux(self._rows, self._end)
+
+    def _rows(self, job: int, header: dict[str, Any], rows: np.ndarray) -> None:
+        if job not in self.running:
+            run = RunInfo(self.loss_steps, summary_end(header))
+            self.running[job] = RunningWindows(self.columns, self.window_sets, run)
+        self.running[job].update(rows)
+
+    def _end(self, job: int) -> None:
+        acc = self.running.pop(job, None)
+        self.results[job] = acc.means() if acc is not None else None
+
+
+def _summarize_chunk(
+    paths: Sequence[Path], columns: Sequence[str], window_sets: Sequence[WindowSet], loss_steps: np.ndarray
+) -> list[dict[str, float] | None]:
+    out: list[dict[str, float] | None] = []
+    for path in paths:
+        rows = load_summary(path, ["step", *columns])
+        out.append(window_means(rows, columns, window_sets, loss_steps) if len(rows) else None)
+    return out
+
+
+def summarize_files(
+    paths: Sequence[Path],
+    columns: Sequence[str],
+    window_sets: Sequence[WindowSet],
+    loss_steps: np.ndarray,
+    *,
+    jobs: int | None = None,
+) -> list[dict[str, float] | None]:
+    """window_means() of every summary file (None for empty ones), in order.
+
+    Files are read and summarized in chunks on `jobs` processes (default: all
+    cores; 1 runs in this process).
+    """
+
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths)))
+    if jobs == 1:
+        return _summarize_chunk(paths, columns, window_sets, loss_steps)
+    size = math.ceil(len(paths) / (jobs * 4))
+    chunks = [paths[k : k + size] for k in range(0, len(paths), size)]
+    with ProcessPoolExecutor(jobs) as pool:
+        parts = pool.map(_summarize_chunk, chunks, repeat(columns), repeat(window_sets), repeat(loss_steps))
+        return [result for part in parts for result in part]
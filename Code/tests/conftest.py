@@ -0,0 +1,41 @@
+"""Shared fixtures: the simulator build, a sample scenario and single-run outputs."""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+CODE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CODE))
+sys.path.insert(0, str(CODE / "fresh_start"))
+
+SCENARIO = CODE / "fresh_start" / "scenarios" / "baseline_loss_delayed_insertion.cfg"
+LOSSES = CODE / "losses_seeded.csv"
+
+Single = Callable[..., tuple[Path, Path]]
+
+
+@pytest.fixture(scope="session")
+def simulator() -> Path:
+    subprocess.run(["make", "-s"], cwd=CODE, check=True)
+    return CODE / "baseline_simulator"
+
+
+@pytest.fixture
+def single(simulator: Path, tmp_path: Path) -> Single:
+    """single(name, *flags, scenario=, losses=): summary and trace of one plain run."""
+
+    def run(name: str, *flags: str, scenario: Path = SCENARIO, losses: Path = LOSSES, ext: str = "csv") -> tuple[Path, Path]:
+        summary, trace = tmp_path / f"{name}.summary.{ext}", tmp_path / f"{name}.trace.{ext}"
+        subprocess.run(
+            [str(simulator), str(scenario), str(losses), str(summary), str(trace), *flags],
+            check=True,
+            capture_output=True,
+        )
+        return summary, trace
+
+    return run
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from bench_simulator import generate_losses, scenario_text
+from sim_io import load_losses
+
+
+def test_each_cell_generates_its_own_losses(simulator: Path, tmp_path: Path) -> None:
+    cfg = tmp_path / "bench.cfg"
+    for n, steps in ((20, 500), (1000, 500), (1000, 2000)):
+        cfg.write_text(scenario_text(n, steps, 0), encoding="utf-8")
+        losses = load_losses(generate_losses(tmp_path, cfg))
+        assert len(losses) == n // 50 + 1
+        assert losses["step"].max() < steps
+        assert losses["idx"].max() < n
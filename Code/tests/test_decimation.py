@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import numpy as np
+
+from conftest import Single
+from sim_io import load_summary, load_trace, loss_events, spare_events, trace_events
+
+
+def _lines(path) -> list[bytes]:
+    return path.read_bytes().splitlines()
+
+
+def test_every_and_event_window_keep_full_rows(single: Single) -> None:
+    full_summary, full_trace = single("full")
+    summary, trace = single("thin", "--summary-every", "10", "--trace-every", "1000", "--event-window", "1")
+    full_rows = set(_lines(full_summary))
+    assert set(_lines(summary)) <= full_rows
+    steps = set(load_summary(summary, ["step"])["step"].tolist())
+    assert set(range(0, 3000, 10)) <= steps
+    events = trace_events(full_trace)
+    event_steps = np.concatenate([events.losses["step"], events.spares["step"]])
+    assert {s + d for s in event_steps.tolist() for d in (-1, 0, 1) if 0 <= s + d < 3000} <= steps
+    assert set(_lines(trace)) <= set(_lines(full_trace))
+    thin = load_trace(trace)
+    assert np.array_equal(spare_events(thin)[["step", "idx"]], events.spares[["step", "idx"]])
+    assert np.array_equal(loss_events(thin)[["step", "idx"]], events.losses[["step", "idx"]])
+
+
+def test_trace_filters_select_rows(single: Single) -> None:
+    _, full_trace = single("full")
+    _, trace = single("filtered", "--trace-alive-only", "--trace-idx", "0-4,17")
+    rows = load_trace(full_trace)
+    keep = (rows["alive"] == 1) & np.isin(rows["idx"], [0, 1, 2, 3, 4, 17])
+    assert np.array_equal(load_trace(trace), rows[keep])
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from conftest import LOSSES, SCENARIO
+from sim_batch import BatchJob, run_batch
+
+
+@pytest.mark.parametrize("lockstep", [2, 8])
+def test_lockstep_matches_separate_runs(simulator: Path, tmp_path: Path, lockstep: int) -> None:
+    """Replicas advanced as one ensemble write the same bytes as one-job groups."""
+
+    def jobs(tag: str) -> list[BatchJob]:
+        return [
+            BatchJob(
+                SCENARIO,
+                LOSSES,
+                summary=tmp_path / f"{tag}_summary_{i}.csv",
+                trace=tmp_path / f"{tag}_trace_{i}.csv",
+                overrides=overrides,
+            )
+            for i, overrides in enumerate(
+                [(("seed", "1"),), (("seed", "7"),), (("k_sym", "0.3"),), (("incoming_hold_steps", "0"),), (("d_star", "4.5"),)]
+            )
+        ]
+
+    separate, grouped = jobs("separate"), jobs("grouped")
+    assert all(r.ok for r in run_batch(separate, simulator=simulator, lockstep=1))
+    assert all(r.ok for r in run_batch(grouped, simulator=simulator, lockstep=lockstep))
+    for a, b in zip(separate, grouped):
+        assert a.summary.read_bytes() == b.summary.read_bytes()
+        assert a.trace.read_bytes() == b.trace.read_bytes()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from conftest import CODE, Single
+from plot_spacetime import spacetime_grid, trace_perimeter
+from sim_io import load_trace
+
+
+@pytest.mark.parametrize("start, stop", [(0, None), (700, 1900)])
+def test_grid_matches_histogram2d(single: Single, start: int, stop: int | None) -> None:
+    _, trace = single("run", "--format", "bin", ext="bin")
+    perimeter = trace_perimeter(trace)
+    grid, end = spacetime_grid(trace, "v", perimeter, start=start, stop=stop, step_bins=300, position_bins=50)
+    rows = load_trace(trace)
+    rows = rows[(rows["alive"] == 1) & (rows["step"] >= start) & (rows["step"] < end)]
+    ranges = [[0, perimeter], [start, end]]
+    s = np.mod(rows["s"], perimeter)
+    sums, _, _ = np.histogram2d(s, rows["step"], bins=[50, 300], range=ranges, weights=rows["v"])
+    counts, _, _ = np.histogram2d(s, rows["step"], bins=[50, 300], range=ranges)
+    with np.errstate(invalid="ignore"):
+        np.testing.assert_allclose(grid, sums / counts, rtol=1e-12)
+
+
+def test_empty_step_range_is_rejected(single: Single) -> None:
+    _, trace = single("run", "--format", "bin", ext="bin")
+    with pytest.raises(ValueError):
+        spacetime_grid(trace, "v", 100.0, start=500, stop=500)
+    proc = subprocess.run(
+        [sys.executable, str(CODE / "plot_spacetime.py"), str(trace), "--start", "500", "--stop", "400"],
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 2 and "--stop (400) must be greater than --start (500)" in proc.stderr
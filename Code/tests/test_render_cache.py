@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+from render_cache import RenderCache, RenderJob, render_jobs
+
+STUB = '''
+from pathlib import Path
+
+
+def render(src, dst, suffix):
+    Path(dst).write_text(Path(src).read_text() + suffix)
+'''
+
+
+def test_unchanged_jobs_are_skipped(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    (tmp_path / "render_stub.py").write_text(STUB)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    src, dst, manifest = tmp_path / "data.csv", tmp_path / "figure.png", tmp_path / "manifest.json"
+    src.write_text("1;2\n")
+
+    def render(suffix: str = "!") -> list[RenderJob]:
+        job = RenderJob("render_stub:render", (src, dst, suffix), inputs=(src,), outputs=(dst,))
+        return render_jobs([job], cache=RenderCache(manifest), workers=1)
+
+    assert len(render()) == 1
+    assert dst.read_text() == "1;2\n!"
+    assert render() == []  # a fresh RenderCache reads the manifest
+
+    os.utime(src, ns=(src.stat().st_atime_ns, src.stat().st_mtime_ns + 10**9))
+    assert render() == []  # touched, same content
+    src.write_text("3;4\n")
+    assert len(render()) == 1 and dst.read_text() == "3;4\n!"
+    dst.unlink()
+    assert len(render()) == 1 and dst.exists()
+    assert len(render("?")) == 1 and dst.read_text() == "3;4\n?"
+    assert render("?") == []
@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from conftest import LOSSES, SCENARIO
+from run_cache import RunCache, run_cached_batch
+from sim_batch import BatchJob
+
+
+def test_second_run_is_served_from_cache(simulator: Path, tmp_path: Path) -> None:
+    cache = RunCache(tmp_path / "cache")
+    jobs = [
+        BatchJob(SCENARIO, LOSSES, summary=tmp_path / f"summary_{s}.csv", trace=tmp_path / f"trace_{s}.csv", overrides=(("seed", s),))
+        for s in ("1", "2")
+    ]
+    assert run_cached_batch(cache, simulator, jobs) == [False, False]
+    simulated = {p: p.read_bytes() for job in jobs for p in job.outputs().values()}
+    for path in simulated:
+        path.unlink()
+    assert run_cached_batch(cache, simulator, jobs) == [True, True]
+    assert {p: p.read_bytes() for p in simulated} == simulated
+
+
+def test_changed_override_misses(simulator: Path, tmp_path: Path) -> None:
+    cache = RunCache(tmp_path / "cache")
+    summary = tmp_path / "summary.csv"
+    assert run_cached_batch(cache, simulator, [BatchJob(SCENARIO, LOSSES, summary=summary)]) == [False]
+    changed = BatchJob(SCENARIO, LOSSES, summary=summary, overrides=(("k_sym", "0.3"),))
+    assert run_cached_batch(cache, simulator, [changed]) == [False]
+    assert run_cached_batch(cache, simulator, [changed]) == [True]
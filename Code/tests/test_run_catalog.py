@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from conftest import LOSSES, SCENARIO, Single
+from run_catalog import METRIC_COLUMNS, RunCatalog
+from sim_batch import BatchJob
+
+
+def test_record_replaces_row_of_same_summary(simulator: Path, single: Single, tmp_path: Path) -> None:
+    """A run is keyed by its summary path; its finalized scenario becomes columns."""
+
+    summary, trace = single("seed1")
+    summary2, _ = single("seed2", "--set", "seed=2")
+    job = BatchJob(SCENARIO, LOSSES, summary=summary, trace=trace)
+    job2 = BatchJob(SCENARIO, LOSSES, summary=summary2, overrides=(("seed", "2"),))
+
+    with RunCatalog(tmp_path / "runs.sqlite") as catalog:
+        catalog.record("test", "first", job, simulator=simulator)
+        catalog.record("test", "again", job, simulator=simulator)
+        catalog.record("test", "seed2", job2, simulator=simulator)
+        rows = catalog.query("SELECT * FROM runs ORDER BY seed")
+
+    assert [row["name"] for row in rows] == ["again", "seed2"]
+    assert [row["summary_path"] for row in rows] == [str(summary.resolve()), str(summary2.resolve())]
+    assert [row["seed"] for row in rows] == [1, 2]
+    for row in rows:
+        assert (row["n_initial"], row["n_total"], row["steps"], row["k_sym"]) == (20, 40, 3000, 0.1)
+        assert row["controller_mode"] == 1 and row["loss_to_spare_delay_max_steps"] == 300
+        assert row["first_loss_step"] == 167
+        assert all(row[col] is not None for col in METRIC_COLUMNS)
+    assert rows[0]["trace_path"] == str(trace.resolve()) and rows[1]["trace_path"] is None
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from conftest import LOSSES, SCENARIO, Single
+from sim_batch import BatchJob, manifest_line, run_batch
+
+
+def test_batch_matches_single_runs(simulator: Path, single: Single, tmp_path: Path) -> None:
+    jobs = [
+        BatchJob(
+            SCENARIO,
+            LOSSES,
+            summary=tmp_path / f"batch_{seed}.csv",
+            trace=tmp_path / f"batch_trace_{seed}.csv",
+            overrides=(("seed", str(seed)),),
+        )
+        for seed in (1, 2, 3)
+    ]
+    results = run_batch(jobs, simulator=simulator, threads=2, lockstep=1)
+    assert [r.ok for r in results] == [True] * 3
+    for seed, job in zip((1, 2, 3), jobs):
+        summary, trace = single(f"seed{seed}", "--set", f"seed={seed}")
+        assert job.summary.read_bytes() == summary.read_bytes()
+        assert job.trace.read_bytes() == trace.read_bytes()
+
+
+def test_paths_with_spaces_and_percent(simulator: Path, single: Single, tmp_path: Path) -> None:
+    odd = tmp_path / "a dir" / "100%"
+    odd.mkdir(parents=True)
+    scenario = odd / "my scenario.cfg"
+    losses = odd / "loss schedule.csv"
+    scenario.write_bytes(SCENARIO.read_bytes())
+    losses.write_bytes(LOSSES.read_bytes())
+    job = BatchJob(scenario, losses, summary=odd / "sum mary.csv")
+    assert len(manifest_line(job).split()) == 3
+    (result,) = run_batch([job], simulator=simulator)
+    assert result.ok, result.message
+    summary, _ = single("plain")
+    assert job.summary.read_bytes() == summary.read_bytes()
+
+
+def test_too_many_overrides_is_an_error(simulator: Path) -> None:
+    job = BatchJob(SCENARIO, LOSSES, overrides=tuple(("seed", str(i)) for i in range(200)))
+    (result,) = run_batch([job], simulator=simulator)
+    assert not result.ok
+    assert "too many overrides" in result.message
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from conftest import LOSSES, SCENARIO, Single
+from sim_binding import run
+from sim_io import load_summary, load_trace
+
+
+def test_binding_matches_csv(single: Single) -> None:
+    summary, trace = single("cli")
+    res = run(SCENARIO, LOSSES, trace=True)
+    rows = load_summary(summary)
+    assert len(res.summary) == len(rows)
+    for col in ("mean_v", "std_v", "mean_gap", "std_gap"):
+        np.testing.assert_allclose(res.summary[col], rows[col], atol=5e-7)
+    t = load_trace(trace)
+    flat = res.trace.reshape(-1)
+    flat = flat[np.lexsort((flat["idx"], flat["step"]))]
+    np.testing.assert_allclose(flat["s"], t["s"], atol=5e-7)
+
+
+def test_str_paths_are_paths() -> None:
+    by_path = run(SCENARIO, LOSSES)
+    by_str = run(str(SCENARIO), str(LOSSES))
+    assert np.array_equal(by_path.summary, by_str.summary)
+    assert by_str.metrics == by_path.metrics
+
+
+def test_missing_scenario_file_is_an_error() -> None:
+    with pytest.raises(ValueError):
+        run("no_such_scenario.cfg")
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import numpy as np
+
+from sim_downsample import band_envelope, downsample, pixel_columns
+
+WIDTH = 300
+
+
+def _rows(n: int) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    rows = np.zeros(n, dtype=[("step", "<i4"), ("mean_v", "<f8"), ("mean_gap", "<f8")])
+    rows["step"] = np.arange(n)
+    rows["mean_v"] = 1.0 + 0.01 * rng.standard_normal(n)
+    rows["mean_v"][rng.integers(0, n, 20)] += 0.5  # single-step spikes a stride would drop
+    rows["mean_gap"] = 5.0 + np.cumsum(rng.standard_normal(n)) * 0.01
+    rows["mean_gap"][n // 3 : n // 3 + 50] = np.nan
+    return rows
+
+
+def _extremes(y: np.ndarray, column: np.ndarray, columns: int) -> tuple[np.ndarray, np.ndarray]:
+    """(min, max) of y in every pixel column, ignoring NaN (NaN if none)."""
+
+    lo, hi = np.full(columns, np.inf), np.full(columns, -np.inf)
+    ok = np.isfinite(y)
+    np.minimum.at(lo, column[ok], y[ok])
+    np.maximum.at(hi, column[ok], y[ok])
+    lo[np.isinf(lo)] = hi[np.isinf(hi)] = np.nan
+    return lo, hi
+
+
+def test_minmax_keeps_every_pixel_columns_extremes() -> None:
+    rows = _rows(60_000)
+    kept = downsample(rows, [rows["mean_v"], rows["mean_gap"]], WIDTH, keep_steps=[12_345])
+    assert len(kept) <= 4 * 2 * WIDTH + 1
+    assert kept["step"][0] == 0 and kept["step"][-1] == len(rows) - 1 and 12_345 in kept["step"]
+    starts = rows["step"][pixel_columns(rows["step"].astype(np.float64), WIDTH)]
+    full_column = np.searchsorted(starts, rows["step"], "right") - 1
+    kept_column = np.searchsorted(starts, kept["step"], "right") - 1
+    for name in ("mean_v", "mean_gap"):
+        full = _extremes(rows[name], full_column, len(starts))
+        reduced = _extremes(kept[name], kept_column, len(starts))
+        np.testing.assert_array_equal(reduced, full)
+
+
+def test_short_series_are_unchanged() -> None:
+    rows = _rows(3_000)
+    assert downsample(rows, [rows["mean_v"]], 1200) is rows
+
+
+def test_band_envelope_covers_the_band() -> None:
+    rows = _rows(60_000)
+    lower, upper = rows["mean_v"] - 0.1, rows["mean_v"] + 0.1
+    x, lo, hi = band_envelope(rows["step"], lower, upper, WIDTH)
+    starts = pixel_columns(rows["step"].astype(np.float64), WIDTH)
+    column = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(rows))))
+    assert np.array_equal(x, rows["step"][starts])
+    np.testing.assert_array_equal(lo, _extremes(lower, column, len(starts))[0])
+    np.testing.assert_array_equal(hi, _extremes(upper, column, len(starts))[1])
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import subprocess
+from pathlib import Path
+
+from conftest import LOSSES, SCENARIO, Single
+from sim_batch import BatchJob, run_batch
+from sim_fork import run_forked
+
+
+def test_resume_continues_the_snapshot(simulator: Path, single: Single, tmp_path: Path) -> None:
+    full, _ = single("full")
+    pre, post, snap = tmp_path / "pre.csv", tmp_path / "post.csv", tmp_path / "snap.bin"
+    common = [str(simulator), str(SCENARIO), str(LOSSES)]
+    subprocess.run([*common, str(pre), "--snapshot", str(snap), "--snapshot-at", "first_spare"], check=True, capture_output=True)
+    subprocess.run([*common, str(post), "--resume", str(snap)], check=True, capture_output=True)
+    stitched = pre.read_bytes() + post.read_bytes().split(b"\n", 1)[1]
+    assert stitched == full.read_bytes()
+
+
+def test_forked_sweep_matches_separate_runs(simulator: Path, tmp_path: Path) -> None:
+    variants = [(("seed", str(seed)), ("incoming_hold_steps", str(hold))) for seed in (1, 2) for hold in (0, 50, 200)]
+
+    def jobs(tag: str) -> list[BatchJob]:
+        return [
+            BatchJob(SCENARIO, LOSSES, summary=tmp_path / f"{tag}_s{i}.csv", trace=tmp_path / f"{tag}_t{i}.csv", overrides=v)
+            for i, v in enumerate(variants)
+        ]
+
+    separate, forked = jobs("separate"), jobs("forked")
+    expected = run_batch(separate, simulator=simulator)
+    results = run_forked(forked, simulator=simulator)
+    assert [r.metrics for r in results] == [r.metrics for r in expected]
+    for a, b in zip(separate, forked):
+        assert a.summary.read_bytes() == b.summary.read_bytes()
+        assert a.trace.read_bytes() == b.trace.read_bytes()
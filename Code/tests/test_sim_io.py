@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from conftest import LOSSES, Single
+from sim_io import (
+    ZMAGIC,
+    build_step_index,
+    compress_table,
+    events_path,
+    export_csv,
+    index_path,
+    index_range,
+    last_step,
+    load,
+    load_loss_steps,
+    load_summary,
+    load_trace,
+    loss_events,
+    read_header,
+    spare_events,
+    step_index,
+    trace_events,
+)
+
+
+def test_binary_records_match_csv(single: Single, tmp_path: Path) -> None:
+    csv_summary, csv_trace = single("csv")
+    bin_summary, bin_trace = single("bin", "--format", "bin", ext="bin")
+    for csv, binary in ((csv_summary, bin_summary), (csv_trace, bin_trace)):
+        records = load(binary)
+        rows = load_summary(csv) if csv == csv_summary else load_trace(csv)
+        assert len(records) == len(rows)
+        for name in rows.dtype.names:
+            np.testing.assert_allclose(records[name], rows[name], atol=5e-7, equal_nan=True)
+        exported = tmp_path / f"{binary.name}.csv"
+        export_csv(binary, exported)
+        assert exported.read_bytes() == csv.read_bytes()
+
+
+def test_compressed_records_match_csv(single: Single, tmp_path: Path) -> None:
+    csv_summary, csv_trace = single("csv")
+    z_summary, z_trace = single("z", "--format", "z", ext="z")
+    for csv, compressed in ((csv_summary, z_summary), (csv_trace, z_trace)):
+        rows = load_summary(csv) if csv == csv_summary else load_trace(csv)
+        decoded = load_summary(compressed) if csv == csv_summary else load_trace(compressed)
+        assert decoded.dtype.names == rows.dtype.names
+        for name in rows.dtype.names:
+            assert np.array_equal(decoded[name], rows[name], equal_nan=True), name
+        exported = tmp_path / f"{compressed.name}.csv"
+        export_csv(compressed, exported)
+        assert exported.read_bytes() == csv.read_bytes()
+
+
+def test_python_compression_matches_simulator(single: Single, tmp_path: Path) -> None:
+    """sim_io.py compress writes the simulator's chunks, from a CSV or a binary file."""
+
+    _, csv_trace = single("csv")
+    _, bin_trace = single("bin", "--format", "bin", ext="bin")
+    _, z_trace = single("z", "--format", "z", ext="z")
+
+    def chunks(path: Path) -> bytes:
+        return path.read_bytes()[read_header(path, ZMAGIC)[1] :]
+
+    for src in (csv_trace, bin_trace):
+        dst = tmp_path / f"{src.name}.z"
+        compress_table(src, dst)
+        assert chunks(dst) == chunks(z_trace)
+
+
+def test_step_filters_match_masked_full_load(single: Single) -> None:
+    """stride/keep_steps/start/stop keep exactly the rows a mask over the full load keeps."""
+
+    losses = load_loss_steps(LOSSES)
+    filters = [
+        {"stride": 16},
+        {"stride": 16, "keep_steps": losses},
+        {"start": 1000, "stop": 1250},
+        {"start": 2990},
+        {"stop": 7},
+        {"stride": 10, "keep_steps": losses, "start": 150, "stop": 900},
+    ]
+    for fmt, ext in (("csv", "csv"), ("bin", "bin"), ("z", "z")):
+        summary, trace = single(fmt, "--format", fmt, ext=ext)
+        for path, loader in ((summary, load_summary), (trace, load_trace)):
+            full = loader(path)
+            assert last_step(path) == full["step"][-1]
+            steps = full["step"]
+            for f in filters:
+                keep = np.ones(len(full), dtype=bool)
+                if f.get("stride", 1) > 1:
+                    keep = (steps % f["stride"] == 0) | np.isin(steps, f.get("keep_steps", []))
+                keep &= (steps >= f.get("start", 0)) & (steps < f.get("stop", steps[-1] + 1))
+                rows = loader(path, **f)
+                expected = full[keep]
+                assert len(rows) == len(expected), (path.name, f)
+                for name in full.dtype.names:
+                    assert np.array_equal(rows[name], expected[name], equal_nan=True), (path.name, f, name)
+
+
+def test_events_sidecar_follows_trace_changes(single: Single) -> None:
+    """<trace>.events.json is reused while the trace content is unchanged and rebuilt once it changes."""
+
+    _, trace = single("events")
+
+    def scanned() -> tuple[list, list]:
+        rows = load_trace(trace, ["step", "idx", "alive"])
+        return loss_events(rows)[["step", "idx"]].tolist(), spare_events(rows)[["step", "idx"]].tolist()
+
+    def cached() -> tuple[list, list]:
+        events = trace_events(trace)
+        return events.losses[["step", "idx"]].tolist(), events.spares[["step", "idx"]].tolist()
+
+    def bump_mtime() -> None:
+        st = trace.stat()
+        os.utime(trace, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    assert cached() == scanned()
+    assert events_path(trace).exists()
+
+    # a marker in the sidecar shows whether it was reused or rebuilt
+    side = events_path(trace)
+    meta = json.loads(side.read_text(encoding="utf-8"))
+    side.write_text(json.dumps({**meta, "losses": []}), encoding="utf-8")
+    assert cached()[0] == []
+    bump_mtime()  # new mtime, same content: the hash matches, still reused
+    assert cached()[0] == []
+
+    # same size, different content: drone 0 is dead for step 500 only
+    data = trace.read_bytes()
+    alive = data.index(b"\n500;0;1;") + len(b"\n500;0;")
+    trace.write_bytes(data[:alive] + b"0" + data[alive + 1 :])
+    bump_mtime()
+    assert trace.stat().st_size == len(data)
+    assert cached() == scanned()
+    assert (500, 0) in cached()[0] and (501, 0) in cached()[1]
+
+    # new size: the trace is cut after step 1000
+    trace.write_bytes(trace.read_bytes()[: data.index(b"\n1001;") + 1])
+    assert cached() == scanned()
+    assert load_trace(trace)["step"][-1] == 1000
+
+
+def test_step_index_matches_scan_and_follows_trace_changes(single: Single) -> None:
+    """index_range() windows hold exactly the rows of a full scan; a changed trace gets a new index."""
+
+    _, trace = single("index")
+
+    def scan() -> tuple[np.ndarray, np.ndarray]:
+        lines = trace.read_bytes().splitlines(keepends=True)
+        offsets = np.cumsum([0, *map(len, lines)])
+        return np.array([int(line.split(b";", 1)[0]) for line in lines[1:]]), offsets[1:]
+
+    def check(index: np.ndarray, exact: bool) -> None:
+        steps, offsets = scan()
+        for start, stop in ((0, 1), (167, 168), (1000, 1250), (2990, None), (None, 7), (150, 900)):
+            lo, hi = index_range(index, start, stop)
+            inside = (steps >= (start or 0)) & (steps < (stop if stop is not None else steps[-1] + 1))
+            lo = offsets[0] if lo is None else lo
+            hi = offsets[-1] if hi is None else hi
+            if not inside.any():
+                assert lo >= hi, (start, stop)
+                continue
+            first, end = offsets[np.argmax(inside)], offsets[len(steps) - np.argmax(inside[::-1])]
+            if exact:
+                assert (lo, hi) == (first, end), (start, stop)
+            else:
+                assert lo <= first and end <= hi, (start, stop)
+
+    check(step_index(trace), exact=True)
+    assert index_path(trace).exists()
+
+    # a coarser index only narrows the range to its indexed steps
+    check(build_step_index(trace, every=16), exact=False)
+
+    # the trace is cut after step 1000: the index is rebuilt, keeping every=16
+    data = trace.read_bytes()
+    trace.write_bytes(data[: data.index(b"\n1001;") + 1])
+    index = step_index(trace)
+    assert int(index["step"][-1]) == 1001 and int(index["offset"][-1]) == trace.stat().st_size
+    assert np.all(np.diff(index["step"][:-1]) == 16)
+    check(index, exact=False)
+    steps, _ = scan()
+    assert np.array_equal(load_trace(trace, start=990)["step"], steps[steps >= 990])
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+import sim_pyramid
+from conftest import Single
+from sim_io import load_summary, load_trace
+from sim_pyramid import pyramid, pyramid_path, view
+
+LONG = ("--set", "steps=20000")
+
+
+def _direct(step: np.ndarray, x: np.ndarray, block: int) -> dict[str, np.ndarray]:
+    """n/min/max/mean/std of x per block of steps, with plain NumPy."""
+
+    blocks = step // block
+    cuts = np.flatnonzero(np.diff(blocks)) + 1
+    out: dict[str, list[float]] = {"step": [], "n": [], "min": [], "max": [], "mean": [], "std": []}
+    for b, v in zip(blocks[np.append(0, cuts)], np.split(x, cuts)):
+        v = v[np.isfinite(v)]
+        out["step"].append(b * block)
+        out["n"].append(len(v))
+        for stat, fn in (("min", np.min), ("max", np.max), ("mean", np.mean), ("std", np.std)):
+            out[stat].append(fn(v) if len(v) else np.nan)
+    return {k: np.array(v) for k, v in out.items()}
+
+
+def test_summary_levels_match_direct_aggregates(single: Single) -> None:
+    summary, _ = single("long", *LONG, ext="bin")
+    rows = load_summary(summary)
+    pyr = pyramid(summary)
+    assert pyramid_path(summary).exists()
+    assert pyr.blocks[0] == 16 and len(pyr.levels[pyr.blocks[-1]]) <= sim_pyramid.MIN_BLOCKS
+    band = rows["mean_v"] + rows["std_v"]
+    for block in pyr.blocks:
+        level = pyr.levels[block]
+        for column, x in (("mean_v", rows["mean_v"]), ("mean_gap", rows["mean_gap"]), ("mean_v+std_v", band)):
+            direct = _direct(rows["step"], x, block)
+            assert np.array_equal(level["step"], direct["step"])
+            assert np.array_equal(level[f"{column}_n"], direct["n"])
+            for stat in ("min", "max", "mean", "std"):
+                np.testing.assert_allclose(level[f"{column}_{stat}"], direct[stat], rtol=1e-12, atol=1e-12)
+
+    sim_pyramid._pyramids.clear()
+    reloaded = pyramid(summary)  # memory-mapped from the sidecar
+    for block in pyr.blocks:
+        assert np.array_equal(np.asarray(reloaded.levels[block]), np.asarray(pyr.levels[block]))
+
+
+def test_trace_levels_are_per_drone(single: Single) -> None:
+    _, trace = single("long", *LONG, ext="bin")
+    rows = load_trace(trace, ["step", "idx", "v"])
+    pyr = pyramid(trace)
+    for block in (pyr.blocks[0], pyr.blocks[2]):
+        level = pyr.levels[block]
+        for drone in (0, 7, 25):
+            mine = rows[rows["idx"] == drone]
+            direct = _direct(mine["step"], mine["v"], block)
+            assert np.array_equal(level["v_n"][:, drone], direct["n"])
+            for stat in ("min", "max", "mean", "std"):
+                np.testing.assert_allclose(level[f"v_{stat}"][:, drone], direct[stat], rtol=1e-5, atol=1e-5)
+
+
+def test_view_picks_pixel_sized_blocks(single: Single) -> None:
+    summary, _ = single("long", *LONG, ext="bin")
+    assert view(summary, 1200, start=0, stop=3000) is None
+    records, block = view(summary, 300, start=4000, stop=9000)
+    assert block == 16
+    assert records["step"][0] <= 4000 < records["step"][0] + block
+    assert records["step"][-1] < 9000
+    records, block = view(summary, 300)
+    assert block == 64 and len(records) == pytest.approx(20000 / 64, abs=1)
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import numpy as np
+
+from conftest import LOSSES, Single
+from sim_io import load_loss_steps, load_summary
+from sim_windows import LossWindows, RunInfo, RunningWindows, SlidingWindows, WindowSums, phase_windows, window_means
+
+COLUMNS = ["mean_v", "std_v", "mean_gap", "std_gap"]
+
+
+def test_window_sums_match_numpy(single: Single) -> None:
+    summary, _ = single("run")
+    rows = load_summary(summary)
+    sums = WindowSums(rows, COLUMNS)
+    rng = np.random.default_rng(0)
+    starts = rng.integers(-50, 3000, 200)
+    ends = starts + rng.integers(1, 800, 200)
+    for col in COLUMNS:
+        means, stds = sums.mean(col, starts, ends), sums.std(col, starts, ends)
+        for k in range(len(starts)):
+            x = rows[col][(rows["step"] >= starts[k]) & (rows["step"] < ends[k])]
+            if len(x):
+                assert np.isclose(means[k], x.mean(), rtol=1e-12, atol=1e-12)
+                # sums of squares cancel on flat windows: exact to the CSV's 1e-6
+                assert np.isclose(stds[k], x.std(), rtol=1e-9, atol=1e-6)
+            else:
+                assert np.isnan(means[k])
+
+
+def test_running_windows_match_window_means(single: Single) -> None:
+    summary, _ = single("run")
+    rows = load_summary(summary)
+    loss_steps = load_loss_steps(LOSSES)
+    sets = [phase_windows, LossWindows(50, 200), SlidingWindows(500, 250)]
+    expected = window_means(rows, COLUMNS, sets, loss_steps)
+    running = RunningWindows(COLUMNS, sets, RunInfo(loss_steps, int(rows["step"][-1]) + 1))
+    for k in range(0, len(rows), 333):
+        running.update(rows[k : k + 333])
+    got = running.means()
+    assert got.keys() == expected.keys()
+    np.testing.assert_allclose(list(got.values()), list(expected.values()), rtol=1e-12)
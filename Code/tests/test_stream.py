@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+
+from conftest import LOSSES, SCENARIO
+from sim_batch import STREAM, BatchJob, run_batch
+from sim_io import load_loss_steps, load_summary
+from sim_windows import StreamWindows, phase_windows, window_means
+
+COLUMNS = ["mean_v", "std_v", "mean_gap", "std_gap"]
+
+
+def test_streamed_metrics_match_summary_files(simulator: Path, tmp_path: Path) -> None:
+    seeds = ("1", "2", "3")
+    loss_steps = load_loss_steps(LOSSES)
+    windows = StreamWindows(COLUMNS, [phase_windows], loss_steps)
+    streamed = [BatchJob(SCENARIO, LOSSES, summary=STREAM, format="bin", overrides=(("seed", s),)) for s in seeds]
+    assert all(r.ok for r in run_batch(streamed, simulator=simulator, threads=2, stream=windows.demux))
+    files = [BatchJob(SCENARIO, LOSSES, summary=tmp_path / f"summary_{s}.bin", format="bin", overrides=(("seed", s),)) for s in seeds]
+    assert all(r.ok for r in run_batch(files, simulator=simulator))
+    for k, job in enumerate(files):
+        expected = window_means(load_summary(job.summary), COLUMNS, [phase_windows], loss_steps)
+        assert windows.results[k].keys() == expected.keys()
+        np.testing.assert_allclose(list(windows.results[k].values()), list(expected.values()), rtol=1e-12)
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+import sweep_seeds
+
+SCENARIO = "baseline_loss_delayed_insertion.cfg"
+
+
+def sweep(monkeypatch: pytest.MonkeyPatch, out: Path, *args: str) -> int:
+    monkeypatch.setattr(sweep_seeds, "OUT_DIR", out)
+    monkeypatch.setattr(sys, "argv", ["sweep_seeds.py", "--scenario", SCENARIO, "--no-build", "--no-catalog", "--jobs", "1", *args])
+    return sweep_seeds.main()
+
+
+def test_rerun_only_simulates_missing_or_changed_seeds(
+    simulator: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    sweep_dir = tmp_path / Path(SCENARIO).stem
+    assert sweep(monkeypatch, tmp_path, "--seeds", "3") == 0
+    summaries = {s: sweep_dir / f"summary_seed_{s}.csv" for s in (1, 2, 3)}
+    stamps = {s: p.stat().st_mtime_ns for s, p in summaries.items()}
+    capsys.readouterr()
+
+    assert sweep(monkeypatch, tmp_path, "--seeds", "4") == 0
+    assert "3 of 4 seeds already complete, running 1" in capsys.readouterr().out
+    assert {s: p.stat().st_mtime_ns for s, p in summaries.items()} == stamps
+
+    summaries[2].write_bytes(summaries[2].read_bytes()[:-10])  # a corrupted output is re-run
+    assert sweep(monkeypatch, tmp_path, "--seeds", "4") == 0
+    assert "3 of 4 seeds already complete, running 1" in capsys.readouterr().out
+    entries = [json.loads(line) for line in (sweep_dir / sweep_seeds.MANIFEST).read_text().splitlines()]
+    assert sorted(e["seed"] for e in entries[:3]) == [1, 2, 3]
+    assert [e["seed"] for e in entries[3:]] == [4, 2]
+    assert len((sweep_dir / "metrics.csv").read_text().splitlines()) == 5
+    assert not (sweep_dir / sweep_seeds.PARTIAL).exists()